@@ -2,4 +2,37 @@ import os
 
 BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
 GENERATED_DIR = os.path.join(BACKEND_DIR, "generated")
-os.makedirs(GENERATED_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(GENERATED_DIR, exist_ok=True)
+# One sub-directory per generated plan (plan ID), kept so older plans stay queryable
+PLANS_DIR = os.path.join(GENERATED_DIR, "plans")
+os.makedirs(PLANS_DIR, exist_ok=True)
+
+# Loaded plan graphs kept in memory (LRU evicted beyond this budget)
+GRAPH_REGISTRY_MAX_MB = float(os.environ.get("GRAPH_REGISTRY_MAX_MB", "512"))
+# Number of most recent plans preloaded at startup (0 disables the warm-up)
+GRAPH_REGISTRY_WARMUP_PLANS = int(os.environ.get("GRAPH_REGISTRY_WARMUP_PLANS", "0"))
+# A* over the graph with street chains contracted into weighted super-edges (0 searches the full graph)
+GRAPH_COMPACTION = os.environ.get("GRAPH_COMPACTION", "1") != "0"
+
+# Route generation jobs: worker processes running at once and jobs allowed to wait for one
+GENERATION_WORKERS = int(os.environ.get("GENERATION_WORKERS", "2"))
+GENERATION_MAX_QUEUE = int(os.environ.get("GENERATION_MAX_QUEUE", "8"))
+# Parameter combinations allowed in one sweep request
+SWEEP_MAX_VARIANTS = int(os.environ.get("SWEEP_MAX_VARIANTS", "32"))
+# Wall-clock limit for one generation job once it starts running (0 disables it)
+GENERATION_TIMEOUT_SECONDS = float(os.environ.get("GENERATION_TIMEOUT_SECONDS", "1800"))
+
+# Finished runs cached by input hash, replayed when the same inputs are submitted again (0 disables)
+RESULT_CACHE_DIR = os.path.join(GENERATED_DIR, "cache")
+RESULT_CACHE_MAX_MB = float(os.environ.get("RESULT_CACHE_MAX_MB", "1024"))
+# Pickled outputs of the individual generation stages, reused when only later stages change (0 disables)
+STAGE_CACHE_DIR = os.path.join(GENERATED_DIR, "stages")
+STAGE_CACHE_MAX_MB = float(os.environ.get("STAGE_CACHE_MAX_MB", "512"))
+# Vector tiles: plans with an in-memory tile index and encoded tiles kept in memory (LRU)
+TILE_INDEX_MAX_PLANS = int(os.environ.get("TILE_INDEX_MAX_PLANS", "4"))
+TILE_CACHE_MAX_MB = float(os.environ.get("TILE_CACHE_MAX_MB", "64"))
+# Tiled occupancy maps (tiled_map option): tile size in pixels and threads rasterizing them
+MAP_TILE_SIZE = int(os.environ.get("MAP_TILE_SIZE", "1024"))
+MAP_TILE_WORKERS = int(os.environ.get("MAP_TILE_WORKERS", "4"))
+# Threads writing a finished plan's outputs (CSV, snapshot, map and layers) at the same time
+ARTIFACT_WORKERS = int(os.environ.get("ARTIFACT_WORKERS", "4"))
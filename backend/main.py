@@ -1,13 +1,37 @@
+import sys
+import time
+_import_start = time.perf_counter()
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-from config import GENERATED_DIR
+from config import GENERATED_DIR, GRAPH_REGISTRY_WARMUP_PLANS
+from modules.poses_geometry import path_finding
 
 # Import routers
-from routes import generate_routes_bp, calculate_path_bp, graph_nodes_bp, transfer_files_bp, healthcheck_bp
+from routes import generate_routes_bp, calculate_path_bp, graph_nodes_bp, transfer_files_bp, runtime_obstacles_bp, plan_artifacts_bp, tiles_bp, healthcheck_bp
 
-app = FastAPI()
+IMPORT_MS = (time.perf_counter() - _import_start) * 1000
+# Imported by the stages that need them, not at startup
+DEFERRED_MODULES = ('torch', 'sklearn', 'matplotlib', 'IPython', 'networkx', 'paramiko')
+
+def warm_up_graph_registry():
+    print(f"Startup: modules imported in {IMPORT_MS:.0f} ms")
+    if GRAPH_REGISTRY_WARMUP_PLANS > 0:
+        start = time.perf_counter()
+        path_finding.graph_registry.warm_up(GRAPH_REGISTRY_WARMUP_PLANS)
+        print(f"Startup: graph registry warm-up took {(time.perf_counter() - start) * 1000:.0f} ms")
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    if loaded:
+        print(f"Startup: warning, loaded at startup: {', '.join(loaded)}")
+
+@asynccontextmanager
+async def lifespan(app):
+    warm_up_graph_registry()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/api/v1/generate-routes/download", StaticFiles(directory=GENERATED_DIR), name="generated")
 
@@ -15,6 +39,9 @@ app.include_router(generate_routes_bp)
 app.include_router(calculate_path_bp)
 app.include_router(graph_nodes_bp)
 app.include_router(transfer_files_bp)
+app.include_router(runtime_obstacles_bp)
+app.include_router(plan_artifacts_bp)
+app.include_router(tiles_bp)
 app.include_router(healthcheck_bp)
 
 # CORS configuration
@@ -0,0 +1,44 @@
+import time
+
+class JobCancelled(Exception):
+    pass
+
+class CancellationToken:
+    """
+    Cooperative cancellation for long-running generation loops. The job is
+    cancelled when `event` is set (client disconnect or cancel endpoint;
+    usually a multiprocessing manager Event so it works across processes)
+    or when the wall-clock deadline passes. check() is called inside tight
+    loops, so the event (an IPC round-trip) is only polled every
+    `poll_interval` seconds; the deadline is a plain clock comparison.
+    """
+    def __init__(self, event=None, timeout_seconds=None, poll_interval=0.25):
+        self.event = event
+        self.timeout_seconds = timeout_seconds
+        self.poll_interval = poll_interval
+        self.deadline = None
+        self._next_poll = 0.0
+        self._cancelled = False
+
+    def start(self):
+        """Starts the deadline clock (when the job actually begins running)"""
+        if self.timeout_seconds:
+            self.deadline = time.time() + self.timeout_seconds
+
+    def cancel(self):
+        if self.event is not None:
+            self.event.set()
+
+    def reason(self):
+        now = time.time()
+        if self.deadline is not None and now >= self.deadline:
+            return f"Tiempo máximo de generación excedido ({self.timeout_seconds:g} s)"
+        if not self._cancelled and now >= self._next_poll:
+            self._next_poll = now + self.poll_interval
+            self._cancelled = self.event is not None and self.event.is_set()
+        return "Generación cancelada" if self._cancelled else None
+
+    def check(self):
+        reason = self.reason()
+        if reason:
+            raise JobCancelled(reason)
@@ -0,0 +1,136 @@
+import numpy as np
+
+# Pose types whose poses can be contracted into street chains
+CHAIN_POSE_TYPES = ('street', 'transit_street')
+
+class CompactGraph:
+    """
+    Search graph with the street chains contracted. A chain node has one
+    way in and one way out: a single predecessor and a single successor
+    (one-way), or the same two neighbours in both directions (two-way).
+    Every path from a decision node through chain nodes to the next
+    decision node becomes one super-edge weighted with the sum of its edges.
+
+    Node indices are those of the full graph (chain nodes just have no
+    super-edges of their own), so heuristics and landmark tables apply as
+    they are. chain_nodes[chain_ptr[e]:chain_ptr[e + 1]] are the chain
+    nodes crossed by super-edge e, in order, and chain_edges holds the full
+    graph edges it replaces (one more than its chain nodes).
+    """
+    def __init__(self, indptr, indices, weights, chain_ptr, chain_nodes, chain_edges, interior):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.chain_ptr = chain_ptr
+        self.chain_nodes = chain_nodes
+        self.chain_edges = chain_edges
+        self.interior = interior
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @property
+    def num_interior(self):
+        return int(self.interior.sum())
+
+    def nbytes(self):
+        arrays = [self.indptr, self.indices, self.weights, self.chain_ptr, self.chain_nodes, self.chain_edges, self.interior]
+        return sum(a.nbytes for a in arrays)
+
+    @classmethod
+    def build(cls, indptr, indices, weights, keep):
+        """
+        Contracts the CSR graph (indptr, indices, weights). keep marks the
+        decision nodes that must stay whatever their degree.
+        """
+        indptr = np.asarray(indptr)
+        indices = np.asarray(indices)
+        weights = np.asarray(weights)
+        n = len(indptr) - 1
+        out_degree = np.diff(indptr)
+        sources = np.repeat(np.arange(n), out_degree)
+        in_degree = np.bincount(indices, minlength=n)
+
+        # Predecessors grouped by node, like the successors in indices
+        order = np.argsort(indices, kind='stable')
+        rev_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(in_degree, out=rev_indptr[1:])
+        predecessors = sources[order]
+
+        interior = np.zeros(n, dtype=bool)
+        one_way = np.flatnonzero(~keep & (out_degree == 1) & (in_degree == 1))
+        interior[one_way] = indices[indptr[one_way]] != predecessors[rev_indptr[one_way]]
+        two_way = np.flatnonzero(~keep & (out_degree == 2) & (in_degree == 2))
+        successor_pairs = np.sort(np.stack([indices[indptr[two_way]], indices[indptr[two_way] + 1]], axis=1), axis=1)
+        predecessor_pairs = np.sort(np.stack([predecessors[rev_indptr[two_way]], predecessors[rev_indptr[two_way] + 1]], axis=1), axis=1)
+        interior[two_way] = (successor_pairs == predecessor_pairs).all(axis=1) & (successor_pairs[:, 0] != successor_pairs[:, 1])
+
+        # Edges between decision nodes are kept as they are; the ones entering a chain are walked to its end
+        entering = np.flatnonzero(~interior[sources] & interior[indices])
+        plain = np.flatnonzero(~interior[sources] & ~interior[indices])
+        indptr_list = indptr.tolist()
+        indices_list = indices.tolist()
+        weights_list = weights.tolist()
+        interior_list = interior.tolist()
+        chain_sources, chain_targets, chain_weights = [], [], []
+        chain_lengths, chain_nodes, chain_edges = [], [], []
+        for e in entering.tolist():
+            source = int(sources[e])
+            prev = source
+            node = indices_list[e]
+            cost = weights_list[e]
+            edges = [e]
+            start = len(chain_nodes)
+            # Walks always end on a decision node: a chain node is only entered through its chain
+            while interior_list[node]:
+                chain_nodes.append(node)
+                lo = indptr_list[node]
+                step = lo if indices_list[lo] != prev else lo + 1
+                cost += weights_list[step]
+                edges.append(step)
+                prev, node = node, indices_list[step]
+            chain_sources.append(source)
+            chain_targets.append(node)
+            chain_weights.append(cost)
+            chain_lengths.append(len(chain_nodes) - start)
+            chain_edges.extend(edges)
+
+        # Super-edges sorted by source, plain edges of a node before its chains
+        all_sources = np.concatenate([sources[plain], np.asarray(chain_sources, dtype=np.int64)])
+        order = np.argsort(all_sources, kind='stable')
+        compact_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(all_sources, minlength=n), out=compact_indptr[1:])
+        compact_indices = np.concatenate([indices[plain], np.asarray(chain_targets, dtype=np.int64)])[order]
+        compact_weights = np.concatenate([weights[plain], np.asarray(chain_weights, dtype=np.float64)])[order]
+
+        # Chains (and the edges they replace) in super-edge order; plain edges have an empty chain
+        node_lengths = np.concatenate([np.zeros(len(plain), dtype=np.int64), np.asarray(chain_lengths, dtype=np.int64)])
+        node_values = np.asarray(chain_nodes, dtype=np.int64)
+        edge_values = np.concatenate([plain, np.asarray(chain_edges, dtype=np.int64)])
+        chain_ptr, chain_nodes = _reorder_segments(node_values, node_lengths, order)
+        _, chain_edges = _reorder_segments(edge_values, node_lengths + 1, order)
+        return cls(compact_indptr, compact_indices, compact_weights, chain_ptr, chain_nodes, chain_edges, interior)
+
+    def chain(self, edge):
+        """Chain nodes crossed by super-edge edge, in order"""
+        return self.chain_nodes[self.chain_ptr[edge]:self.chain_ptr[edge + 1]].tolist()
+
+    def blocked(self, blocked_edges):
+        """Super-edge mask from a full graph edge mask: a super-edge is blocked if any of its edges is"""
+        if blocked_edges is None or self.num_edges == 0:
+            return None
+        starts = self.chain_ptr[:-1] + np.arange(self.num_edges)
+        return np.logical_or.reduceat(blocked_edges[self.chain_edges], starts)
+
+def _reorder_segments(values, lengths, order):
+    """
+    values split in consecutive segments of the given lengths, rearranged in
+    order. Returns (ptr, values) with segment k at values[ptr[k]:ptr[k + 1]].
+    """
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    lengths = lengths[order]
+    ptr = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=ptr[1:])
+    gather = np.repeat(starts[order] - ptr[:-1], lengths) + np.arange(ptr[-1])
+    return ptr, values[gather]
@@ -1,24 +1,210 @@
-import networkx as nx
+import numpy as np
 import pandas as pd
 import math
-import io
+import os
+import json
+import re
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
 import heapq
+import itertools
+import time
 
-from pyproj import Transformer
+import shapely
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from modules.poses_geometry.spatial_index import NodeSpatialIndex
+from modules.poses_geometry import runtime_obstacles
+from modules.poses_geometry import plan_table
+from modules.poses_geometry import reprojection
+from modules.poses_geometry.graph_compaction import CompactGraph, CHAIN_POSE_TYPES
+from config import GENERATED_DIR, PLANS_DIR, GRAPH_REGISTRY_MAX_MB, GRAPH_COMPACTION
+
+# A* heuristic used when the caller does not ask for one ('alt' or 'euclidean')
+DEFAULT_HEURISTIC = 'alt'
+# Number of ALT landmarks (Home + peripheral holes) precomputed on load
+NUM_LANDMARKS = 8
+
+# Binary graph snapshot written next to global_plan.csv (one .npy per array + header.json)
+SNAPSHOT_FORMAT = 'global_plan_graph'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = 'header.json'
+SNAPSHOT_ARRAYS = [
+    'node_ids', 'node_xyt', 'node_latlon', 'node_utm', 'node_pose_type',
+    'indptr', 'indices', 'weights',
+    'drillhole_ids', 'drillhole_nodes',
+    'landmarks', 'landmark_dist_from', 'landmark_dist_to'
+]
+
+def snapshot_dir_for(csv_path):
+    """global_plan.csv -> global_plan_graph/"""
+    return os.path.splitext(csv_path)[0] + '_graph'
+
+def _replace_dir(tmp_dir, target_dir):
+    """Swaps a fully written tmp_dir into place of target_dir (open memmaps of the old one stay valid)"""
+    old_dir = None
+    if os.path.exists(target_dir):
+        old_dir = target_dir + '.old-' + uuid.uuid4().hex[:8]
+        os.rename(target_dir, old_dir)
+    os.rename(tmp_dir, target_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+def copy_snapshot(src_dir, dst_dir):
+    """Publishes a copy of a snapshot, with the same atomic swap as save_snapshot"""
+    tmp_dir = dst_dir + '.tmp-' + uuid.uuid4().hex[:8]
+    try:
+        shutil.copytree(src_dir, tmp_dir)
+        _replace_dir(tmp_dir, dst_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+def _parse_pose(value):
+    """Parses a pose stored either as a list or as its CSV string form "[x, y, theta]" """
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [float(v) for v in value]
+    pose_str = str(value)
+    if not pose_str or pose_str == 'nan' or pose_str == 'None':
+        return None
+    pose_str = pose_str.replace('[', '').replace(']', '').replace("'", "")
+    return [float(v) for v in pose_str.split(',')]
+
+def _parse_connections(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [int(v) for v in value]
+    connections_str = str(value).replace('[', '').replace(']', '')
+    if not connections_str or connections_str == 'nan':
+        return []
+    return [int(conn) for conn in connections_str.split(',') if conn.strip()]
 
 class GraphManager:
+    """
+    Global plan graph in CSR form. Nodes are addressed by their position
+    (index) in the arrays; node_ids maps index -> graph_id. The arrays are
+    either built from global_plan.csv or opened read-only with numpy.memmap
+    from a binary snapshot, so several workers share the same pages.
+    """
     def __init__(self):
-        self.G = None
-        self.node_data = {}
-        self.pos = {}
+        self.node_ids = None
+        self.node_xyt = None
+        self.node_latlon = None
+        self.node_utm = None
+        self.node_pose_type = None
+        self.pose_types = []
+        self.indptr = None
+        self.indices = None
+        self.weights = None
+        self.id_to_index = {}
         self.drillhole_to_node = {}
-        # Transformer for UTM 19S to WGS84
-        try:
-            self.transformer = Transformer.from_crs("EPSG:32719", "EPSG:4326", always_xy=True)
-        except Exception as e:
-            print(f"Warning: Could not initialize transformer: {e}")
-            self.transformer = None
-        
+        # ALT landmark tables (index space): (N, L) distances landmark -> node and node -> landmark
+        self.landmarks = None
+        self.landmark_dist_from = None
+        self.landmark_dist_to = None
+        self.last_search_stats = {}
+        # KD-trees for nearest / bbox queries, built on first use
+        self._spatial_index = None
+        # Search graph with the street chains contracted, built on first use
+        self._compact = None
+        self._compact_blocked = None
+        # Runtime obstacle overlay: STRtree over edge segments and a mask of disabled edges
+        self._edge_index = None
+        self._edge_rows = None
+        self.blocked_edges = None
+        self.runtime_obstacles = []
+        self.obstacles_path = None
+        self._obstacles_stamp = None
+        self._obstacles_next_expiry = None
+        # Identifies what is currently loaded (snapshot/CSV mtime) so workers can detect a new plan
+        self.source_stamp = None
+
+    def is_loaded(self):
+        return self.node_ids is not None and len(self.node_ids) > 0
+
+    @property
+    def num_nodes(self):
+        return 0 if self.node_ids is None else len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return 0 if self.indices is None else len(self.indices)
+
+    def memory_bytes(self):
+        """Approximate footprint of the loaded graph (arrays + id lookup dict)"""
+        arrays = [self.node_ids, self.node_xyt, self.node_latlon, self.node_utm, self.node_pose_type,
+                  self.indptr, self.indices, self.weights, self.landmark_dist_from, self.landmark_dist_to]
+        total = sum(a.nbytes for a in arrays if a is not None)
+        if self._compact is not None:
+            total += self._compact.nbytes()
+        return total + 100 * len(self.id_to_index)
+
+    def _reset_derived(self):
+        """Drops the indexes and overlays computed from the previously loaded arrays"""
+        self._spatial_index = None
+        self._compact = None
+        self._compact_blocked = None
+        self._edge_index = None
+        self._edge_rows = None
+        self.blocked_edges = None
+        self.runtime_obstacles = []
+        self._obstacles_stamp = None
+        self._obstacles_next_expiry = None
+
+    def ensure_loaded(self, csv_path):
+        """
+        Loads the plan at csv_path unless the same version is already loaded.
+        Prefers the binary snapshot, then the typed global plan table, when
+        they are at least as new as the CSV.
+        Cheap enough (a couple of stat calls) to run on every request, which
+        lets every uvicorn worker pick up a plan generated by another one.
+        Runtime obstacles are re-synced the same way.
+        """
+        if not self._ensure_graph_loaded(csv_path):
+            return False
+        self.obstacles_path = runtime_obstacles.obstacles_path_for(csv_path)
+        self.sync_runtime_obstacles()
+        return True
+
+    def _ensure_graph_loaded(self, csv_path):
+        snapshot_dir = snapshot_dir_for(csv_path)
+        header_path = os.path.join(snapshot_dir, SNAPSHOT_HEADER)
+        csv_mtime = os.stat(csv_path).st_mtime_ns if os.path.exists(csv_path) else None
+
+        if os.path.exists(header_path):
+            header_mtime = os.stat(header_path).st_mtime_ns
+            if csv_mtime is None or header_mtime >= csv_mtime:
+                stamp = ('snapshot', snapshot_dir, header_mtime)
+                if self.is_loaded() and self.source_stamp == stamp:
+                    return True
+                if self.load_snapshot(snapshot_dir):
+                    self.source_stamp = stamp
+                    return True
+
+        # Typed table next, the CSV is only read as a fallback
+        table_path = plan_table.plan_table_path_for(csv_path)
+        if os.path.exists(table_path):
+            table_mtime = os.stat(table_path).st_mtime_ns
+            if csv_mtime is None or table_mtime >= csv_mtime:
+                stamp = ('table', table_path, table_mtime)
+                if self.is_loaded() and self.source_stamp == stamp:
+                    return True
+                if self.load_graph_from_table(table_path):
+                    self.source_stamp = stamp
+                    return True
+
+        if csv_mtime is None:
+            return self.is_loaded()
+        stamp = ('csv', csv_path, csv_mtime)
+        if self.is_loaded() and self.source_stamp == stamp:
+            return True
+        if self.load_graph_from_csv(csv_path):
+            self.source_stamp = stamp
+            return True
+        return False
+
     def load_graph_from_csv(self, csv_path):
         """
         Loads the graph from the global_plan.csv file.
@@ -26,171 +212,630 @@ class GraphManager:
         """
         try:
             df = pd.read_csv(csv_path)
-            self.G = nx.DiGraph()
-            self.node_data = {}
-            self.pos = {}
-            self.drillhole_to_node = {}
-            
+        except Exception as e:
+            print(f"Error loading graph from CSV: {e}")
+            return False
+        return self.load_graph_from_dataframe(df)
+
+    def load_graph_from_dataframe(self, df):
+        """
+        Builds the graph from a global plan dataframe, either read back from
+        global_plan.csv (poses as strings) or the in-memory one (poses as lists).
+        """
+        try:
+            node_ids = []
+            local_poses = []
+            global_xy = []
+            pose_type_names = []
+            connections = []
+            drillhole_to_node = {}
+
             # First pass: Create nodes
             for index, row in df.iterrows():
-                row_type = row.get('type')
-                
-                if row_type == 'graph_pose':
-                    # Parse graph_pose_local "x,y,theta" if available, else try graph_pose
+                if row.get('type') != 'graph_pose':
+                    continue
+                try:
                     # The notebook uses 'graph_pose_local' primarily for construction
-                    pose_str = str(row.get('graph_pose_local', ''))
-                    
-                    if not pose_str or pose_str == 'nan':
-                         continue
+                    parts = _parse_pose(row.get('graph_pose_local', ''))
+                    if parts is None or len(parts) < 3:
+                        continue
+                    if pd.isna(row.get('graph_id')):
+                        continue
 
+                    node_id = int(row['graph_id'])
+
+                    # Global Coordinates (UTM) from graph_pose, converted to Lat/Lon in bulk below
+                    utm = (math.nan, math.nan)
                     try:
-                        pose_str = pose_str.replace('[', '').replace(']', '')
-                        parts = [float(x) for x in pose_str.split(',')]
-                        if len(parts) >= 3:
-                            x, y, theta = parts[0], parts[1], parts[2]
-                            
-                            if pd.isna(row.get('graph_id')): 
-                                continue
-                            
-                            node_id = int(row['graph_id'])
-                            
-                            # Try to get Global Coordinates (UTM) from graph_pose column if available
-                            # This is usually what we want for the map
-                            lat, lon = y, x # Default fallback
-                            
-                            # Try parsing global pose
-                            global_pose_str = str(row.get('graph_pose', ''))
-                            if global_pose_str and global_pose_str != 'nan' and self.transformer:
-                                try:
-                                    g_pose_str = global_pose_str.replace('[', '').replace(']', '').replace("'", "")
-                                    g_parts = [float(val) for val in g_pose_str.split(',')]
-                                    if len(g_parts) >= 2:
-                                        utm_x, utm_y = g_parts[0], g_parts[1]
-                                        # Convert to Lat/Lon
-                                        lon, lat = self.transformer.transform(utm_x, utm_y)
-                                except Exception as e2:
-                                    # print(f"Error parsing global pose: {e2}")
-                                    pass
-
-                            # Add node
-                            self.G.add_node(node_id, x=x, y=y, theta=theta, lat=lat, lon=lon, type=row.get('pose_type'))
-                            self.pos[node_id] = (x, y)
-                            self.node_data[node_id] = {'x': x, 'y': y, 'theta': theta, 'lat': lat, 'lon': lon}
-
-                            # Mappings
-                            pose_type = str(row.get('pose_type'))
-                            if pose_type == 'home_pose':
-                                self.drillhole_to_node['Home'] = node_id
-                            
-                            drill_id = row.get('drillhole_id')
-                            if pd.notna(drill_id) and drill_id != -1:
-                                self.drillhole_to_node[int(drill_id)] = node_id
-                    except Exception as e:
-                        print(f"Error parsing node row {index}: {e}")
-                        continue
+                        g_parts = _parse_pose(row.get('graph_pose', ''))
+                        if g_parts is not None and len(g_parts) >= 2:
+                            utm = (g_parts[0], g_parts[1])
+                    except Exception:
+                        pass
+
+                    node_ids.append(node_id)
+                    local_poses.append(parts[0:3])
+                    global_xy.append(utm)
+                    pose_type_names.append(str(row.get('pose_type')))
+                    connections.append(row.get('connections', ''))
+
+                    # Mappings
+                    if pose_type_names[-1] == 'home_pose':
+                        drillhole_to_node['Home'] = node_id
+
+                    drill_id = row.get('drillhole_id')
+                    if pd.notna(drill_id) and drill_id != -1:
+                        drillhole_to_node[int(drill_id)] = node_id
+                except Exception as e:
+                    print(f"Error parsing node row {index}: {e}")
+                    continue
+
+            self._set_nodes(node_ids, local_poses, global_xy, pose_type_names, drillhole_to_node)
 
             # Second pass: Create edges
-            angle_weight = 1.0
-            
-            def calculate_weight(n1, n2):
-                dx = n1['x'] - n2['x']
-                dy = n1['y'] - n2['y']
-                dpos = math.sqrt(dx*dx + dy*dy)
-                
-                z1 = math.sin(n1['theta'] / 2)
-                w1 = math.cos(n1['theta'] / 2)
-                z2 = math.sin(n2['theta'] / 2)
-                w2 = math.cos(n2['theta'] / 2)
-                
-                dot_prod = z1*z2 + w1*w2
-                if dot_prod > 1.0: dot_prod = 0.9999
-                if dot_prod < -1.0: dot_prod = -0.9999
-                
-                dangle = 2 * math.acos(abs(dot_prod))
-                return dpos + dangle * angle_weight + 1.1
+            sources = []
+            targets = []
+            for i, value in enumerate(connections):
+                try:
+                    for target_id in _parse_connections(value):
+                        j = self.id_to_index.get(target_id)
+                        if j is not None:
+                            sources.append(i)
+                            targets.append(j)
+                except Exception as e:
+                    print(f"Error parsing connections of node {node_ids[i]}: {e}")
+                    continue
+            self._build_csr(np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64))
 
-            for index, row in df.iterrows():
-                if row.get('type') == 'graph_pose':
-                    try:
-                        source_id = int(row['graph_id'])
-                        connections_str = str(row.get('connections', '')).replace('[', '').replace(']', '')
-                        
-                        if connections_str and connections_str != 'nan':
-                            conn_parts = connections_str.split(',')
-                            for conn in conn_parts:
-                                if conn.strip():
-                                    target_id = int(conn)
-                                    if source_id in self.node_data and target_id in self.node_data:
-                                        weight = calculate_weight(self.node_data[source_id], self.node_data[target_id])
-                                        self.G.add_edge(source_id, target_id, weight=weight)
-                    except Exception as e:
-                        print(f"Error parsing connections row {index}: {e}")
-                        continue
-                        
-            print(f"Graph loaded: {self.G.number_of_nodes()} nodes, {self.G.number_of_edges()} edges")
+            print(f"Graph loaded: {self.num_nodes} nodes, {self.num_edges} edges")
+            self.build_landmarks()
             return True
         except Exception as e:
-            print(f"Error loading graph from CSV: {e}")
+            print(f"Error loading graph: {e}")
+            return False
+
+    def load_graph_from_table(self, table_path):
+        """Loads the graph from the typed global plan table (global_plan.parquet), without parsing text"""
+        try:
+            nodes = plan_table.read_graph_nodes(table_path)
+            if nodes is None:
+                return False
+            node_ids = nodes['graph_id']
+            pose_types = nodes['pose_type']
+            drillhole_ids = nodes['drillhole_id']
+
+            drillhole_to_node = {}
+            home = np.flatnonzero(pose_types == 'home_pose')
+            if len(home):
+                drillhole_to_node['Home'] = int(node_ids[home[-1]])
+            has_drillhole = ~np.isnan(drillhole_ids) & (drillhole_ids != -1)
+            drillhole_to_node.update(zip(drillhole_ids[has_drillhole].astype(np.int64).tolist(), node_ids[has_drillhole].tolist()))
+            self._set_nodes(node_ids, nodes['xyt'], nodes['utm'], pose_types.tolist(), drillhole_to_node)
+
+            # Connections are graph IDs; those of unknown nodes are dropped
+            offsets = nodes['connection_offsets']
+            sources = np.repeat(np.arange(self.num_nodes), np.diff(offsets))
+            order = np.argsort(self.node_ids, kind='stable')
+            sorted_ids = self.node_ids[order]
+            position = np.minimum(np.searchsorted(sorted_ids, nodes['connection_ids']), max(len(sorted_ids) - 1, 0))
+            known = (sorted_ids[position] == nodes['connection_ids']) if len(sorted_ids) else np.zeros(len(sources), dtype=bool)
+            self._build_csr(sources[known], order[position[known]])
+
+            print(f"Graph loaded from table: {self.num_nodes} nodes, {self.num_edges} edges")
+            self.build_landmarks()
+            return True
+        except Exception as e:
+            print(f"Error loading graph from table: {e}")
             return False
 
-    def find_path(self, start_id, goal_id):
-        if self.G is None:
+    def _set_nodes(self, node_ids, local_poses, global_xy, pose_type_names, drillhole_to_node):
+        """Sets the node arrays (index order = given order) and derives pose type codes and Lat/Lon"""
+        n = len(node_ids)
+        self._reset_derived()
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.node_xyt = np.asarray(local_poses, dtype=np.float64).reshape(n, 3)
+        self.id_to_index = {node_id: i for i, node_id in enumerate(self.node_ids.tolist())}
+        self.drillhole_to_node = drillhole_to_node
+
+        self.pose_types = sorted(set(pose_type_names))
+        type_codes = {name: code for code, name in enumerate(self.pose_types)}
+        self.node_pose_type = np.asarray([type_codes[name] for name in pose_type_names], dtype=np.int8)
+
+        # Lat/Lon, falling back to the local coordinates when there is no global pose
+        self.node_utm = np.asarray(global_xy, dtype=np.float64).reshape(n, 2)
+        self.node_latlon = np.column_stack([self.node_xyt[:, 1], self.node_xyt[:, 0]])
+        valid = ~np.isnan(self.node_utm).any(axis=1)
+        if valid.any():
+            try:
+                lon, lat = reprojection.transform_xy(self.node_utm[valid, 0], self.node_utm[valid, 1], reprojection.UTM_CRS, reprojection.WGS84_CRS)
+                self.node_latlon[valid, 0] = lat
+                self.node_latlon[valid, 1] = lon
+            except Exception as e:
+                print(f"Warning: Could not convert the nodes to lat/lon: {e}")
+
+    def _build_csr(self, sources, targets):
+        """Sorts (deduplicated) edges by source into indptr/indices and computes their weights"""
+        n = self.num_nodes
+        keys = np.unique(sources * max(n, 1) + targets)
+        sources = keys // max(n, 1)
+        targets = keys % max(n, 1)
+
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=self.indptr[1:])
+        self.indices = targets.astype(np.int64)
+        self.weights = self.calculate_weights(sources, targets)
+
+    def calculate_weights(self, sources, targets, angle_weight=1.0):
+        """Edge cost: position distance + heading change (quaternion angle) + 1.1 per edge"""
+        x1, y1, t1 = self.node_xyt[sources].T
+        x2, y2, t2 = self.node_xyt[targets].T
+        dpos = np.hypot(x1 - x2, y1 - y2)
+
+        dot_prod = np.sin(t1 / 2) * np.sin(t2 / 2) + np.cos(t1 / 2) * np.cos(t2 / 2)
+        dot_prod = np.where(dot_prod > 1.0, 0.9999, dot_prod)
+        dot_prod = np.where(dot_prod < -1.0, -0.9999, dot_prod)
+
+        dangle = 2 * np.arccos(np.abs(dot_prod))
+        return dpos + dangle * angle_weight + 1.1
+
+    def save_snapshot(self, snapshot_dir):
+        """
+        Writes the graph as raw .npy arrays plus a version header. The new
+        snapshot is assembled in a temporary directory and swapped in, so
+        readers never see a half-written one (open memmaps stay valid).
+        """
+        if not self.is_loaded():
             raise ValueError("Graph not loaded")
-            
+
+        tmp_dir = snapshot_dir + '.tmp-' + uuid.uuid4().hex[:8]
+        os.makedirs(tmp_dir)
+        try:
+            arrays = {
+                'node_ids': self.node_ids,
+                'node_xyt': self.node_xyt,
+                'node_latlon': self.node_latlon,
+                'node_utm': self.node_utm,
+                'node_pose_type': self.node_pose_type,
+                'indptr': self.indptr,
+                'indices': self.indices,
+                'weights': self.weights,
+                'drillhole_ids': np.asarray([k for k in self.drillhole_to_node if k != 'Home'], dtype=np.int64),
+                'drillhole_nodes': np.asarray([v for k, v in self.drillhole_to_node.items() if k != 'Home'], dtype=np.int64),
+                'landmarks': np.asarray(self.landmarks if self.landmarks is not None else [], dtype=np.int64),
+                'landmark_dist_from': self.landmark_dist_from if self.landmark_dist_from is not None else np.zeros((self.num_nodes, 0)),
+                'landmark_dist_to': self.landmark_dist_to if self.landmark_dist_to is not None else np.zeros((self.num_nodes, 0)),
+            }
+            for name in SNAPSHOT_ARRAYS:
+                np.save(os.path.join(tmp_dir, name + '.npy'), np.ascontiguousarray(arrays[name]))
+
+            header = {
+                'format': SNAPSHOT_FORMAT,
+                'version': SNAPSHOT_VERSION,
+                'num_nodes': self.num_nodes,
+                'num_edges': self.num_edges,
+                'home_node': self.drillhole_to_node.get('Home'),
+                'pose_types': self.pose_types,
+                'arrays': SNAPSHOT_ARRAYS
+            }
+            # Header last: its presence marks a complete snapshot
+            with open(os.path.join(tmp_dir, SNAPSHOT_HEADER), 'w') as f:
+                json.dump(header, f)
+
+            _replace_dir(tmp_dir, snapshot_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        print(f"Graph snapshot written to {snapshot_dir}")
+
+    def load_snapshot(self, snapshot_dir):
+        """Opens a snapshot written by save_snapshot; arrays are read-only memmaps"""
+        try:
+            t0 = time.perf_counter()
+            with open(os.path.join(snapshot_dir, SNAPSHOT_HEADER), 'r') as f:
+                header = json.load(f)
+            if header.get('format') != SNAPSHOT_FORMAT or header.get('version') != SNAPSHOT_VERSION:
+                print(f"Ignoring graph snapshot {snapshot_dir}: unsupported version {header.get('version')}")
+                return False
+
+            arrays = {}
+            for name in SNAPSHOT_ARRAYS:
+                arrays[name] = np.load(os.path.join(snapshot_dir, name + '.npy'), mmap_mode='r')
+
+            self._reset_derived()
+            self.node_ids = arrays['node_ids']
+            self.node_xyt = arrays['node_xyt']
+            self.node_latlon = arrays['node_latlon']
+            self.node_utm = arrays['node_utm']
+            self.node_pose_type = arrays['node_pose_type']
+            self.pose_types = header['pose_types']
+            self.indptr = arrays['indptr']
+            self.indices = arrays['indices']
+            self.weights = arrays['weights']
+            self.id_to_index = {node_id: i for i, node_id in enumerate(self.node_ids.tolist())}
+
+            self.drillhole_to_node = {}
+            if header.get('home_node') is not None:
+                self.drillhole_to_node['Home'] = header['home_node']
+            for drill_id, node_id in zip(arrays['drillhole_ids'].tolist(), arrays['drillhole_nodes'].tolist()):
+                self.drillhole_to_node[drill_id] = node_id
+
+            if len(arrays['landmarks']) > 0:
+                self.landmarks = arrays['landmarks']
+                self.landmark_dist_from = arrays['landmark_dist_from']
+                self.landmark_dist_to = arrays['landmark_dist_to']
+            else:
+                self.build_landmarks()
+
+            print(f"Graph snapshot loaded: {self.num_nodes} nodes, {self.num_edges} edges ({(time.perf_counter() - t0)*1000:.1f} ms)")
+            return True
+        except Exception as e:
+            print(f"Error loading graph snapshot: {e}")
+            return False
+
+    def select_landmarks(self, num_landmarks=NUM_LANDMARKS):
+        """
+        Picks Home plus the most peripheral holes by farthest-point sampling,
+        so the landmarks surround the rest of the graph. Returns node indices.
+        """
+        candidates = [self.id_to_index[nid] for nid in self.drillhole_to_node.values() if nid in self.id_to_index]
+        if not candidates:
+            candidates = list(range(self.num_nodes))
+        if not candidates:
+            return []
+        candidates = np.unique(np.asarray(candidates, dtype=np.int64))
+
+        home_index = self.id_to_index.get(self.drillhole_to_node.get('Home'))
+        landmarks = [home_index if home_index is not None else int(candidates[0])]
+
+        xy = self.node_xyt[candidates, 0:2]
+        # Distance from every candidate to its closest landmark so far
+        min_dist = np.hypot(*(xy - self.node_xyt[landmarks[0], 0:2]).T)
+
+        while len(landmarks) < min(num_landmarks, len(candidates)):
+            k = int(np.argmax(min_dist))
+            if min_dist[k] <= 0.0:
+                break
+            landmarks.append(int(candidates[k]))
+            min_dist = np.minimum(min_dist, np.hypot(*(xy - xy[k]).T))
+        return landmarks
+
+    def build_landmarks(self, num_landmarks=NUM_LANDMARKS):
+        """Precomputes shortest distances to and from each landmark for the ALT heuristic"""
+        self.landmarks = None
+        self.landmark_dist_from = None
+        self.landmark_dist_to = None
+        if not self.is_loaded() or num_landmarks <= 0:
+            return
+
+        t0 = time.perf_counter()
+        landmarks = self.select_landmarks(num_landmarks)
+        n = self.num_nodes
+        matrix = csr_matrix((np.asarray(self.weights), np.asarray(self.indices), np.asarray(self.indptr)), shape=(n, n))
+        self.landmark_dist_from = np.ascontiguousarray(dijkstra(matrix, directed=True, indices=landmarks).T)
+        self.landmark_dist_to = np.ascontiguousarray(dijkstra(matrix.T.tocsr(), directed=True, indices=landmarks).T)
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        print(f"ALT landmarks ready: {self.node_ids[self.landmarks].tolist()} ({(time.perf_counter() - t0)*1000:.1f} ms)")
+
+    def _euclidean(self, u, v):
+        return math.hypot(self.node_xyt[u, 0] - self.node_xyt[v, 0], self.node_xyt[u, 1] - self.node_xyt[v, 1])
+
+    def _alt_heuristic(self, goal):
+        """
+        Returns h(u) = max over landmarks L of the triangle-inequality bounds
+        d(L,goal) - d(L,u) and d(u,L) - d(goal,L). The Euclidean distance is also
+        a lower bound (edge weights are dpos + angle + 1.1), so the max of both is kept.
+        """
+        dist_from = self.landmark_dist_from
+        dist_to = self.landmark_dist_to
+        # Landmarks that cannot reach (or be reached from) the goal give no bound
+        usable = np.isfinite(dist_from[goal]) & np.isfinite(dist_to[goal])
+        if not usable.any():
+            return lambda u: self._euclidean(u, goal)
+        from_goal = dist_from[goal][usable]
+        to_goal = dist_to[goal][usable]
+
+        def heuristic(u):
+            h = self._euclidean(u, goal)
+            h = max(h, float((from_goal - dist_from[u][usable]).max()))
+            h = max(h, float((dist_to[u][usable] - to_goal).max()))
+            return h
+
+        return heuristic
+
+    def decision_nodes(self):
+        """
+        Nodes kept by the chain compaction whatever their degree: Home,
+        holes and any other non street pose, plus the street poses linked
+        to them (where the hole approaches start).
+        """
+        chain_codes = [code for code, name in enumerate(self.pose_types) if name in CHAIN_POSE_TYPES]
+        fixed = ~np.isin(self.node_pose_type, chain_codes)
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        targets = np.asarray(self.indices)
+        touching = fixed[sources] | fixed[targets]
+        keep = fixed.copy()
+        keep[sources[touching]] = True
+        keep[targets[touching]] = True
+        drillhole_nodes = [self.id_to_index[nid] for nid in self.drillhole_to_node.values() if nid in self.id_to_index]
+        keep[drillhole_nodes] = True
+        return keep
+
+    def compact_graph(self):
+        """Contracted search graph, or None when the plan has no street chains to contract"""
+        if self._compact is None:
+            if not self.is_loaded():
+                raise ValueError("Graph not loaded")
+            t0 = time.perf_counter()
+            self._compact = CompactGraph.build(self.indptr, self.indices, self.weights, self.decision_nodes())
+            self._compact_blocked = None
+            print(f"Graph compaction: {self._compact.num_interior} chain nodes contracted, {self.num_edges} -> {self._compact.num_edges} edges ({(time.perf_counter() - t0)*1000:.1f} ms)")
+        return self._compact if self._compact.num_interior > 0 else None
+
+    def _astar(self, start, goal, heuristic, compact=None):
+        """
+        Plain A* over the CSR arrays (node indices), or over the contracted
+        graph when compact is given (then the chains of the super-edges
+        taken are expanded back into the path). Returns (path, expanded)
+        where expanded counts the nodes popped and relaxed; path is None when
+        the goal is unreachable.
+        """
+        if compact is None:
+            indptr = self.indptr
+            indices = self.indices
+            weights = self.weights
+            blocked = self.blocked_edges
+        else:
+            indptr = compact.indptr
+            indices = compact.indices
+            weights = compact.weights
+            if self._compact_blocked is None and self.blocked_edges is not None:
+                self._compact_blocked = compact.blocked(self.blocked_edges)
+            blocked = self._compact_blocked
+        counter = itertools.count()
+        open_heap = [(heuristic(start), next(counter), start)]
+        g_score = {start: 0.0}
+        came_from = {}
+        closed = set()
+        expanded = 0
+
+        while open_heap:
+            _, _, u = heapq.heappop(open_heap)
+            if u in closed:
+                continue
+            if u == goal:
+                path = [u]
+                while u in came_from:
+                    u, edge = came_from[u]
+                    if compact is not None:
+                        path.extend(reversed(compact.chain(edge)))
+                    path.append(u)
+                path.reverse()
+                return path, expanded
+
+            closed.add(u)
+            expanded += 1
+            g_u = g_score[u]
+            lo, hi = int(indptr[u]), int(indptr[u + 1])
+            if blocked is None:
+                edges = zip(range(lo, hi), indices[lo:hi].tolist(), weights[lo:hi].tolist())
+            else:
+                # Skip edges disabled by runtime obstacles
+                free = np.flatnonzero(~blocked[lo:hi])
+                edges = zip((lo + free).tolist(), indices[lo:hi][free].tolist(), weights[lo:hi][free].tolist())
+            for edge, v, w in edges:
+                if v in closed:
+                    continue
+                tentative = g_u + w
+                if tentative < g_score.get(v, math.inf):
+                    g_score[v] = tentative
+                    came_from[v] = (u, edge)
+                    heapq.heappush(open_heap, (tentative + heuristic(v), next(counter), v))
+
+        return None, expanded
+
+    def node_record(self, index):
+        x, y, theta = self.node_xyt[index].tolist()
+        lat, lon = self.node_latlon[index].tolist()
+        return {
+            'id': int(self.node_ids[index]),
+            'x': x,
+            'y': y,
+            'theta': theta,
+            'lat': lat,
+            'lon': lon
+        }
+
+    def edge_index(self):
+        """
+        STRtree over the edge segments in UTM. Returns (tree, edge_rows) where
+        edge_rows maps tree item -> CSR edge position (edges with an endpoint
+        lacking UTM coordinates are left out).
+        """
+        if self._edge_index is None:
+            if not self.is_loaded():
+                raise ValueError("Graph not loaded")
+            sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+            targets = np.asarray(self.indices)
+            coords = np.stack([self.node_utm[sources], self.node_utm[targets]], axis=1)
+            rows = np.flatnonzero(np.isfinite(coords).all(axis=(1, 2)))
+            self._edge_rows = rows
+            self._edge_index = shapely.STRtree(shapely.linestrings(coords[rows]))
+        return self._edge_index, self._edge_rows
+
+    def edges_intersecting(self, geometry):
+        """CSR edge positions whose segment intersects geometry (UTM)"""
+        tree, rows = self.edge_index()
+        return rows[tree.query(geometry, predicate='intersects')]
+
+    def sync_runtime_obstacles(self):
+        """Rebuilds the blocked edge mask if the obstacles file changed or an obstacle expired"""
+        if self.obstacles_path is None:
+            return
+        stamp = os.stat(self.obstacles_path).st_mtime_ns if os.path.exists(self.obstacles_path) else None
+        now = time.time()
+        expired = self._obstacles_next_expiry is not None and now >= self._obstacles_next_expiry
+        if stamp == self._obstacles_stamp and not expired:
+            return
+
+        obstacles = [o for o in runtime_obstacles.load_obstacles(self.obstacles_path) if runtime_obstacles.is_active(o, now)]
+        blocked = np.zeros(self.num_edges, dtype=bool)
+        for obstacle in obstacles:
+            try:
+                hits = self.edges_intersecting(shapely.from_wkt(obstacle['wkt']))
+                blocked[hits] = True
+                obstacle['blocked_edges'] = int(len(hits))
+            except Exception as e:
+                print(f"Error applying runtime obstacle {obstacle.get('id')}: {e}")
+
+        self.runtime_obstacles = obstacles
+        self.set_blocked_edges(blocked)
+        expiries = [o['expires_at'] for o in obstacles if o.get('expires_at') is not None]
+        self._obstacles_next_expiry = min(expiries) if expiries else None
+        self._obstacles_stamp = stamp
+        print(f"Runtime obstacles: {len(obstacles)} active, {int(blocked.sum())} edges blocked")
+
+    def set_blocked_edges(self, blocked):
+        """Replaces the mask of disabled edges (one bool per CSR edge, None or all False for none)"""
+        self.blocked_edges = blocked if blocked is not None and blocked.any() else None
+        self._compact_blocked = None
+
+    def add_runtime_obstacle(self, geometry, ttl_seconds=None, label=None):
+        """Blocks the edges crossing geometry (shapely, UTM) until it expires or is removed"""
+        if self.obstacles_path is None:
+            raise ValueError("Graph not loaded")
+        if geometry.is_empty or not geometry.is_valid:
+            raise ValueError("Obstacle geometry is empty or invalid")
+        obstacle = runtime_obstacles.add_obstacle(self.obstacles_path, shapely.to_wkt(geometry), ttl_seconds, label)
+        self.sync_runtime_obstacles()
+        for active in self.runtime_obstacles:
+            if active['id'] == obstacle['id']:
+                return active
+        return obstacle
+
+    def remove_runtime_obstacle(self, obstacle_id):
+        if self.obstacles_path is None:
+            return False
+        removed = runtime_obstacles.remove_obstacle(self.obstacles_path, obstacle_id)
+        self.sync_runtime_obstacles()
+        return removed
+
+    def clear_runtime_obstacles(self):
+        if self.obstacles_path is None:
+            return
+        runtime_obstacles.clear_obstacles(self.obstacles_path)
+        self.sync_runtime_obstacles()
+
+    # Fields that node_fields() can return, computed per column for the selected nodes
+    NODE_FIELDS = ['id', 'x', 'y', 'theta', 'lat', 'lon', 'utm_x', 'utm_y', 'pose_type', 'drillhole_id']
+
+    def spatial_index(self):
+        if self._spatial_index is None:
+            if not self.is_loaded():
+                raise ValueError("Graph not loaded")
+            self._spatial_index = NodeSpatialIndex(self.node_latlon, self.node_utm)
+        return self._spatial_index
+
+    def node_fields(self, indices, fields):
+        """Returns one dict per node index holding only the requested fields"""
+        unknown = [f for f in fields if f not in self.NODE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown node fields {unknown} (available: {self.NODE_FIELDS})")
+
+        indices = np.asarray(indices, dtype=np.int64)
+        columns = {}
+        for field in fields:
+            if field == 'id':
+                columns[field] = self.node_ids[indices].tolist()
+            elif field in ('x', 'y', 'theta'):
+                columns[field] = self.node_xyt[indices, ['x', 'y', 'theta'].index(field)].tolist()
+            elif field in ('lat', 'lon'):
+                columns[field] = self.node_latlon[indices, ['lat', 'lon'].index(field)].tolist()
+            elif field in ('utm_x', 'utm_y'):
+                values = self.node_utm[indices, ['utm_x', 'utm_y'].index(field)]
+                columns[field] = [None if math.isnan(v) else v for v in values.tolist()]
+            elif field == 'pose_type':
+                columns[field] = [self.pose_types[code] for code in self.node_pose_type[indices].tolist()]
+            elif field == 'drillhole_id':
+                node_to_drillhole = {nid: k for k, nid in self.drillhole_to_node.items() if k != 'Home'}
+                columns[field] = [node_to_drillhole.get(nid) for nid in self.node_ids[indices].tolist()]
+
+        return [dict(zip(fields, values)) for values in zip(*[columns[f] for f in fields])] if fields else [{} for _ in indices]
+
+    def find_path(self, start_id, goal_id, heuristic=None, compact=None):
+        """
+        Shortest path between two graph ids as a list of node records.
+        Searches the contracted graph when compact (GRAPH_COMPACTION by
+        default) is set and both ends are decision nodes; the result is the
+        full pose sequence either way.
+        """
+        if not self.is_loaded():
+            raise ValueError("Graph not loaded")
+
         start_id = int(start_id)
         goal_id = int(goal_id)
 
-        if start_id not in self.G or goal_id not in self.G:
+        if start_id not in self.id_to_index or goal_id not in self.id_to_index:
             raise ValueError(f"Start ({start_id}) or Goal ({goal_id}) node not in graph")
+        start = self.id_to_index[start_id]
+        goal = self.id_to_index[goal_id]
 
-        def heuristic(u, v):
-            n1 = self.node_data[u]
-            n2 = self.node_data[v]
-            return math.sqrt((n1['x'] - n2['x'])**2 + (n1['y'] - n2['y'])**2)
+        heuristic = heuristic or DEFAULT_HEURISTIC
+        if heuristic == 'alt':
+            if self.landmarks is None:
+                self.build_landmarks()
+            h = self._alt_heuristic(goal)
+        elif heuristic == 'euclidean':
+            h = lambda u: self._euclidean(u, goal)
+        else:
+            raise ValueError(f"Unknown heuristic '{heuristic}' (expected 'alt' or 'euclidean')")
+
+        search_graph = None
+        if GRAPH_COMPACTION if compact is None else compact:
+            search_graph = self.compact_graph()
+            # Searches starting or ending inside a chain run on the full graph
+            if search_graph is not None and (search_graph.interior[start] or search_graph.interior[goal]):
+                search_graph = None
 
         try:
-            path = nx.astar_path(self.G, start_id, goal_id, heuristic=heuristic, weight='weight')
-            
+            t0 = time.perf_counter()
+            path, expanded = self._astar(start, goal, h, search_graph)
+            self.last_search_stats = {
+                'heuristic': heuristic,
+                'compacted': search_graph is not None,
+                'expanded_nodes': expanded,
+                'path_nodes': len(path) if path else 0,
+                'blocked_edges': 0 if self.blocked_edges is None else int(self.blocked_edges.sum()),
+                'time_ms': (time.perf_counter() - t0) * 1000.0
+            }
+            if path is None:
+                return None
+
             # Build output path with coordinates
-            result_path = []
-            for node_id in path:
-                d = self.node_data[node_id]
-                result_path.append({
-                    'id': node_id,
-                    'x': d['x'],
-                    'y': d['y'],
-                    'theta': d['theta'],
-                    'lat': d.get('lat', d['y']),
-                    'lon': d.get('lon', d['x'])
-                })
-            
-            return result_path
-        except nx.NetworkXNoPath:
-            return None
+            return [self.node_record(index) for index in path]
         except Exception as e:
             print(f"A* Error: {e}")
             raise e
 
     def get_nodes_list(self):
         """Returns a list of interesting nodes (Home and Drillholes) for dropdowns"""
-        if not self.G: return []
+        if not self.is_loaded(): return []
         nodes = []
-        
+
         # Invert the map to sort by Label/Drillhole ID is tricky, but let's just iterate items
         # drillhole_to_node maps { 'Home': 0, 101: 5, ... }
-        
+
         # Sort keys so list is stable. 'Home' first, then numbers.
         keys = list(self.drillhole_to_node.keys())
-        
+
         def sort_key(k):
             if k == 'Home': return -1
             try:
                 return int(k)
             except:
                 return 999999
-                
+
         keys.sort(key=sort_key)
-        
+
         for k in keys:
             nid = self.drillhole_to_node[k]
             label = f"{k} (Node {nid})"
@@ -199,8 +844,71 @@ class GraphManager:
                 'label': label,
                 'type': "Drillhole/Home"
             })
-            
+
         return nodes
 
+PLAN_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+class GraphRegistry:
+    """
+    Loaded plan graphs keyed by plan ID. Graphs are loaded lazily on first
+    use and the least recently used ones are dropped once the memory budget
+    is exceeded. plan_id None is the latest plan in GENERATED_DIR.
+    """
+    def __init__(self, generated_dir=GENERATED_DIR, plans_dir=PLANS_DIR, max_bytes=GRAPH_REGISTRY_MAX_MB * 1024 * 1024):
+        self.generated_dir = generated_dir
+        self.plans_dir = plans_dir
+        self.max_bytes = max_bytes
+        self._graphs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def csv_path(self, plan_id=None):
+        if plan_id is None:
+            return os.path.join(self.generated_dir, 'global_plan.csv')
+        if not PLAN_ID_PATTERN.match(str(plan_id)):
+            raise ValueError(f"Invalid plan ID '{plan_id}'")
+        return os.path.join(self.plans_dir, str(plan_id), 'global_plan.csv')
+
+    def get(self, plan_id=None):
+        """Returns the GraphManager for plan_id (loading it if needed) or None if the plan does not exist"""
+        csv_path = self.csv_path(plan_id)
+        with self._lock:
+            graph = self._graphs.get(plan_id)
+            if graph is None:
+                graph = GraphManager()
+            if not graph.ensure_loaded(csv_path):
+                self._graphs.pop(plan_id, None)
+                return None
+            self._graphs[plan_id] = graph
+            self._graphs.move_to_end(plan_id)
+            self._evict()
+            return graph
+
+    def _evict(self):
+        # The most recently used graph is always kept, even if it alone exceeds the budget
+        total = sum(graph.memory_bytes() for graph in self._graphs.values())
+        while total > self.max_bytes and len(self._graphs) > 1:
+            plan_id, graph = self._graphs.popitem(last=False)
+            total -= graph.memory_bytes()
+            print(f"Graph registry: evicted plan {plan_id}")
+
+    def list_plans(self):
+        """Plan IDs on disk, most recent first"""
+        if not os.path.isdir(self.plans_dir):
+            return []
+        plans = []
+        for name in os.listdir(self.plans_dir):
+            if PLAN_ID_PATTERN.match(name) and os.path.exists(self.csv_path(name)):
+                plans.append((os.path.getmtime(self.csv_path(name)), name))
+        plans.sort(reverse=True)
+        return [name for _, name in plans]
+
+    def warm_up(self, num_plans):
+        """Preloads the latest plan and the num_plans most recent ones"""
+        self.get(None)
+        for plan_id in self.list_plans()[:num_plans]:
+            self.get(plan_id)
+        print(f"Graph registry warm-up: {len(self._graphs)} plans loaded")
+
 # Singleton instance
-graph_manager = GraphManager()
+graph_registry = GraphRegistry()
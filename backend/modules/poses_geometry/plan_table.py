@@ -0,0 +1,165 @@
+import os
+import json
+import math
+import uuid
+import numpy as np
+import pandas as pd
+import shapely
+
+# Typed columnar copy of global_plan.csv (Parquet): poses as fixed-size float lists,
+# connections as int lists and geometries as WKB, so readers need no string parsing.
+# Needs pyarrow; without it only the CSV is written and read.
+PLAN_TABLE_FORMAT = 'global_plan_table'
+PLAN_TABLE_VERSION = 1
+POSE_SIZE = 3
+# Float columns (NaN for missing) stored as nullable integers
+INTEGER_COLUMNS = ('graph_id', 'drillhole_id')
+
+def plan_table_path_for(csv_path):
+    """global_plan.csv -> global_plan.parquet"""
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def _pose_array(pa, rows, poses, counts, nested, size):
+    """Arrow column of poses given as by pose_array: fixed-size lists, nested in lists if nested"""
+    present = np.zeros(size, dtype=bool)
+    present[rows] = True
+    mask = pa.array(~present)
+    if not nested:
+        return pa.FixedSizeListArray.from_arrays(pa.array(_spread(poses, rows, size).ravel()), POSE_SIZE, mask=mask)
+    lengths = np.zeros(size, dtype=np.int32)
+    lengths[rows] = counts
+    offsets = pa.array(np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32))
+    values = pa.FixedSizeListArray.from_arrays(pa.array(np.ascontiguousarray(poses, dtype=np.float64).ravel()), POSE_SIZE)
+    return pa.ListArray.from_arrays(offsets, values, mask=mask)
+
+def _spread(poses, rows, size):
+    """(size, 3) poses with the given rows filled in and NaN elsewhere"""
+    spread = np.full((size, POSE_SIZE), np.nan)
+    spread[rows] = poses
+    return spread
+
+def _geometry_array(pa, values):
+    geometries = np.asarray(values, dtype=object)
+    missing = np.array([geometry is None for geometry in geometries], dtype=bool)
+    wkb = np.full(len(geometries), None, dtype=object)
+    wkb[~missing] = shapely.to_wkb(geometries[~missing])
+    return pa.array(wkb, type=pa.binary())
+
+def _object_array(pa, values):
+    """Lists and dicts keep their (inferred) Arrow type; anything Arrow cannot type is stored as text"""
+    values = [None if _missing(value) else value for value in values]
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        return pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+def write_plan_table(frame, path, pose_columns=None):
+    """
+    Writes the global plan as Parquet. pose_columns maps a column name to
+    (rows, poses, counts, nested) as returned by pose_array; those columns are
+    stored from the arrays instead of the frame. Geometry columns are WKB
+    with GeoParquet metadata. Returns False if pyarrow is not available.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("pyarrow not installed, skipping global plan table")
+        return False
+
+    pose_columns = pose_columns or {}
+    arrays = {}
+    geo_columns = {}
+    for name in frame.columns:
+        values = frame[name]
+        if name in pose_columns:
+            rows, poses, counts, nested = pose_columns[name]
+            arrays[name] = _pose_array(pa, rows, poses, counts, nested, len(frame))
+        elif isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and values.dtype.name == 'geometry':
+            arrays[name] = _geometry_array(pa, values.values)
+            geo_columns[name] = {
+                "encoding": "WKB",
+                "geometry_types": [],
+                "crs": values.crs.to_json_dict() if values.crs is not None else None
+            }
+        elif values.dtype.kind in 'biufM':
+            arrays[name] = pa.array(values.to_numpy(), from_pandas=True)
+            if name in INTEGER_COLUMNS:
+                try:
+                    arrays[name] = arrays[name].cast(pa.int64())
+                except pa.ArrowInvalid:
+                    pass
+        else:
+            arrays[name] = _object_array(pa, values.tolist())
+
+    table = pa.table(arrays)
+    metadata = {b"global_plan": json.dumps({"format": PLAN_TABLE_FORMAT, "version": PLAN_TABLE_VERSION}).encode()}
+    if geo_columns:
+        primary = 'geometry' if 'geometry' in geo_columns else next(iter(geo_columns))
+        metadata[b"geo"] = json.dumps({"version": "1.0.0", "primary_column": primary, "columns": geo_columns}).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = path + '.tmp-' + uuid.uuid4().hex[:8]
+    try:
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+def read_graph_nodes(path):
+    """
+    Graph nodes of a plan table, in file order: dict of arrays graph_id,
+    xyt (n, 3) local poses, utm (n, 2) (NaN without a global pose),
+    pose_type, drillhole_id (NaN if none) and connections as CSR-style
+    connection_offsets / connection_ids. None if the file cannot be used.
+    """
+    try:
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+
+    parquet_file = pq.ParquetFile(path)
+    metadata = json.loads((parquet_file.schema_arrow.metadata or {}).get(b"global_plan", b"{}"))
+    if metadata.get("format") != PLAN_TABLE_FORMAT or metadata.get("version") != PLAN_TABLE_VERSION:
+        print(f"Ignoring global plan table {path}: unsupported version {metadata.get('version')}")
+        return None
+
+    columns = ['type', 'graph_id', 'graph_pose_local', 'graph_pose', 'pose_type', 'drillhole_id', 'connections']
+    columns = [name for name in columns if name in parquet_file.schema_arrow.names]
+    table = parquet_file.read(columns=columns)
+    keep = pc.and_(pc.equal(table['type'], 'graph_pose'), pc.and_(pc.is_valid(table['graph_pose_local']), pc.is_valid(table['graph_id'])))
+    table = table.filter(pc.fill_null(keep, False))
+    n = table.num_rows
+
+    def poses(name):
+        # The values behind null poses are not meaningful, they become NaN
+        column = table[name].combine_chunks()
+        values = column.values[column.offset * POSE_SIZE:(column.offset + len(column)) * POSE_SIZE]
+        xyt = values.to_numpy(zero_copy_only=False).reshape(-1, POSE_SIZE).astype(np.float64)
+        if column.null_count:
+            xyt[~column.is_valid().to_numpy(zero_copy_only=False)] = np.nan
+        return xyt
+
+    nodes = {
+        "graph_id": table['graph_id'].to_numpy().astype(np.int64),
+        "xyt": poses('graph_pose_local'),
+        "utm": poses('graph_pose')[:, :2] if 'graph_pose' in table.column_names else np.full((n, 2), np.nan),
+        "pose_type": np.asarray(pc.fill_null(table['pose_type'], 'nan').to_pylist() if 'pose_type' in table.column_names else ['nan'] * n, dtype=object),
+        "drillhole_id": pc.cast(table['drillhole_id'], 'float64').to_numpy(zero_copy_only=False) if 'drillhole_id' in table.column_names else np.full(n, np.nan),
+    }
+    if 'connections' in table.column_names:
+        connections = table['connections'].combine_chunks()
+        lengths = pc.fill_null(pc.list_value_length(connections), 0).to_numpy(zero_copy_only=False)
+        nodes["connection_offsets"] = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        nodes["connection_ids"] = pc.list_flatten(connections).to_numpy(zero_copy_only=False).astype(np.int64)
+    else:
+        nodes["connection_offsets"] = np.zeros(n + 1, dtype=np.int64)
+        nodes["connection_ids"] = np.zeros(0, dtype=np.int64)
+    return nodes
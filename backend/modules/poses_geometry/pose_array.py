@@ -0,0 +1,163 @@
+import numpy as np
+
+# Pose types in the order of their codes
+POSE_TYPES = ('home_pose', 'street', 'transit_street', 'hole')
+POSE_TYPE_CODES = {name: code for code, name in enumerate(POSE_TYPES)}
+
+class PoseArray:
+    """
+    Poses (x, y, theta) with their pose type, street index (position in the
+    streets GeoDataFrame, -1 if none) and hole index (position in the holes
+    GeoDataFrame, -1 if none) in contiguous NumPy columns. Appends grow the
+    columns geometrically; slicing returns views that share them.
+
+    Indexing one pose gives the [x, y, theta] list the rest of the module
+    works with, so a PoseArray can stand in for a list of poses.
+    """
+    def __init__(self, capacity=16):
+        self._xyt = np.empty((capacity, 3), dtype=np.float64)
+        self._pose_type = np.empty(capacity, dtype=np.int8)
+        self._street = np.empty(capacity, dtype=np.int32)
+        self._hole = np.empty(capacity, dtype=np.int32)
+        self._size = 0
+
+    @classmethod
+    def from_columns(cls, xyt, pose_type, street, hole):
+        """Wraps existing columns without copying them"""
+        poses = cls.__new__(cls)
+        poses._xyt = xyt
+        poses._pose_type = pose_type
+        poses._street = street
+        poses._hole = hole
+        poses._size = len(xyt)
+        return poses
+
+    @classmethod
+    def from_poses(cls, poses, pose_type='street', street=-1, hole=-1):
+        """PoseArray of a list of [x, y, theta] poses (a PoseArray is returned as is)"""
+        if isinstance(poses, PoseArray):
+            return poses
+        array = cls(max(len(poses), 1))
+        array.extend(poses, pose_type, street, hole)
+        return array
+
+    @classmethod
+    def concatenate(cls, arrays):
+        arrays = [array for array in arrays if array is not None]
+        if not arrays:
+            return cls()
+        return cls.from_columns(
+            np.concatenate([array.xyt for array in arrays]),
+            np.concatenate([array.pose_type for array in arrays]),
+            np.concatenate([array.street for array in arrays]),
+            np.concatenate([array.hole for array in arrays])
+        )
+
+    def _reserve(self, size):
+        if size <= len(self._xyt):
+            return
+        capacity = max(size, 2 * len(self._xyt), 16)
+        for name in ('_xyt', '_pose_type', '_street', '_hole'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, x, y, theta, pose_type, street=-1, hole=-1):
+        self._reserve(self._size + 1)
+        i = self._size
+        self._xyt[i] = (x, y, theta)
+        self._pose_type[i] = POSE_TYPE_CODES[pose_type]
+        self._street[i] = street
+        self._hole[i] = hole
+        self._size += 1
+
+    def extend(self, poses, pose_type, street=-1, hole=-1):
+        """Appends [x, y, theta] poses; pose_type may be one name or one per pose"""
+        count = len(poses)
+        if not count:
+            return
+        self._reserve(self._size + count)
+        rows = slice(self._size, self._size + count)
+        self._xyt[rows] = np.asarray(poses, dtype=np.float64).reshape(count, 3)
+        if isinstance(pose_type, str):
+            self._pose_type[rows] = POSE_TYPE_CODES[pose_type]
+        else:
+            self._pose_type[rows] = [POSE_TYPE_CODES[name] for name in pose_type]
+        self._street[rows] = street
+        self._hole[rows] = hole
+        self._size += count
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            if step != 1:
+                raise IndexError("PoseArray slices must be contiguous")
+            return PoseArray.from_columns(self._xyt[start:stop], self._pose_type[start:stop], self._street[start:stop], self._hole[start:stop])
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("pose index out of range")
+        return self._xyt[index].tolist()
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getstate__(self):
+        # Pickled without the unused capacity
+        return {'xyt': self.xyt.copy(), 'pose_type': self.pose_type.copy(), 'street': self.street.copy(), 'hole': self.hole.copy()}
+
+    def __setstate__(self, state):
+        self._xyt = state['xyt']
+        self._pose_type = state['pose_type']
+        self._street = state['street']
+        self._hole = state['hole']
+        self._size = len(self._xyt)
+
+    @property
+    def xyt(self):
+        return self._xyt[:self._size]
+
+    @property
+    def pose_type(self):
+        return self._pose_type[:self._size]
+
+    @property
+    def street(self):
+        return self._street[:self._size]
+
+    @property
+    def hole(self):
+        return self._hole[:self._size]
+
+    def copy(self):
+        return PoseArray.from_columns(self.xyt.copy(), self.pose_type.copy(), self.street.copy(), self.hole.copy())
+
+    def tolist(self):
+        """[[x, y, theta], ...] as Python floats"""
+        return self.xyt.tolist()
+
+    def pose_type_names(self):
+        return [POSE_TYPES[code] for code in self.pose_type.tolist()]
+
+    def street_bounds(self, num_streets, pose_type='street'):
+        """
+        Start of each street's poses of the given type plus the end of the
+        last one, so street k is self[bounds[k]:bounds[k + 1]]. The poses of
+        a street are contiguous and streets come in order.
+        """
+        rows = np.flatnonzero(self.pose_type == POSE_TYPE_CODES[pose_type])
+        counts = np.bincount(self.street[rows], minlength=num_streets)[:num_streets]
+        start = rows[0] if len(rows) else 0
+        return start + np.concatenate([[0], np.cumsum(counts)])
+
+    def drillhole_ids(self, holes):
+        """drillhole_id of the holes' loading poses ('hole' poses), None for the other poses"""
+        ids = np.full(self._size, None, dtype=object)
+        loading = np.flatnonzero((self.pose_type == POSE_TYPE_CODES['hole']) & (self.hole >= 0))
+        if len(loading):
+            ids[loading] = holes['drillhole_id'].to_numpy()[self.hole[loading]]
+        return ids.tolist()
@@ -0,0 +1,81 @@
+import threading
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import Transformer
+
+# CRS used by the backend: plans are generated in UTM 19S, served in WGS84 and tiled in Web Mercator
+UTM_CRS = 'EPSG:32719'
+WGS84_CRS = 'EPSG:4326'
+WEB_MERCATOR_CRS = 'EPSG:3857'
+
+_transformers = {}
+_lock = threading.Lock()
+
+def get_transformer(source, target):
+    """Transformer (x/y order) from source to target CRS, created once per pair and shared by all threads"""
+    key = (source, target)
+    transformer = _transformers.get(key)
+    if transformer is None:
+        with _lock:
+            transformer = _transformers.get(key)
+            if transformer is None:
+                transformer = Transformer.from_crs(source, target, always_xy=True)
+                _transformers[key] = transformer
+    return transformer
+
+def transform_xy(x, y, source, target):
+    """Coordinate arrays from source to target CRS, in one call"""
+    return get_transformer(source, target).transform(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+
+def transform_geometries(geometries, source, target):
+    """
+    Array of geometries from source to target CRS. The coordinates of all
+    of them are transformed together (3D geometries in a second call).
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    transformer = get_transformer(source, target)
+    result = np.empty_like(geometries)
+    has_z = shapely.has_z(geometries)
+    for mask, include_z in ((~has_z, False), (has_z, True)):
+        if not mask.any():
+            continue
+        coords = shapely.get_coordinates(geometries[mask], include_z=include_z)
+        new_coords = transformer.transform(*coords.T)
+        result[mask] = shapely.set_coordinates(geometries[mask].copy(), np.array(new_coords).T)
+    return result
+
+def transform_geometry(geometry, source, target):
+    return transform_geometries([geometry], source, target)[0]
+
+def to_crs(frame, crs):
+    """GeoDataFrame or GeoSeries reprojected to crs (a copy, like GeoDataFrame.to_crs)"""
+    if frame.crs is None:
+        raise ValueError("Cannot transform naive geometries. Please set a crs on the object first.")
+    if frame.crs == crs:
+        return frame.copy()
+    geometry = frame.geometry if isinstance(frame, gpd.GeoDataFrame) else frame
+    reprojected = gpd.GeoSeries(transform_geometries(geometry.values, frame.crs, crs), index=frame.index, crs=crs, name=geometry.name)
+    if isinstance(frame, gpd.GeoSeries):
+        return reprojected
+    frame = frame.copy()
+    frame.geometry = reprojected
+    return frame
+
+def reproject_layers(layers, crs=WGS84_CRS):
+    """
+    Reprojects several GeoDataFrames (name -> frame or None) with one
+    transform per source CRS instead of one per layer.
+    """
+    reprojected = {name: gdf for name, gdf in layers.items() if gdf is None or gdf.crs is None or gdf.crs == crs}
+    pending = [name for name in layers if name not in reprojected]
+    for source_crs in {layers[name].crs for name in pending}:
+        names = [name for name in pending if layers[name].crs == source_crs]
+        geometries = transform_geometries(np.concatenate([np.asarray(layers[name].geometry.values, dtype=object) for name in names]), source_crs, crs)
+        offset = 0
+        for name in names:
+            gdf = layers[name]
+            reprojected[name] = gpd.GeoDataFrame(pd.DataFrame(gdf.drop(columns=gdf.geometry.name)), geometry=geometries[offset:offset + len(gdf)], crs=crs)
+            offset += len(gdf)
+    return reprojected
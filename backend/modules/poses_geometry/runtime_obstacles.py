@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import uuid
+from filelock import FileLock
+
+# Temporary obstacles (trucks, spills, ...) reported after generation. They
+# are kept in a JSON file next to global_plan.csv so every worker process
+# applies the same ones; geometries are WKT in the plan CRS (UTM). Changes
+# run under a file lock so concurrent workers do not overwrite each other.
+
+def obstacles_path_for(csv_path):
+    """global_plan.csv -> global_plan_obstacles.json"""
+    return os.path.splitext(csv_path)[0] + '_obstacles.json'
+
+def _lock(path):
+    return FileLock(path + '.lock')
+
+def load_obstacles(path):
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get('obstacles', [])
+    except Exception as e:
+        print(f"Error reading runtime obstacles {path}: {e}")
+        return []
+
+def save_obstacles(path, obstacles):
+    """Writes atomically so readers in other workers never see a partial file"""
+    tmp_path = path + '.tmp-' + uuid.uuid4().hex[:8]
+    with open(tmp_path, 'w') as f:
+        json.dump({'obstacles': obstacles}, f)
+    os.replace(tmp_path, path)
+
+def is_active(obstacle, now=None):
+    expires_at = obstacle.get('expires_at')
+    return expires_at is None or expires_at > (now if now is not None else time.time())
+
+def add_obstacle(path, wkt, ttl_seconds=None, label=None):
+    """Appends an obstacle (dropping expired ones) and returns it"""
+    now = time.time()
+    obstacle = {
+        'id': uuid.uuid4().hex[:12],
+        'wkt': wkt,
+        'label': label,
+        'created_at': now,
+        'expires_at': now + ttl_seconds if ttl_seconds else None
+    }
+    with _lock(path):
+        obstacles = [o for o in load_obstacles(path) if is_active(o, now)]
+        obstacles.append(obstacle)
+        save_obstacles(path, obstacles)
+    return obstacle
+
+def remove_obstacle(path, obstacle_id):
+    """Returns True if the obstacle existed"""
+    with _lock(path):
+        obstacles = load_obstacles(path)
+        remaining = [o for o in obstacles if o['id'] != obstacle_id]
+        if len(remaining) == len(obstacles):
+            return False
+        save_obstacles(path, remaining)
+    return True
+
+def clear_obstacles(path):
+    with _lock(path):
+        if os.path.exists(path):
+            save_obstacles(path, [])
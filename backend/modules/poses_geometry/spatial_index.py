@@ -0,0 +1,73 @@
+import math
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Metres per degree of latitude (equirectangular approximation, fine at site scale)
+METERS_PER_DEGREE = 111320.0
+
+class NodeSpatialIndex:
+    """
+    KD-trees over the graph node positions, one in UTM metres and one in
+    lat/lon projected to metres around the plan centre. Both answer
+    k-nearest queries and bounding box queries (ball query on the box
+    circumcircle, then an exact box filter). Results are node indices.
+    """
+    def __init__(self, node_latlon, node_utm):
+        latlon = np.asarray(node_latlon, dtype=np.float64)
+        self.lat0 = float(np.nanmean(latlon[:, 0])) if len(latlon) else 0.0
+        self.cos_lat0 = math.cos(math.radians(self.lat0))
+        self.lonlat_xy = self._project_lonlat(latlon[:, 1], latlon[:, 0])
+        self.lonlat_tree = cKDTree(self.lonlat_xy)
+
+        utm = np.asarray(node_utm, dtype=np.float64)
+        # Nodes without a global pose are left out of the UTM tree
+        self.utm_rows = np.flatnonzero(np.isfinite(utm).all(axis=1))
+        self.utm_xy = utm[self.utm_rows]
+        self.utm_tree = cKDTree(self.utm_xy) if len(self.utm_rows) else None
+
+    def _project_lonlat(self, lon, lat):
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        return np.column_stack([lon * self.cos_lat0 * METERS_PER_DEGREE, lat * METERS_PER_DEGREE])
+
+    def _tree(self, crs):
+        """Returns (tree, points, row -> node index mapping or None) for 'wgs84' or 'utm'"""
+        if crs == 'wgs84':
+            return self.lonlat_tree, self.lonlat_xy, None
+        if crs == 'utm':
+            if self.utm_tree is None:
+                raise ValueError("Plan has no UTM coordinates")
+            return self.utm_tree, self.utm_xy, self.utm_rows
+        raise ValueError(f"Unknown crs '{crs}' (expected 'wgs84' or 'utm')")
+
+    def nearest(self, x, y, k=1, crs='wgs84'):
+        """
+        k nearest nodes to (x, y) given as (lon, lat) for 'wgs84' or (easting,
+        northing) for 'utm'. Returns (indices, distances in metres), closest first.
+        """
+        tree, points, rows = self._tree(crs)
+        k = min(int(k), len(points))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        query = self._project_lonlat([x], [y])[0] if crs == 'wgs84' else (x, y)
+        distances, found = tree.query(query, k=k)
+        found = np.atleast_1d(found)
+        distances = np.atleast_1d(distances)
+        indices = found if rows is None else rows[found]
+        return indices.astype(np.int64), distances
+
+    def within_bbox(self, min_x, min_y, max_x, max_y, crs='wgs84'):
+        """Node indices (ascending) inside the box, in (lon, lat) or UTM like nearest()"""
+        tree, points, rows = self._tree(crs)
+        if crs == 'wgs84':
+            (min_x, min_y), (max_x, max_y) = self._project_lonlat([min_x, max_x], [min_y, max_y])
+        center = ((min_x + max_x) / 2.0, (min_y + max_y) / 2.0)
+        radius = math.hypot(max_x - min_x, max_y - min_y) / 2.0
+
+        found = np.asarray(tree.query_ball_point(center, radius), dtype=np.int64)
+        if len(found):
+            xy = points[found]
+            inside = (xy[:, 0] >= min_x) & (xy[:, 0] <= max_x) & (xy[:, 1] >= min_y) & (xy[:, 1] <= max_y)
+            found = found[inside]
+        indices = found if rows is None else rows[found]
+        return np.sort(indices)
@@ -1,4 +1,3 @@
-import matplotlib
 #matplotlib.use('TkAgg')
 # from python_qt_binding import QtCore, QtWidgets
 # from python_qt_binding import QtGui
@@ -7,7 +6,6 @@ import matplotlib
 # from python_qt_binding.QtWidgets import QMessageBox
 
 import geopandas as gpd
-import matplotlib.pyplot as plt
 import sys
 import traceback
 import numpy as np
@@ -18,11 +16,13 @@ import shapely
 from shapely.geometry import LineString, MultiLineString, Point, Polygon
 from shapely.ops import  linemerge, nearest_points
 import math
-
-import networkx as nx
+from modules.poses_geometry.pose_array import PoseArray
+from modules.poses_geometry import reprojection
 
 connect_holes = False
 del_colliding_poses = True
+# Longest connection between two poses, in metres
+MAX_CONNECTION_LENGTH = 8.0
 
 # QRoundProgressBar, WorkerSignals, and Worker classes removed for backend compatibility
 
@@ -32,6 +32,9 @@ class GuiTextException(Exception):
         super().__init__(message)
 
 def plotPose(pose):
+    # Debugging helper, matplotlib is only imported when it is used
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as mpatch
     start = (pose[0], pose[1])
     end = (pose[0] + .5*math.cos(pose[2]), pose[1] + 0.5*math.sin(pose[2]))
     arrow = mpatch.FancyArrowPatch( start , end  , transform=plt.gca().transData, arrowstyle='->', mutation_scale=10.0)
@@ -136,17 +139,23 @@ def generatePoseCandidate(pose, hole,  blocked, turning_radius, hole_distance, d
 
     return pose_candidates, trajectory.distance(blocked) , trajectory.length
 
-def generateLoadingPoses(streets, holes, blocked, prev_poses, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback):
+def generateLoadingPoses(streets, holes, blocked, prev_poses, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback, cancel_token=None):
+    """
+    Loading poses of every hole, tried from the poses of its closest street.
+    prev_poses is the PoseArray the hole poses are appended to (home and
+    street poses). Returns a PoseArray with the hole poses (the last pose of
+    each hole typed 'hole', the rest 'street') and the extra connections.
+    """
     print ('generating loading poses')
-    plt.close('all')
     poses_field = []
-    all_poses = []
+    hole_poses = PoseArray()
     drillhole_order = []
     extra_connections = []
-    pose_types = []
     hole_num = 0
+    street_bounds = prev_poses.street_bounds(len(streets))
 
-    for index, row in holes.iterrows():
+    for i, (index, row) in enumerate(holes.iterrows()):
+        if cancel_token: cancel_token.check()
         poses = []
         order = 10000000000
         # print ('row')
@@ -167,7 +176,8 @@ def generateLoadingPoses(streets, holes, blocked, prev_poses, obstacle_buffer_di
             min_length_idx = None
             
             if closest_street_idx != -1:
-                for pose_num ,  pose_street in enumerate(streets['poses'].iloc[closest_street_idx]):
+                street_poses = prev_poses[street_bounds[closest_street_idx]:street_bounds[closest_street_idx + 1]]
+                for pose_num ,  pose_street in enumerate(street_poses.tolist()):
                     # print ('pose')
                     pose_candidates , distance , length = generatePoseCandidate(pose_street, row['geometry'], blocked_without_pose, turning_radius, hole_distance)
                     # print('distance: ' , distance)
@@ -187,10 +197,11 @@ def generateLoadingPoses(streets, holes, blocked, prev_poses, obstacle_buffer_di
                 poses = min_length_pose
                 min_idx = min_length_idx
             if min_idx != None:
-                order = 1+len(sum(streets['poses'][0:closest_street_idx],[])) + min_idx
-                extra_connections.append([order, len(prev_poses) +len(all_poses)])
-                for i in range(1,len(poses)):
-                    extra_connections.append([len(prev_poses) +len(all_poses) + i-1 , len(prev_poses) +len(all_poses) + i ])
+                order = int(street_bounds[closest_street_idx]) + min_idx
+                first = len(prev_poses) + len(hole_poses)
+                extra_connections.append([order, first])
+                for k in range(1,len(poses)):
+                    extra_connections.append([first + k-1 , first + k ])
 
             hole_num += 1
             #plt.show()
@@ -201,15 +212,13 @@ def generateLoadingPoses(streets, holes, blocked, prev_poses, obstacle_buffer_di
             if progress_callback: progress_callback(10+20*hole_num/len(holes))
         drillhole_order.append(order)
 
-
         poses_field.append(poses)
-        for pose in poses:
-            all_poses.append(pose)
-        poses
+        if len(poses):
+            hole_poses.extend(poses, ['street']*(len(poses)-1) + ['hole'], hole=i)
 
     holes['drillhole_order'] = np.argsort(np.argsort(drillhole_order))
     holes['poses'] = poses_field
-    return poses_field, extra_connections
+    return hole_poses, extra_connections
 
 
 def gen_footprint_obstacle(x,y,angle):
@@ -247,9 +256,15 @@ def gen_footprint_high_obstacle(x,y,angle):
     return footprint
 
 
-def posesFromGeoDataFrame(gdf, blocked = None, low_obs = None, high_obs = None, geofence = None):
-    all_poses = []
-    poses_field = []
+def posesFromGeoDataFrame(gdf, blocked = None, low_obs = None, high_obs = None, geofence = None, cancel_token = None):
+    """
+    Poses every 0.5 m along the streets and transit streets of gdf that do not
+    collide with the obstacles and stay inside the geofence (transit streets
+    get a second pose in the opposite direction). Sets the per-row 'poses'
+    column and returns all of them as a PoseArray, street being the row position.
+    """
+    all_poses = PoseArray()
+    row_bounds = [0]
 
     if low_obs is not None and low_obs.geometry.shape[0] > 0:
         all_low_obs = shapely.unary_union(low_obs.geometry)
@@ -257,79 +272,56 @@ def posesFromGeoDataFrame(gdf, blocked = None, low_obs = None, high_obs = None,
         all_high_obs = shapely.unary_union(high_obs.geometry)
     all_geofence = geofence.geometry.iloc[0]
 
+    def pose_ok(x, y, angle):
+        if not del_colliding_poses:
+            return True
+        foot = gen_footprint_obstacle(x, y, angle)
+        foot_high = gen_footprint_high_obstacle(x, y, angle)
+        if low_obs is not None and low_obs.geometry.shape[0] > 0:
+            if foot.intersects(all_low_obs) or foot.contains(all_low_obs) or all_low_obs.contains(foot):
+                return False
+        if high_obs is not None and high_obs.geometry.shape[0] > 0:
+            if foot_high.intersects(all_high_obs) or foot_high.contains(all_high_obs) or all_high_obs.contains(foot_high):
+                return False
+        return all_geofence.contains(foot_high)
+
+    for street_idx, (index, row) in enumerate(gdf.iterrows()):
+        if cancel_token: cancel_token.check()
 
-    for index, row in gdf.iterrows():
-
-        poses = []
         if row['type'] == 'streets' or row['type'] == 'transit_streets':
+            transit = row['type'] == 'transit_streets'
+            pose_type = 'transit_street' if transit else 'street'
+            coords = row['geometry'].coords[:]
+
+            def add_pose(x, y, angle):
+                all_poses.append(x, y, angle, pose_type, street_idx)
+                if transit:
+                    all_poses.append(x + 0.1*math.cos(angle + math.pi/2), y + 0.1*math.sin(angle + math.pi/2), angle + math.pi, pose_type, street_idx)
 
-            for i in range(len(row['geometry'].coords[:])-1):
+            for i in range(len(coords)-1):
 
-                angle = math.atan2(row['geometry'].coords[i+1][1] - row['geometry'].coords[i][1], row['geometry'].coords[i+1][0] - row['geometry'].coords[i][0])
-                point = [row['geometry'].coords[i][0], row['geometry'].coords[i][1], angle]
+                angle = math.atan2(coords[i+1][1] - coords[i][1], coords[i+1][0] - coords[i][0])
+                x, y = coords[i][0], coords[i][1]
 
-                dist = math.sqrt((point[1] - row['geometry'].coords[i+1][1])**2 + (point[0] - row['geometry'].coords[i+1][0])**2)
+                dist = math.sqrt((y - coords[i+1][1])**2 + (x - coords[i+1][0])**2)
 
                 while dist > .510:
                     # Eval intermediate points
-                    foot = gen_footprint_obstacle(point[0], point[1], angle)
-                    foot_high = gen_footprint_high_obstacle(point[0], point[1], angle)
-                    ok = True
-
-                    if del_colliding_poses:
-                        if low_obs is not None and low_obs.geometry.shape[0] > 0:
-                            if foot.intersects(all_low_obs) or foot.contains(all_low_obs) or all_low_obs.contains(foot):
-                                ok = False
-                        if high_obs is not None and high_obs.geometry.shape[0] > 0:
-                            if foot_high.intersects(all_high_obs) or foot_high.contains(all_high_obs) or all_high_obs.contains(foot_high):
-                                ok = False
-                        if not all_geofence.contains(foot_high):
-                            ok = False
-
-                    if ok:
-                        poses.append(point.copy())
-
-                        if row['type'] == 'transit_streets':
-                            p = point.copy()
-                            p[0] = p[0] + 0.1*math.cos(angle + math.pi/2)
-                            p[1] = p[1] + 0.1*math.sin(angle + math.pi/2)
-                            p[2] = p[2] + math.pi
-                            poses.append(p)
-
-                    point[0] = point[0] + 0.50*math.cos(angle)
-                    point[1] = point[1] + .50*math.sin(angle)
-
-                    dist = math.sqrt((point[1] - row['geometry'].coords[i+1][1])**2 + (point[0] - row['geometry'].coords[i+1][0])**2)
+                    if pose_ok(x, y, angle):
+                        add_pose(x, y, angle)
+
+                    x = x + 0.50*math.cos(angle)
+                    y = y + .50*math.sin(angle)
+
+                    dist = math.sqrt((y - coords[i+1][1])**2 + (x - coords[i+1][0])**2)
 
                 # Eval last point
-                point = [row['geometry'].coords[-1][0], row['geometry'].coords[-1][1], angle]
-                foot = gen_footprint_obstacle(point[0], point[1], angle)
-                foot_high = gen_footprint_high_obstacle(point[0], point[1], angle)
-                ok = True
-
-                if del_colliding_poses:
-                    if low_obs is not None and low_obs.geometry.shape[0] > 0:
-                        if foot.intersects(all_low_obs) or foot.contains(all_low_obs) or all_low_obs.contains(foot):
-                            ok = False
-                    if high_obs is not None and high_obs.geometry.shape[0] > 0:
-                        if foot_high.intersects(all_high_obs) or foot_high.contains(all_high_obs) or all_high_obs.contains(foot_high):
-                            ok = False
-                    if not all_geofence.contains(foot_high):
-                        ok = False
-
-                if ok:
-                    poses.append(point.copy())
-
-                    if row['type'] == 'transit_streets':
-                        p = point.copy()
-                        p[0] = p[0] + 0.1*math.cos(angle + math.pi/2)
-                        p[1] = p[1] + 0.1*math.sin(angle + math.pi/2)
-                        p[2] = p[2] + math.pi
-                        poses.append(p)
-
-        all_poses = all_poses + poses
-        poses_field.append(poses)
-    gdf['poses'] = poses_field
+                if pose_ok(coords[-1][0], coords[-1][1], angle):
+                    add_pose(coords[-1][0], coords[-1][1], angle)
+
+        row_bounds.append(len(all_poses))
+
+    gdf['poses'] = [all_poses[start:end].tolist() for start, end in zip(row_bounds[:-1], row_bounds[1:])]
     return all_poses
 
 
@@ -346,7 +338,7 @@ def shouldConnect(pose_i, pose_j, turning_radius, blocked, type_i, type_j):
     line =  LineString([pose_i[0:2], pose_j[0:2]])
     #print(line.length[0])
     #warning PL PRUEBA Cambiando restricciones para generar waypoints en gui!!!!
-    if line.length > 8.0:         # Condición original
+    if line.length > MAX_CONNECTION_LENGTH:         # Condición original
         return False
     #if line.length > 9.0:     # Condición modificada
     #    return False
@@ -412,135 +404,83 @@ def createPosesDataframe(poses, pose_type, connections):
 
     return gdf
 
-def createGraphDataframe_without_transit(home_pose, streets, holes, blocked, obstacles, high_obstacles, geofence, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback):
-    home_pose_0 = home_pose['poses'][0]
-    poses_street = posesFromGeoDataFrame(streets, blocked, obstacles, high_obstacles, geofence)
-    prev_poses= home_pose_0 + poses_street
-    poses_holes, extra_connections = generateLoadingPoses(streets, holes, blocked, prev_poses, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback)
-    all_poses = prev_poses
-    drillhole_ids = [None]*(1+len(poses_street))
-    pose_type = ['home_pose'] + ['street']*len(poses_street)
-
-    for i,poses_hole in enumerate(poses_holes):
-        all_poses += poses_hole
-        drillhole_ids += [None]*(len(poses_hole)-1)+[holes['drillhole_id'][i]]
-        pose_type += ['street']*(len(poses_hole)-1)+['hole']
-
-
-
-    if progress_callback: progress_callback(30)
-
-    #connections, lines = makeConnections(all_poses, blocked, extra_connections, turning_radius, progress_callback)
-    connections, lines = makeConnections(all_poses, blocked, extra_connections, turning_radius, progress_callback, pose_type)
-    if progress_callback: progress_callback(95)
-    checkConnections(all_poses, connections, pose_type)
-
-    connections_field = []
-    for i in range(0, len(all_poses)):
-        connections_field.append([])
+def graphDataframeFromPoses(all_poses, pose_type, drillhole_ids, connections, crs=None):
+    """ Graph nodes GeoDataFrame (one 'graph_pose' row per pose, with its neighbour list) """
+    all_poses = PoseArray.from_poses(all_poses)
+    connections_field = [[] for i in range(len(all_poses))]
     for i,j in connections:
         connections_field[i].append(j)
         connections_field[j].append(i)
-    # plt.Figure()
-    # blocked.plot(ax=plt.gca(),color='red')
-    # lines.plot(ax=plt.gca(),color='k')
-    # plt.show()
 
-    # Create geometry column from poses
-    geometry = [Point(pose[0], pose[1]) for pose in all_poses]
-    
     gdf = gpd.GeoDataFrame({
         'type': ['graph_pose']*len(all_poses), 
-        'graph_pose': all_poses,
+        'graph_pose': all_poses.tolist(),
         'pose_type': pose_type, 
         'drillhole_id': drillhole_ids, 
         'graph_id': range(0, len(all_poses)), 
         'connections': connections_field,
-        'geometry': geometry
+        'geometry': shapely.points(all_poses.xyt[:, :2])
     })
-    
+
     # Set CRS
-    if hasattr(home_pose, 'crs'):
-        gdf.set_crs(home_pose.crs, inplace=True)
+    if crs is not None:
+        gdf.set_crs(crs, inplace=True)
 
     return gdf
 
-
-def createGraphDataframe(home_pose, streets, transit_streets, holes, blocked, obstacles, high_obstacles, geofence, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback):
-
-    home_pose_0 = home_pose['poses'][0]
-    poses_street = posesFromGeoDataFrame(streets, blocked, obstacles, high_obstacles, geofence)
-    poses_transit = posesFromGeoDataFrame(transit_streets, blocked, obstacles, high_obstacles, geofence)
-
-    prev_poses= home_pose_0 + poses_street + poses_transit
-    poses_holes, extra_connections = generateLoadingPoses(streets, holes, blocked, prev_poses, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback)
-    all_poses = prev_poses
-    drillhole_ids = [None]*(1+len(poses_street)+len(poses_transit))
-    pose_type = ['home_pose'] + ['street']*len(poses_street) + ['transit_street']*len(poses_transit)
-
-    for i,poses_hole in enumerate(poses_holes):
-        all_poses += poses_hole
-        drillhole_ids += [None]*(len(poses_hole)-1)+[holes['drillhole_id'][i]]
-        pose_type += ['street']*(len(poses_hole)-1)+['hole']
-
-
+def _graphDataframe(home_pose, streets, transit_streets, holes, blocked, obstacles, high_obstacles, geofence, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback, cancel_token=None):
+    parts = [PoseArray.from_poses(home_pose['poses'][0], 'home_pose')]
+    parts.append(posesFromGeoDataFrame(streets, blocked, obstacles, high_obstacles, geofence, cancel_token))
+    if transit_streets is not None:
+        parts.append(posesFromGeoDataFrame(transit_streets, blocked, obstacles, high_obstacles, geofence, cancel_token))
+    prev_poses = PoseArray.concatenate(parts)
+    poses_holes, extra_connections = generateLoadingPoses(streets, holes, blocked, prev_poses, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback, cancel_token)
+    all_poses = PoseArray.concatenate([prev_poses, poses_holes])
+    pose_type = all_poses.pose_type_names()
 
     if progress_callback: progress_callback(30)
 
-    #connections, lines = makeConnections(all_poses, blocked, extra_connections, turning_radius, progress_callback) old
-    connections, lines = makeConnections(all_poses, blocked, extra_connections,turning_radius, progress_callback, pose_type)
+    connections, lines = makeConnections(all_poses, blocked, extra_connections, turning_radius, progress_callback, pose_type, cancel_token)
     if progress_callback: progress_callback(95)
     checkConnections(all_poses, connections, pose_type)
 
-    connections_field = []
-    for i in range(0, len(all_poses)):
-        connections_field.append([])
-    for i,j in connections:
-        connections_field[i].append(j)
-        connections_field[j].append(i)
-    # plt.Figure()
-    # blocked.plot(ax=plt.gca(),color='red')
-    # lines.plot(ax=plt.gca(),color='k')
-    # plt.show()
+    return graphDataframeFromPoses(all_poses, pose_type, all_poses.drillhole_ids(holes), connections, home_pose.crs if hasattr(home_pose, 'crs') else None)
 
-    # Create geometry column from poses
-    geometry = [Point(pose[0], pose[1]) for pose in all_poses]
+def createGraphDataframe_without_transit(home_pose, streets, holes, blocked, obstacles, high_obstacles, geofence, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback, cancel_token=None):
+    return _graphDataframe(home_pose, streets, None, holes, blocked, obstacles, high_obstacles, geofence, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback, cancel_token)
 
-    gdf = gpd.GeoDataFrame({
-        'type': ['graph_pose']*len(all_poses), 
-        'graph_pose': all_poses,
-        'pose_type': pose_type, 
-        'drillhole_id': drillhole_ids, 
-        'graph_id': range(0, len(all_poses)), 
-        'connections': connections_field,
-        'geometry': geometry
-    })
-    
-    # Set CRS
-    if hasattr(home_pose, 'crs'):
-        gdf.set_crs(home_pose.crs, inplace=True)
 
-    return gdf
+def createGraphDataframe(home_pose, streets, transit_streets, holes, blocked, obstacles, high_obstacles, geofence, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback, cancel_token=None):
+    return _graphDataframe(home_pose, streets, transit_streets, holes, blocked, obstacles, high_obstacles, geofence, obstacle_buffer_distance, turning_radius, hole_distance, progress_callback, cancel_token)
 
 
 
-def makeConnections(poses, blocked, extra_connections, turning_radius, progress_callback, pose_type):
+def makeConnections(poses, blocked, extra_connections, turning_radius, progress_callback, pose_type, cancel_token=None):
+    """
+    Appends to extra_connections every pair [i, j] (j < i) of poses that
+    shouldConnect accepts. Only pairs closer than MAX_CONNECTION_LENGTH (or
+    identical poses) are tested, found with one vectorized distance per pose.
+    """
+    xyt = PoseArray.from_poses(poses).xyt
+    poses = xyt.tolist()
     connections = extra_connections
     lines = []
     for i in range(0, len(connections)):
         line =  LineString([poses[connections[i][0]][0:2], poses[connections[i][1]][0:2]])
         lines.append(line)
-    iter = 0
-    for i in range(0, len(poses)):
-
-        for j in range(0, i):
-            if i != j:
-                if shouldConnect(poses[i], poses[j], turning_radius, blocked, pose_type[i], pose_type[j]):
-                    connections.append([i, j])
-                    line =  LineString([poses[i][0:2], poses[j][0:2]])
-                    lines.append(line)
-            if progress_callback: progress_callback(30+int(60*(iter)*2/(len(poses)*(len(poses)-1))))
-            iter += 1
+    n = len(poses)
+    for i in range(0, n):
+        if cancel_token: cancel_token.check()
+
+        previous = xyt[:i]
+        near = np.hypot(previous[:, 0] - xyt[i, 0], previous[:, 1] - xyt[i, 1]) <= MAX_CONNECTION_LENGTH + 1e-6
+        near |= (previous == xyt[i]).all(axis=1)
+        for j in np.flatnonzero(near).tolist():
+            if shouldConnect(poses[i], poses[j], turning_radius, blocked, pose_type[i], pose_type[j]):
+                connections.append([i, j])
+                line =  LineString([poses[i][0:2], poses[j][0:2]])
+                lines.append(line)
+        if progress_callback and i > 0: progress_callback(30+int(60*(i*(i+1)//2 - 1)*2/(n*(n-1))))
 
     if len(lines) == 0:
         return connections, gpd.GeoDataFrame(geometry=gpd.GeoSeries(LineString([])) )
@@ -549,6 +489,8 @@ def makeConnections(poses, blocked, extra_connections, turning_radius, progress_
 
 def checkConnections(poses : list, connections : list, pose_type : list) -> bool:
     """ Checks if home and holes are connected in an unique subgraph (shows a warning when failing) """
+    import networkx as nx
+
     nodes = [i for i in range(len(poses))]
     edges = connections
 
@@ -620,16 +562,51 @@ def checkConnections(poses : list, connections : list, pose_type : list) -> bool
     return is_ok
 
 
-def readHolFile(filename : str, WGS84):
+#         x    y    z    z_hole    unkown0    unkown1    unkown2    unkown3    drillhole_id    mesh
+HOL_COLUMNS = ['x', 'y', 'z', 'z_hole', 'unkown0', 'unkown1', 'unkown2', 'unkown3', 'drillhole_id', 'mesh']
+# Rows parsed at a time, so very large multi-bench files are filtered by mesh while reading
+HOL_CHUNK_ROWS = 200000
+
+def _parse_hol_chunk(chunk):
+    """Numeric columns of a raw .hol chunk; returns (rows that parsed, number of malformed rows)"""
+    valid = chunk['mesh'].notna()
+    for column in HOL_COLUMNS[:-1]:
+        if chunk[column].dtype.kind not in 'if':
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+        valid &= chunk[column].notna()
+    valid &= chunk['drillhole_id'] == np.floor(chunk['drillhole_id'])
+    dtypes = {column: np.float64 for column in HOL_COLUMNS[:-2]}
+    dtypes['drillhole_id'] = np.int64
+    return chunk[valid].astype(dtypes), int((~valid).sum())
+
+def _filter_meshes(df, meshes):
+    """Rows of the given meshes (compared as text); all of them if meshes is None"""
+    if meshes is None:
+        return df
+    return df[df['mesh'].astype(str).isin([str(mesh) for mesh in meshes])].copy()
+
+def readHoles(filename, meshes=None, chunk_rows=HOL_CHUNK_ROWS):
+    """
+    Reads a whitespace-separated .hol file in chunks: eight numbers, an
+    integer drillhole id and the mesh name per line (extra fields are
+    ignored). Lines that do not parse are skipped and counted. If meshes is
+    given, lines of other meshes are dropped before parsing.
+    """
+    chunks = []
+    malformed = 0
+    reader = pd.read_csv(filename, sep=r'\s+', header=None, names=HOL_COLUMNS, usecols=HOL_COLUMNS,
+                         dtype={'mesh': str}, float_precision='round_trip', chunksize=chunk_rows)
+    for chunk in reader:
+        chunk, bad = _parse_hol_chunk(_filter_meshes(chunk, meshes))
+        malformed += bad
+        chunks.append(chunk)
+    if malformed:
+        print(f"Skipped {malformed} malformed lines in {filename}")
+    return pd.concat(chunks, ignore_index=True)
+
+def readHolFile(filename : str, WGS84, meshes=None):
     if filename.endswith(".hol"):
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-            lines = [ line.strip() for line in lines]
-            lines = [list(filter(None,line.split(' ') )) for line in lines]
-            #print(lines )
-            #         x                    y                z            z_hole         unkown0          unkown1        unkown2          unkown3         drillhole_id    mesh
-            lines = [[float(line[0]), float(line[1]) ,float(line[2]) ,float(line[3]) ,float(line[4]) ,float(line[5]) , float(line[6]) , float(line[7]) , int(line[8]) , line[9]   ] for line in lines]
-        gdf = gpd.GeoDataFrame(lines, columns=['x', 'y', 'z', 'z_hole', 'unkown0', 'unkown1', 'unkown2', 'unkown3', 'drillhole_id', 'mesh'])
+        gdf = gpd.GeoDataFrame(readHoles(filename, meshes))
     elif filename.endswith(".csv"):
         df = pd.read_csv(filename)
         df['x'] = df['Drill collar X (m)']
@@ -644,24 +621,26 @@ def readHolFile(filename : str, WGS84):
         df['mesh'] = df['BENCH NIMBER']
         gdf = gpd.GeoDataFrame({'x':df['x'], 'y':df['y'], 'z':df['z'], 'z_hole': df['z_hole'], 'unkown0': df['unkown0'],
             'unkown1': df['unkown1'], 'unkown2': df['unkown2'], 'unkown3': df['unkown3'], 'drillhole_id': df['drillhole_id'], 'mesh': df['mesh']})
+        gdf = _filter_meshes(gdf, meshes).reset_index(drop=True)
     elif filename.endswith(".geojson") or filename.endswith(".json"):
         gdf = gpd.read_file(filename)
         # Ensure we have the necessary columns. If x/y are missing, try to get them from geometry (assuming UTM or converting)
         if 'x' not in gdf.columns or 'y' not in gdf.columns:
             # If CRS is missing, assume 4326 (common for GeoJSON)
             if gdf.crs is None:
-                gdf.set_crs('EPSG:4326', inplace=True)
+                gdf.set_crs(reprojection.WGS84_CRS, inplace=True)
             
-            # Convert to UTM 19S (EPSG:32719) to get metric coordinates
-            gdf_utm = gdf.to_crs('EPSG:32719')
-            gdf['x'] = gdf_utm.geometry.x
-            gdf['y'] = gdf_utm.geometry.y
+            # Convert to UTM 19S to get metric coordinates
+            x, y = reprojection.transform_xy(gdf.geometry.x, gdf.geometry.y, gdf.crs, reprojection.UTM_CRS)
+            gdf['x'] = x
+            gdf['y'] = y
         
         # Fill missing columns with defaults
         if 'z' not in gdf.columns: gdf['z'] = 0.0
         if 'z_hole' not in gdf.columns: gdf['z_hole'] = 0.0
         if 'drillhole_id' not in gdf.columns: gdf['drillhole_id'] = range(len(gdf))
         if 'mesh' not in gdf.columns: gdf['mesh'] = 'default'
+        gdf = _filter_meshes(gdf, meshes).reset_index(drop=True)
         
         gdf['unkown0'] = 270
         gdf['unkown1'] = 0.0
@@ -670,16 +649,18 @@ def readHolFile(filename : str, WGS84):
     else:
         print("Unsupported format");
 
-    gdf = gdf.set_geometry( list(gpd.points_from_xy(gdf.x, gdf.y)) )    #gdf['geometry'] = gpd.points_from_xy(gdf.x, gdf.y)
+    if meshes is not None and len(gdf) == 0:
+        raise ValueError(f"No hay pozos de las mallas {', '.join(str(mesh) for mesh in meshes)}")
+
+    gdf = gdf.set_geometry(gpd.points_from_xy(gdf['x'].to_numpy(), gdf['y'].to_numpy()))
     gdf['drillhole_depth'] = gdf['z']-gdf['z_hole']
     gdf['type'] = 'hole'
     gdf.set_geometry('geometry')
     if(WGS84):
-        gdf.crs = 'EPSG:32719'
+        gdf.crs = reprojection.UTM_CRS
     else:
-        gdf.crs = 'EPSG:4326'
-        gdf = gdf.to_crs('EPSG:32719')
-        gdf.crs = 'EPSG:32719'
+        gdf.crs = reprojection.WGS84_CRS
+        gdf = reprojection.to_crs(gdf, reprojection.UTM_CRS)
     return gdf
 
 def split_ring(ring, split):
@@ -764,40 +745,37 @@ def split_ring(ring, split):
     parts[fuse[0]] = linemerge([parts[fuse[0]], popped_part])
     return parts
 
-def generate_arrow_geojson(graph_dataframe, crs):
+ARROW_LENGTH = 0.3
+ARROW_ANGLE = 20 * math.pi / 180
+
+def generate_arrow_geodataframe(graph_dataframe, crs, target_crs=reprojection.WGS84_CRS):
     """
-    Generates a GeoJSON-compatible dictionary of arrow geometries from the graph dataframe.
+    Generates a GeoDataFrame of arrow geometries from the graph dataframe
+    (two wings per pose), reprojected to target_crs (None keeps crs, to
+    reproject it along with other layers). The wings are computed for all
+    poses at once and their coordinates reprojected in one call.
     """
     if graph_dataframe is None or graph_dataframe.empty:
         return None
 
-    geometries = []
-
-    for idx, row in graph_dataframe.iterrows():
-        pose = row['graph_pose']
-        x0 = pose[0]
-        y0 = pose[1]
-        theta = pose[2]
-        
-        # Arrow head calculation
-        x1 = x0 + 0.3 * math.cos(20 * math.pi / 180) * math.cos(theta) * 0.5
-        y1 = y0 + 0.3 * math.cos(20 * math.pi / 180) * math.sin(theta) * 0.5
-        
-        x2_left = x1 - 0.3 * math.cos(theta + 20 * math.pi / 180)
-        y2_left = y1 - 0.3 * math.sin(theta + 20 * math.pi / 180)
-        
-        x2_right = x1 - 0.3 * math.cos(theta - 20 * math.pi / 180)
-        y2_right = y1 - 0.3 * math.sin(theta - 20 * math.pi / 180)
-        
-        # Add left wing
-        geometries.append(LineString([(x1, y1), (x2_left, y2_left)]))
-        # Add right wing
-        geometries.append(LineString([(x1, y1), (x2_right, y2_right)]))
-
-    graph_draw = gpd.GeoDataFrame(geometry=geometries)
-    graph_draw.crs = crs
-
-    if graph_draw.crs != 'EPSG:4326':
-        graph_draw = graph_draw.to_crs('EPSG:4326')
-
-    return graph_draw.to_json()
+    poses = np.asarray(graph_dataframe['graph_pose'].tolist(), dtype=np.float64).reshape(-1, 3)
+    x0, y0, theta = poses.T
+
+    # Arrow head, then the tips of the left and right wings
+    x1 = x0 + ARROW_LENGTH * math.cos(ARROW_ANGLE) * np.cos(theta) * 0.5
+    y1 = y0 + ARROW_LENGTH * math.cos(ARROW_ANGLE) * np.sin(theta) * 0.5
+    x2_left = x1 - ARROW_LENGTH * np.cos(theta + ARROW_ANGLE)
+    y2_left = y1 - ARROW_LENGTH * np.sin(theta + ARROW_ANGLE)
+    x2_right = x1 - ARROW_LENGTH * np.cos(theta - ARROW_ANGLE)
+    y2_right = y1 - ARROW_LENGTH * np.sin(theta - ARROW_ANGLE)
+
+    # (pose, wing, point) coordinates: wing 0 is head -> left tip, wing 1 head -> right tip
+    x = np.stack([np.stack([x1, x2_left], axis=1), np.stack([x1, x2_right], axis=1)], axis=1)
+    y = np.stack([np.stack([y1, y2_left], axis=1), np.stack([y1, y2_right], axis=1)], axis=1)
+    out_crs = crs
+    if target_crs is not None and crs is not None and crs != target_crs:
+        x, y = reprojection.transform_xy(x, y, crs, target_crs)
+        out_crs = target_crs
+
+    geometries = shapely.linestrings(np.stack([x, y], axis=-1).reshape(-1, 2, 2))
+    return gpd.GeoDataFrame(geometry=geometries, crs=out_crs)
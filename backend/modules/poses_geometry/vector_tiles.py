@@ -0,0 +1,296 @@
+import math
+import struct
+import numpy as np
+import shapely
+from modules.poses_geometry import reprojection
+
+# Mapbox Vector Tile (spec v2) encoding of a plan, one tile at a time.
+TILE_EXTENT = 4096
+# Margin around each tile (in tile units) so lines and labels join across tile edges
+TILE_BUFFER = 64
+MAX_ZOOM = 24
+# Half the width of the Web Mercator world in metres
+WORLD_HALF = 20037508.342789244
+
+# Zoom from which each layer is included (poses and arrows are only legible close up)
+LAYER_MIN_ZOOM = {
+    "streets": 0,
+    "transit_streets": 0,
+    "holes": 12,
+    "edges": 15,
+    "poses": 16,
+    "arrows": 19,
+}
+
+def tile_bounds(z, x, y):
+    """(min_x, min_y, max_x, max_y) of an XYZ tile in Web Mercator metres"""
+    size = 2 * WORLD_HALF / (1 << z)
+    min_x = -WORLD_HALF + x * size
+    max_y = WORLD_HALF - y * size
+    return min_x, max_y - size, min_x + size, max_y
+
+def to_mercator(lon, lat):
+    return reprojection.transform_xy(lon, lat, reprojection.WGS84_CRS, reprojection.WEB_MERCATOR_CRS)
+
+# --- Protobuf encoding (only what vector_tile.proto needs) ---
+
+def _varint(value, out):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _key(out, field, wire_type):
+    _varint((field << 3) | wire_type, out)
+
+def _message(out, field, data):
+    _key(out, field, 2)
+    _varint(len(data), out)
+    out += data
+
+def _packed(out, field, values):
+    data = bytearray()
+    for value in values:
+        _varint(value, data)
+    _message(out, field, data)
+
+def _encode_value(value):
+    out = bytearray()
+    if isinstance(value, str):
+        _message(out, 1, value.encode('utf-8'))
+    elif isinstance(value, bool):
+        _key(out, 7, 0)
+        _varint(int(value), out)
+    elif isinstance(value, int):
+        if value >= 0:
+            _key(out, 5, 0)
+            _varint(value, out)
+        else:
+            _key(out, 6, 0)
+            _varint(_zigzag(value), out)
+    else:
+        _key(out, 3, 1)
+        out += struct.pack('<d', float(value))
+    return out
+
+def _command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+POINT = 1
+LINESTRING = 2
+
+class LayerEncoder:
+    """Accumulates the features of one tile layer with its key/value tables"""
+    def __init__(self, name):
+        self.name = name
+        self.features = []
+        self.keys = {}
+        self.values = {}
+
+    def _tags(self, properties):
+        tags = []
+        for key, value in properties.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            tags.append(self.values.setdefault((type(value), value), len(self.values)))
+        return tags
+
+    def add(self, geom_type, geometry, properties=None, feature_id=None):
+        """geometry is the list of command integers of the feature"""
+        out = bytearray()
+        if feature_id is not None:
+            _key(out, 1, 0)
+            _varint(feature_id, out)
+        tags = self._tags(properties) if properties else None
+        if tags:
+            _packed(out, 2, tags)
+        _key(out, 3, 0)
+        _varint(geom_type, out)
+        _packed(out, 4, geometry)
+        self.features.append(out)
+
+    def encode(self):
+        out = bytearray()
+        _key(out, 15, 0)
+        _varint(2, out)
+        _message(out, 1, self.name.encode('utf-8'))
+        for feature in self.features:
+            _message(out, 2, feature)
+        for key in self.keys:
+            _message(out, 3, key.encode('utf-8'))
+        for _, value in self.values:
+            _message(out, 4, _encode_value(value))
+        _key(out, 5, 0)
+        _varint(TILE_EXTENT, out)
+        return out
+
+def point_geometry(x, y):
+    return [_command(1, 1), _zigzag(x), _zigzag(y)]
+
+def line_geometry(parts):
+    """Command integers of a (multi)linestring given as arrays of integer tile coordinates"""
+    geometry = []
+    cursor_x, cursor_y = 0, 0
+    for coords in parts:
+        geometry.append(_command(1, 1))
+        geometry.append(_zigzag(coords[0][0] - cursor_x))
+        geometry.append(_zigzag(coords[0][1] - cursor_y))
+        geometry.append(_command(2, len(coords) - 1))
+        for (x0, y0), (x1, y1) in zip(coords[:-1], coords[1:]):
+            geometry.append(_zigzag(x1 - x0))
+            geometry.append(_zigzag(y1 - y0))
+        cursor_x, cursor_y = coords[-1]
+    return geometry
+
+# --- Tile index ---
+
+def _scalar(value):
+    """Plain Python value for a tile attribute (None for unsupported ones)"""
+    if isinstance(value, (np.integer, int)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return float(value)
+    if isinstance(value, (str, bool)):
+        return value
+    return None
+
+class PlanTileIndex:
+    """
+    Spatial index over the layers of one plan in Web Mercator, cut into
+    vector tiles on request. Graph layers (poses and edges) come from the
+    loaded GraphManager; the other layers are GeoDataFrames in EPSG:4326.
+    """
+    def __init__(self):
+        # name -> {"kind": "points" | "segments" | "features", ...}
+        self.layers = {}
+        self.bounds = None
+
+    def add_points(self, name, x, y, properties=None, ids=None):
+        """Points in Web Mercator. properties: dict of column name -> array"""
+        xy = np.column_stack([x, y])
+        valid = np.isfinite(xy).all(axis=1)
+        self.layers[name] = {
+            "kind": "points",
+            "xy": xy[valid],
+            "properties": {key: np.asarray(values)[valid] for key, values in (properties or {}).items()},
+            "ids": None if ids is None else np.asarray(ids)[valid],
+            "tree": shapely.STRtree(shapely.points(xy[valid]))
+        }
+        self._extend_bounds(xy[valid])
+
+    def add_segments(self, name, segments):
+        """Two-point lines (edges, arrow wings) as an (n, 2, 2) array in Web Mercator"""
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+        segments = segments[np.isfinite(segments).all(axis=(1, 2))]
+        self.layers[name] = {
+            "kind": "segments",
+            "segments": segments,
+            "tree": shapely.STRtree(shapely.linestrings(segments))
+        }
+        self._extend_bounds(segments.reshape(-1, 2))
+
+    def add_geodataframe(self, name, gdf, columns=()):
+        """Point or line layer from a GeoDataFrame in EPSG:4326"""
+        geometries = reprojection.transform_geometries(gdf.geometry.values, reprojection.WGS84_CRS, reprojection.WEB_MERCATOR_CRS)
+        columns = [column for column in columns if column in gdf.columns]
+        properties = [
+            {column: _scalar(value) for column, value in zip(columns, row)}
+            for row in gdf[columns].itertuples(index=False, name=None)
+        ]
+        self.layers[name] = {
+            "kind": "features",
+            "geometries": geometries,
+            "properties": properties,
+            "tree": shapely.STRtree(geometries)
+        }
+        if len(geometries):
+            self._extend_bounds(shapely.get_coordinates(geometries))
+
+    def _extend_bounds(self, xy):
+        if not len(xy):
+            return
+        box = [xy[:, 0].min(), xy[:, 1].min(), xy[:, 0].max(), xy[:, 1].max()]
+        if self.bounds is None:
+            self.bounds = box
+        else:
+            self.bounds = [min(self.bounds[0], box[0]), min(self.bounds[1], box[1]), max(self.bounds[2], box[2]), max(self.bounds[3], box[3])]
+
+    def lonlat_bounds(self):
+        """[west, south, east, north] of the plan, as in TileJSON"""
+        if self.bounds is None:
+            return None
+        lon, lat = reprojection.transform_xy([self.bounds[0], self.bounds[2]], [self.bounds[1], self.bounds[3]], reprojection.WEB_MERCATOR_CRS, reprojection.WGS84_CRS)
+        return [lon[0], lat[0], lon[1], lat[1]]
+
+    def tile(self, z, x, y):
+        """Encoded MVT of tile z/x/y (empty bytes when no layer has features there)"""
+        min_x, min_y, max_x, max_y = tile_bounds(z, x, y)
+        scale = TILE_EXTENT / (max_x - min_x)
+        margin = TILE_BUFFER / scale
+        query = shapely.box(min_x - margin, min_y - margin, max_x + margin, max_y + margin)
+
+        def to_tile(xy):
+            xy = np.asarray(xy, dtype=np.float64)
+            return np.column_stack([
+                np.rint((xy[:, 0] - min_x) * scale),
+                np.rint((max_y - xy[:, 1]) * scale)
+            ]).astype(np.int64)
+
+        out = bytearray()
+        for name, layer in self.layers.items():
+            if z < LAYER_MIN_ZOOM.get(name, 0):
+                continue
+            found = np.sort(layer["tree"].query(query))
+            if not len(found):
+                continue
+            encoder = LayerEncoder(name)
+            if layer["kind"] == "points":
+                self._encode_points(encoder, layer, found, to_tile)
+            elif layer["kind"] == "segments":
+                self._encode_segments(encoder, layer, found, to_tile)
+            else:
+                self._encode_lines(encoder, layer, found, to_tile, query)
+            if encoder.features:
+                _message(out, 3, encoder.encode())
+        return bytes(out)
+
+    def _encode_points(self, encoder, layer, found, to_tile):
+        # Points falling on the same tile pixel are drawn once
+        xy = to_tile(layer["xy"][found])
+        _, first = np.unique(xy, axis=0, return_index=True)
+        for i in np.sort(first):
+            row = found[i]
+            properties = {key: _scalar(values[row]) for key, values in layer["properties"].items()}
+            feature_id = int(layer["ids"][row]) if layer["ids"] is not None else None
+            encoder.add(POINT, point_geometry(int(xy[i, 0]), int(xy[i, 1])), properties, feature_id)
+
+    def _encode_segments(self, encoder, layer, found, to_tile):
+        # Segments collapsing to a point or onto another one at this zoom are dropped
+        xy = to_tile(layer["segments"][found].reshape(-1, 2)).reshape(-1, 4)
+        xy = xy[(xy[:, 0] != xy[:, 2]) | (xy[:, 1] != xy[:, 3])]
+        for x0, y0, x1, y1 in np.unique(xy, axis=0).tolist():
+            encoder.add(LINESTRING, [_command(1, 1), _zigzag(x0), _zigzag(y0), _command(2, 1), _zigzag(x1 - x0), _zigzag(y1 - y0)])
+
+    def _encode_lines(self, encoder, layer, found, to_tile, query):
+        min_x, min_y, max_x, max_y = query.bounds
+        for row in found:
+            geometry = layer["geometries"][row]
+            if shapely.get_type_id(geometry) == 0:
+                xy = to_tile(shapely.get_coordinates(geometry))
+                encoder.add(POINT, point_geometry(int(xy[0, 0]), int(xy[0, 1])), layer["properties"][row])
+                continue
+            parts = []
+            for part in shapely.get_parts(shapely.clip_by_rect(geometry, min_x, min_y, max_x, max_y)):
+                if shapely.get_type_id(part) != 1:
+                    continue
+                xy = to_tile(shapely.get_coordinates(part))
+                # Vertices closer than a tile unit are merged
+                xy = xy[np.concatenate([[True], (np.diff(xy, axis=0) != 0).any(axis=1)])]
+                if len(xy) >= 2:
+                    parts.append(xy.tolist())
+            if parts:
+                encoder.add(LINESTRING, line_geometry(parts), layer["properties"][row])
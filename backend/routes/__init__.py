@@ -3,5 +3,8 @@ from .api_v1.generate_routes.generate_routes import generate_routes_bp
 from .api_v1.calculate_path.calculate_path import calculate_path_bp
 from .api_v1.graph_nodes.graph_nodes import graph_nodes_bp
 from .api_v1.transfer_files.transfer_files import transfer_files_bp
+from .api_v1.runtime_obstacles.runtime_obstacles import runtime_obstacles_bp
+from .api_v1.plan_artifacts.plan_artifacts import plan_artifacts_bp
+from .api_v1.tiles.tiles import tiles_bp
 from .heathcheck.healthcheck import healthcheck_bp
 
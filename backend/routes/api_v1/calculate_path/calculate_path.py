@@ -1,31 +1,35 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
-import os
-from config import GENERATED_DIR
 from pydantic import BaseModel
-from modules.poses_geometry import path_finding
+from typing import Optional
+from routes.api_v1.plan_graph import get_plan_graph
 
 class PathRequest(BaseModel):
     start_node: int
     end_node: int
+    plan_id: Optional[str] = None  # Generated plan to query (latest plan when omitted)
+    heuristic: Optional[str] = None  # 'alt' (default) or 'euclidean'
+    debug: bool = False  # Include A* search stats (expanded nodes, time) in the response
 
 calculate_path_bp = APIRouter()
 
 @calculate_path_bp.post("/api/v1/calculate-path")
 async def calculate_path(req: PathRequest):
-    if not path_finding.graph_manager.G:
-        # Try to load default if not loaded
-        csv_path = os.path.join(GENERATED_DIR, 'global_plan.csv')
-        if os.path.exists(csv_path):
-            path_finding.graph_manager.load_graph_from_csv(csv_path)
-        else:
-             return JSONResponse(content={"status": "error", "message": "Graph not loaded and no global_plan.csv found"}, status_code=400)
+    graph, error = get_plan_graph(req.plan_id)
+    if error:
+        return error
     
     try:
-        path = path_finding.graph_manager.find_path(req.start_node, req.end_node)
+        path = graph.find_path(req.start_node, req.end_node, heuristic=req.heuristic)
         if path is None:
              return JSONResponse(content={"status": "error", "message": "No path found"}, status_code=404)
         
-        return {"status": "success", "path": path}
+        response = {"status": "success", "path": path}
+        if req.debug:
+            response["stats"] = graph.last_search_stats
+        return response
+    except ValueError as e:
+        # Unknown heuristic or node ids not in the graph
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
     except Exception as e:
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
@@ -1,14 +1,12 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import torch
 import math
 import random
-from sklearn.decomposition import PCA
-from IPython.display import display
 import pandas as pd
 import geopandas as gpd
 import shapely
+from scipy import linalg
 
 
 def translate(xarr, yarr, tx, ty):
@@ -34,18 +32,19 @@ def rotate(xarr, yarr, angle):
 
 
 def get_pca_transform(xarr,yarr):
+    """
+    Centroid and direction of the principal axis of the points, computed
+    the way PCA(n_components=2).fit did with the pinned scikit-learn 1.3.2
+    (kept without importing it): full SVD of the centred points, then
+    svd_flip's sign, which makes the largest |U| entry of the component
+    positive (the point farthest along the axis projects on its positive side).
+    """
     n = len(xarr)
-    X = []
-    sx = 0
-    sy = 0
-    for i in range(n):
-        X.append((xarr[i],yarr[i]))
-        sx += xarr[i]
-        sy += yarr[i]
-    pca = PCA(n_components=2)
-    X_fit = pca.fit(X)
-    angle = math.atan2(pca.components_[0,1], pca.components_[0,0])
-    return sx/n, sy/n, angle
+    X = np.column_stack([np.asarray(xarr, dtype=np.float64), np.asarray(yarr, dtype=np.float64)])
+    U, S, Vt = linalg.svd(X - np.mean(X, axis=0), full_matrices=False)
+    component = Vt[0] * np.sign(U[np.argmax(np.abs(U[:, 0])), 0])
+    angle = math.atan2(component[1], component[0])
+    return sum(xarr)/n, sum(yarr)/n, angle
 
 
 def select_near_holes(xarr, yarr, holesx, holesy, d_thr):
@@ -168,7 +167,7 @@ class CurveModel(torch.nn.Module):
     return self.y
 
 
-def fit_street(orig_x, orig_y, holes_x, holes_y, low_x, low_y, high_x, high_y):
+def fit_street(orig_x, orig_y, holes_x, holes_y, low_x, low_y, high_x, high_y, cancel_token=None):
     if len(orig_x) < 2:
         return orig_x, orig_y
     tx, ty, angle = get_pca_transform(orig_x,orig_y)
@@ -206,6 +205,7 @@ def fit_street(orig_x, orig_y, holes_x, holes_y, low_x, low_y, high_x, high_y):
 
     n_iters = 300 # 500
     for i in range(0, n_iters):
+        if cancel_token: cancel_token.check()
         if i == 100:
             for g in optim.param_groups:
                 g['lr'] = 0.01
@@ -315,7 +315,7 @@ def del_colliding(orig_x, orig_y, holes_x, holes_y, low_x, low_y, high_x, high_y
     return curve_x, curve_y
 
 
-def fit_all_streets(streets : gpd.GeoDataFrame, holes : gpd.GeoDataFrame, geofence : gpd.GeoDataFrame, obstacles : gpd.GeoDataFrame, high_obstacles : gpd.GeoDataFrame, fit_twice : bool, progress_callback=None):
+def fit_all_streets(streets : gpd.GeoDataFrame, holes : gpd.GeoDataFrame, geofence : gpd.GeoDataFrame, obstacles : gpd.GeoDataFrame, high_obstacles : gpd.GeoDataFrame, fit_twice : bool, progress_callback=None, cancel_token=None):
     all_holes_x = holes['x'].to_list()
     all_holes_y = holes['y'].to_list()
 
@@ -358,12 +358,12 @@ def fit_all_streets(streets : gpd.GeoDataFrame, holes : gpd.GeoDataFrame, geofen
         #    f.write(str(orig_x) + "\n")
         #    f.write(str(orig_y) + "\n")
 
-        curve_x, curve_y = fit_street(orig_x, orig_y, holes_x, holes_y, low_x, low_y, geof_x, geof_y)
+        curve_x, curve_y = fit_street(orig_x, orig_y, holes_x, holes_y, low_x, low_y, geof_x, geof_y, cancel_token)
         #curve_x, curve_y = orig_x, orig_y
 
         if fit_twice:
             curve_x, curve_y = del_colliding(curve_x, curve_y, holes_x, holes_y, low_x, low_y, geof_x, geof_y)
-            curve_x, curve_y = fit_street(curve_x, curve_y, holes_x, holes_y, low_x, low_y, geof_x, geof_y)
+            curve_x, curve_y = fit_street(curve_x, curve_y, holes_x, holes_y, low_x, low_y, geof_x, geof_y, cancel_token)
 
         xy = []
         for i in range(len(curve_x)):
@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import geopandas as gpd
+
+from modules.poses_geometry import utils
+from modules.poses_geometry import reprojection
+from routes.api_v1.generate_routes.stage_cache import stage_cache, stage_key, input_key
+
+# readHolFile always returns UTM 19S; the other layers are reprojected to it
+INPUT_CRS = reprojection.UTM_CRS
+PARQUET_EXTENSIONS = ('.parquet', '.geoparquet')
+
+def _read_file_options():
+    """read_file arguments: the pyogrio engine (through Arrow if pyarrow is installed) when available"""
+    try:
+        import pyogrio
+    except ImportError:
+        return {}
+    try:
+        import pyarrow
+        return {'engine': 'pyogrio', 'use_arrow': True}
+    except ImportError:
+        return {'engine': 'pyogrio'}
+
+def read_layer(path):
+    """Uploaded vector layer: GeoParquet, or any format GDAL reads (GeoJSON, FlatGeobuf, ...)"""
+    if os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS:
+        layer = gpd.read_parquet(path)
+        # Nested Parquet values come as NumPy arrays; lists keep them JSON serializable
+        for column in layer.columns[layer.dtypes == object]:
+            layer[column] = [value.tolist() if isinstance(value, np.ndarray) else value for value in layer[column]]
+        return layer
+    return gpd.read_file(path, **_read_file_options())
+
+def load_layer(role, path, wgs84, meshes=None):
+    """
+    One uploaded layer read and reprojected to INPUT_CRS, with its 'type'
+    column set. Cached by the file hash (in the stage cache), so a file
+    uploaded again is neither parsed nor reprojected. None without a path.
+    meshes (holes only) keeps the holes of those meshes.
+    """
+    if not path:
+        return None
+    params = {'crs': INPUT_CRS}
+    if meshes is not None:
+        params['meshes'] = meshes
+    key = stage_key('layer', [input_key(role, path, wgs84)], params)
+    hit, layer = stage_cache.get('layer', key)
+    if hit:
+        return layer
+    if role == 'holes':
+        layer = utils.readHolFile(path, wgs84, meshes)
+    else:
+        layer = reprojection.to_crs(read_layer(path), INPUT_CRS)
+        layer['type'] = role
+    stage_cache.put('layer', key, layer)
+    return layer
+
+def load_layers(paths, wgs84, meshes=None):
+    """load_layer for every role -> path, read concurrently (meshes filters the holes). Returns role -> layer"""
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        jobs = {
+            role: executor.submit(load_layer, role, path, wgs84, meshes if role == 'holes' else None)
+            for role, path in paths.items()
+        }
+        return {role: job.result() for role, job in jobs.items()}
@@ -0,0 +1,253 @@
+import io
+import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import shapely
+from PIL import Image
+
+# Occupancy map written as map.png for the robot's map server (see maze_peld.yaml)
+MAP_RESOLUTION = 0.15  # metres per pixel
+MAP_MARGIN = 30.0  # metres around the plan
+HOLE_RADIUS = 0.2  # metres burned around each hole
+FREE = 255
+OCCUPIED = 0
+
+def map_frame(bounds, margin=MAP_MARGIN, resolution=MAP_RESOLUTION):
+    """
+    Square map covering bounds (min_x, min_y, max_x, max_y) plus the margin.
+    Returns (min_x, min_y, size in pixels); (min_x, min_y) is the lower-left
+    corner of the image and the origin of the local frame.
+    """
+    min_x = bounds[0] - margin
+    min_y = bounds[1] - margin
+    size = max(bounds[2] - bounds[0], bounds[3] - bounds[1]) + 2 * margin
+    return min_x, min_y, int(math.ceil(size / resolution))
+
+def _mark(grid, cols, rows_up, offset=(0, 0)):
+    """
+    Marks pixels given as column and row counted from the bottom, ignoring
+    those off the map. offset is the (column, row) of the grid's lower-left
+    pixel in the full map, for tiles.
+    """
+    height, width = grid.shape
+    cols = cols - offset[0]
+    rows_up = rows_up - offset[1]
+    inside = (cols >= 0) & (cols < width) & (rows_up >= 0) & (rows_up < height)
+    grid[height - 1 - rows_up[inside], cols[inside]] = OCCUPIED
+
+def burn_polygons(grid, polygons, min_x, min_y, resolution=MAP_RESOLUTION, offset=(0, 0)):
+    """Fills the pixels whose centre lies inside any of the polygons"""
+    polygons = np.asarray(polygons, dtype=object)
+    polygons = polygons[~shapely.is_empty(polygons)]
+    if not len(polygons):
+        return
+    # Range of pixel centres inside each polygon's bounding box
+    bounds = (shapely.bounds(polygons) - [min_x, min_y, min_x, min_y]) / resolution
+    col0 = np.ceil(bounds[:, 0] - 0.5).astype(np.int64)
+    row0 = np.ceil(bounds[:, 1] - 0.5).astype(np.int64)
+    widths = np.maximum(np.floor(bounds[:, 2] - 0.5).astype(np.int64) - col0 + 1, 0)
+    heights = np.maximum(np.floor(bounds[:, 3] - 0.5).astype(np.int64) - row0 + 1, 0)
+    counts = widths * heights
+    owner = np.repeat(np.arange(len(polygons)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cols = col0[owner] + local % widths[owner]
+    rows_up = row0[owner] + local // widths[owner]
+    inside = shapely.contains_xy(polygons[owner], min_x + (cols + 0.5) * resolution, min_y + (rows_up + 0.5) * resolution)
+    _mark(grid, cols[inside], rows_up[inside], offset)
+
+def _grid_crossings(a0, a1, b0, b1):
+    """
+    Where segments from (a0, b0) to (a1, b1) cross the integer lines a = k:
+    returns (k, b at the crossing) for every crossing of every segment.
+    """
+    low = np.ceil(np.minimum(a0, a1)).astype(np.int64)
+    counts = np.maximum(np.floor(np.maximum(a0, a1)).astype(np.int64) - low + 1, 0)
+    counts[a0 == a1] = 0
+    segment = np.repeat(np.arange(len(a0)), counts)
+    k = low[segment] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = (k - a0[segment]) / (a1[segment] - a0[segment])
+    return k, b0[segment] + t * (b1[segment] - b0[segment])
+
+def burn_lines(grid, lines, min_x, min_y, resolution=MAP_RESOLUTION, offset=(0, 0)):
+    """
+    Marks every pixel a (multi)linestring passes through. Splitting the lines
+    at their vertices does not change the result, so a tile can burn just the
+    segments near it (in the full map frame, see _mark) and join its
+    neighbours exactly.
+    """
+    parts = shapely.get_parts(np.asarray(lines, dtype=object))
+    if not len(parts):
+        return
+    coords, index = shapely.get_coordinates(parts, return_index=True)
+    coords = (coords - [min_x, min_y]) / resolution
+    same = index[:-1] == index[1:]
+    x0, y0 = coords[:-1][same].T
+    x1, y1 = coords[1:][same].T
+
+    # Endpoints, then the pixels on both sides of each grid line crossed
+    cols = [np.floor(coords[:, 0])]
+    rows_up = [np.floor(coords[:, 1])]
+    k, y = _grid_crossings(x0, x1, y0, y1)
+    cols += [k - 1, k]
+    rows_up += [np.floor(y), np.floor(y)]
+    k, x = _grid_crossings(y0, y1, x0, x1)
+    cols += [np.floor(x), np.floor(x)]
+    rows_up += [k - 1, k]
+    _mark(grid, np.concatenate(cols).astype(np.int64), np.concatenate(rows_up).astype(np.int64), offset)
+
+def rasterize_occupancy(holes, geofence, min_x, min_y, size, resolution=MAP_RESOLUTION):
+    """
+    uint8 occupancy grid (FREE / OCCUPIED) with the hole buffers filled and
+    the geofence boundary drawn. Row 0 is the top of the map.
+    """
+    grid = np.full((size, size), FREE, dtype=np.uint8)
+    burn_polygons(grid, holes.buffer(HOLE_RADIUS).values, min_x, min_y, resolution)
+    burn_lines(grid, geofence.boundary.values, min_x, min_y, resolution)
+    return grid
+
+def write_png(grid, path):
+    Image.fromarray(grid).save(path)
+
+def encode_png(grid):
+    """PNG bytes of the grid, to write and publish it without reading the file back"""
+    buffer = io.BytesIO()
+    Image.fromarray(grid).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+# --- Tiled output: fixed-size tiles plus a pyramid of coarser levels ---
+
+MAP_TILES_DIR = 'map_tiles'
+MAP_TILES_INDEX = 'map_tiles.yaml'
+
+def _tile_path(output_dir, level, col, row):
+    return os.path.join(output_dir, MAP_TILES_DIR, str(level), f"{col}_{row}.png")
+
+def _tile_shape(level_size, tile_size, col, row):
+    """(height, width) of a tile, the last ones of each row/column are cut at the map edge"""
+    return min(tile_size, level_size - row * tile_size), min(tile_size, level_size - col * tile_size)
+
+def _save_tile(grid, output_dir, level, col, row):
+    """Writes a tile unless it is all free (missing tiles are free space). Returns True if written"""
+    if (grid == FREE).all():
+        return False
+    write_png(grid, _tile_path(output_dir, level, col, row))
+    return True
+
+def _halve(grid):
+    """Half-resolution copy: a pixel is occupied if any of the 2x2 pixels it covers is"""
+    height, width = grid.shape
+    if height % 2 or width % 2:
+        # Odd sizes only occur at the top and right map edges; pad there with free space
+        padded = np.full((height + height % 2, width + width % 2), FREE, dtype=np.uint8)
+        padded[padded.shape[0] - height:, :width] = grid
+        grid = padded
+    return np.minimum(np.minimum(grid[0::2, 0::2], grid[0::2, 1::2]), np.minimum(grid[1::2, 0::2], grid[1::2, 1::2]))
+
+def _base_tile(holes_tree, hole_polygons, segments_tree, segments, output_dir, min_x, min_y, size, tile_size, resolution, col, row):
+    """
+    Rasterizes one full-resolution tile (only the geometries that reach it).
+    Pixels are computed in the full map frame, so tiles match the single
+    image pixel for pixel. Returns (written, half-resolution copy for the
+    next level).
+    """
+    height, width = _tile_shape(size, tile_size, col, row)
+    offset = (col * tile_size, row * tile_size)
+    # One pixel of slack: segments ending on the tile edge still mark its border pixels
+    box = shapely.box(
+        min_x + (offset[0] - 1) * resolution, min_y + (offset[1] - 1) * resolution,
+        min_x + (offset[0] + width + 1) * resolution, min_y + (offset[1] + height + 1) * resolution
+    )
+    grid = np.full((height, width), FREE, dtype=np.uint8)
+    burn_polygons(grid, hole_polygons[holes_tree.query(box)], min_x, min_y, resolution, offset)
+    burn_lines(grid, segments[segments_tree.query(box)], min_x, min_y, resolution, offset)
+    return _save_tile(grid, output_dir, 0, col, row), _halve(grid)
+
+def _segments(lines):
+    """The (multi)linestrings split into their two-point segments"""
+    parts = shapely.get_parts(np.asarray(lines, dtype=object))
+    coords, index = shapely.get_coordinates(parts, return_index=True)
+    same = np.flatnonzero(index[:-1] == index[1:])
+    return shapely.linestrings(np.stack([coords[same], coords[same + 1]], axis=1)) if len(same) else np.empty(0, dtype=object)
+
+def _pyramid_tile(children, output_dir, level, level_size, tile_size, col, row):
+    """
+    Builds a tile of `level` from the half-resolution copies of its (up to)
+    four child tiles one level down. Returns the same as _base_tile.
+    """
+    half = tile_size // 2
+    canvas = np.full((tile_size, tile_size), FREE, dtype=np.uint8)
+    for dc in (0, 1):
+        for dr in (0, 1):
+            child = children.get((2 * col + dc, 2 * row + dr))
+            if child is None:
+                continue
+            bottom = tile_size - dr * half
+            canvas[bottom - child.shape[0]:bottom, dc * half:dc * half + child.shape[1]] = child
+    height, width = _tile_shape(level_size, tile_size, col, row)
+    grid = canvas[tile_size - height:, :width]
+    return _save_tile(grid, output_dir, level, col, row), _halve(grid)
+
+def write_tiled_map(holes, geofence, min_x, min_y, size, output_dir, tile_size, workers, resolution=MAP_RESOLUTION):
+    """
+    Writes the occupancy map as tiles under map_tiles/<level>/<col>_<row>.png
+    (rows counted from the bottom, so tile (0, 0) starts at the map origin)
+    plus coarser pyramid levels, halving the resolution each level until one
+    tile covers the map. Tiles are rasterized in parallel and written as they
+    are done; only the half-resolution copies of one level are kept to build
+    the next, never the full map. Returns the index also written to
+    map_tiles.yaml.
+    """
+    tile_size += tile_size % 2
+    hole_polygons = np.asarray(holes.buffer(HOLE_RADIUS).values, dtype=object)
+    holes_tree = shapely.STRtree(hole_polygons)
+    segments = _segments(geofence.boundary.values)
+    segments_tree = shapely.STRtree(segments)
+
+    levels = []
+    level_size = size
+    children = None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            level = len(levels)
+            tiles = int(math.ceil(level_size / tile_size))
+            os.makedirs(os.path.join(output_dir, MAP_TILES_DIR, str(level)), exist_ok=True)
+            if level == 0:
+                jobs = {
+                    (col, row): executor.submit(_base_tile, holes_tree, hole_polygons, segments_tree, segments, output_dir, min_x, min_y, size, tile_size, resolution, col, row)
+                    for col in range(tiles) for row in range(tiles)
+                }
+            else:
+                jobs = {
+                    (col, row): executor.submit(_pyramid_tile, children, output_dir, level, level_size, tile_size, col, row)
+                    for col in range(tiles) for row in range(tiles)
+                }
+            results = {position: job.result() for position, job in jobs.items()}
+            children = {position: half for position, (_, half) in results.items()}
+            written = sum(written for written, _ in results.values())
+            levels.append({"level": level, "resolution": resolution * 2 ** level, "size": level_size, "tiles": tiles, "written": written})
+            if tiles == 1:
+                break
+            level_size = int(math.ceil(level_size / 2))
+
+    index = {"resolution": resolution, "size": size, "tile_size": tile_size, "levels": levels}
+    with open(os.path.join(output_dir, MAP_TILES_INDEX), 'w') as file:
+        file.write(f"tiles: {MAP_TILES_DIR}/{{level}}/{{col}}_{{row}}.png\n")
+        file.write(f"resolution: {resolution}\n")
+        file.write("origin: [0.0, 0.0, 0.0]\n")
+        file.write("negate: 0\n")
+        file.write("occupied_thresh: 0.65\n")
+        file.write("free_thresh: 0.196\n")
+        file.write(f"size: [{size}, {size}]\n")
+        file.write(f"tile_size: {tile_size}\n")
+        file.write("# Rows are counted from the bottom (tile 0_0 starts at the origin); missing tiles are free space\n")
+        file.write("levels:\n")
+        for entry in levels:
+            file.write(f"  - {{level: {entry['level']}, resolution: {entry['resolution']}, size: [{entry['size']}, {entry['size']}], columns: {entry['tiles']}, rows: {entry['tiles']}}}\n")
+    return index
+
+def overview_path(output_dir, index):
+    """Path of the single tile of the coarsest level (None if it is all free)"""
+    top = index["levels"][-1]["level"]
+    path = _tile_path(output_dir, top, 0, 0)
+    return path if os.path.exists(path) else None
@@ -0,0 +1,141 @@
+import time
+import itertools
+
+from modules.poses_geometry import utils
+from modules.poses_geometry.cancellation import JobCancelled
+from routes.api_v1.generate_routes import route_gen_logic
+from routes.api_v1.generate_routes.stage_cache import StageRunner, stage_cache
+from .route_generation import run_load_stage
+
+def expand_grid(grid, max_variants):
+    """
+    {"TURNING_RADIUS": [2.5, 3.0], "HOLE_DISTANCE": [3.8]} -> one dict per
+    combination. Raises ValueError on unknown parameters or bad values.
+    """
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError("grid must be a non-empty object of parameter -> list of values")
+    names = sorted(grid)
+    for name in names:
+        if name not in route_gen_logic.SWEEP_PARAMETERS:
+            raise ValueError(f"Unknown sweep parameter '{name}' (expected one of {', '.join(route_gen_logic.SWEEP_PARAMETERS)})")
+        values = grid[name] if isinstance(grid[name], list) else [grid[name]]
+        if not values or not all(isinstance(v, (int, float)) and not isinstance(v, bool) and v > 0 for v in values):
+            raise ValueError(f"Values of '{name}' must be positive numbers")
+        grid[name] = values
+    count = 1
+    for name in names:
+        count *= len(grid[name])
+    if count > max_variants:
+        raise ValueError(f"Sweep has {count} variants, the maximum is {max_variants}")
+    return [dict(zip(names, combination)) for combination in itertools.product(*(grid[name] for name in names))]
+
+def summarize_graph(graph_dataframe):
+    """Node/edge counts and connectivity of a generated graph"""
+    import networkx as nx
+
+    pose_type = list(graph_dataframe['pose_type'])
+    connections = list(graph_dataframe['connections'])
+    G = nx.Graph()
+    G.add_nodes_from(range(len(pose_type)))
+    for i, neighbours in enumerate(connections):
+        G.add_edges_from((i, j) for j in neighbours if j > i)
+
+    home_ids = [i for i, t in enumerate(pose_type) if t == 'home_pose']
+    reachable = nx.node_connected_component(G, home_ids[0]) if home_ids else set()
+    drillhole_ids = list(graph_dataframe['drillhole_id'])
+    unreachable = [drillhole_ids[i] for i, t in enumerate(pose_type) if t == 'hole' and i not in reachable]
+
+    try:
+        connected = utils.checkConnections(list(graph_dataframe['graph_pose']), [list(e) for e in G.edges], pose_type)
+        connectivity_message = None
+    except ValueError as e:
+        connected = False
+        connectivity_message = str(e)
+
+    return {
+        "nodes": len(pose_type),
+        "edges": G.number_of_edges(),
+        "holes": pose_type.count('hole'),
+        "connected": connected,
+        "connectivity_message": connectivity_message,
+        "unreachable_holes": unreachable
+    }
+
+def run_sweep_prepare(
+    progress_queue,
+    holes_path, geofence_path, streets_path, home_pose_path,
+    transit_streets_path, obstacles_path, high_obstacles_path,
+    wgs84, fit_streets, fit_twice, cancel_token=None
+):
+    """
+    Runs the stages every variant shares (load/reproject and street fitting)
+    so they land in the stage cache before the variants fan out.
+    """
+    if cancel_token:
+        cancel_token.start()
+    try:
+        stages = StageRunner(stage_cache, report=progress_queue.put)
+        holes_df, geofence_df, home_pose_df, streets_df, transit_streets_df, obstacles_df, high_obstacles_df = run_load_stage(
+            stages, holes_path, geofence_path, streets_path, home_pose_path,
+            transit_streets_path, obstacles_path, high_obstacles_path, wgs84
+        )
+        route_gen_logic.run_fit_streets_stage(
+            stages, streets_df, holes_df, geofence_df, obstacles_df, high_obstacles_df, fit_streets, fit_twice, cancel_token=cancel_token
+        )
+        progress_queue.put({"type": "prepared"})
+        return True
+    except JobCancelled as e:
+        progress_queue.put({"type": "error", "message": str(e), "cancelled": True})
+        return False
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        progress_queue.put({"type": "error", "message": str(e)})
+        return False
+
+def run_sweep_variant(
+    progress_queue,
+    holes_path, geofence_path, streets_path, home_pose_path,
+    transit_streets_path, obstacles_path, high_obstacles_path,
+    wgs84, use_transit_streets, use_obstacles, use_high_obstacles,
+    fit_streets, fit_twice, index, params, cancel_token=None
+):
+    """Builds the graph for one parameter combination and reports a summary (no artifacts are written)"""
+    if cancel_token:
+        cancel_token.start()
+    start = time.time()
+    summary = {"type": "variant", "index": index, "params": params}
+    try:
+        stages = StageRunner(stage_cache)
+        holes_df, geofence_df, home_pose_df, streets_df, transit_streets_df, obstacles_df, high_obstacles_df = run_load_stage(
+            stages, holes_path, geofence_path, streets_path, home_pose_path,
+            transit_streets_path, obstacles_path, high_obstacles_path, wgs84
+        )
+        results = route_gen_logic.generate_routes_logic(
+            holes=holes_df,
+            geofence=geofence_df,
+            home_pose=home_pose_df,
+            streets=streets_df,
+            transit_streets=transit_streets_df,
+            obstacles=obstacles_df,
+            high_obstacles=high_obstacles_df,
+            use_obstacles=use_obstacles,
+            use_high_obstacles=use_high_obstacles,
+            use_transit_streets=use_transit_streets,
+            fit_streets_enabled=fit_streets,
+            fit_twice=fit_twice,
+            cancel_token=cancel_token,
+            stages=stages,
+            params=params,
+            validate=False
+        )
+        summary.update(summarize_graph(results['graph_dataframe']))
+        summary["status"] = "success"
+    except JobCancelled as e:
+        summary.update({"status": "error", "message": str(e), "cancelled": True})
+    except Exception as e:
+        # e.g. a hole without loading poses for these parameters
+        summary.update({"status": "error", "message": str(e)})
+    summary["time_ms"] = round((time.time() - start) * 1000.0, 1)
+    progress_queue.put(summary)
+    return summary["status"] == "success"
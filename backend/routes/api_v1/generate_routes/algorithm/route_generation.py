@@ -3,11 +3,13 @@
 import sys
 import os
 import math
-import base64
-import geopandas as gpd
+import time
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from filelock import FileLock
 import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
 
 # Add the backend directory to sys.path to resolve 'modules'
 from config import BACKEND_DIR
@@ -15,47 +17,229 @@ if BACKEND_DIR not in sys.path:
     sys.path.append(BACKEND_DIR)
 
 from modules.poses_geometry import utils
+from modules.poses_geometry import path_finding
+from modules.poses_geometry import plan_table
+from modules.poses_geometry import reprojection
+from modules.poses_geometry.cancellation import JobCancelled
 from routes.api_v1.generate_routes import route_gen_logic
-from config import GENERATED_DIR
+from routes.api_v1.generate_routes.stage_cache import StageRunner, stage_cache, input_key
+from routes.api_v1.plan_artifacts.artifact_store import ArtifactWriter, public_manifest
+from . import occupancy_map
+from . import input_layers
+from config import GENERATED_DIR, PLANS_DIR, MAP_TILE_SIZE, MAP_TILE_WORKERS, ARTIFACT_WORKERS
+
+# Artifacts written to each job's output directory (a tiled map replaces map.png and
+# maze_peld.yaml with map_tiles.yaml and the map_tiles/ directory)
+OUTPUT_FILES = ['global_plan.csv', 'global_plan.parquet', 'map.png', 'maze_peld.yaml', 'latlon.yaml', occupancy_map.MAP_TILES_INDEX]
+DOWNLOAD_FILES = {
+    "csv": 'global_plan.csv',
+    "plan_parquet": 'global_plan.parquet',
+    "map_png": 'map.png',
+    "map_yaml": 'maze_peld.yaml',
+    "latlon_yaml": 'latlon.yaml',
+    "map_tiles_yaml": occupancy_map.MAP_TILES_INDEX
+}
+# Held while a plan is copied to the top of GENERATED_DIR (shared by all worker processes)
+PUBLISH_LOCK = os.path.join(GENERATED_DIR, '.publish.lock')
+DOWNLOAD_PREFIX = "/api/v1/generate-routes/download"
+# Map layer -> manifest entry
+LAYER_ARTIFACTS = {
+    "arrows": "arrow_geojson",
+    "holes": "holes_geojson",
+    "geofence": "geofence_geojson",
+    "streets": "streets_geojson",
+    "fitted_streets": "fitted_streets_geojson",
+    "home_pose": "home_pose_geojson",
+    "obstacles": "obstacles_geojson",
+    "high_obstacles": "high_obstacles_geojson",
+    "transit_streets": "transit_streets_geojson",
+    "fitted_transit_streets": "fitted_transit_streets_geojson",
+}
+
+def pose_array(values, nested=False):
+    """
+    Poses of a column holding a pose list [x, y, theta] per row (or, nested,
+    a list of them) and NaN elsewhere, as arrays: (rows holding poses,
+    (n, 3) poses, poses per row).
+    """
+    values = np.asarray(values, dtype=object)
+    rows = np.flatnonzero([isinstance(value, list) for value in values])
+    selected = values[rows].tolist()
+    if nested:
+        counts = np.fromiter(map(len, selected), dtype=np.int64, count=len(selected))
+        selected = [pose for poses in selected for pose in poses]
+    else:
+        counts = np.ones(len(rows), dtype=np.int64)
+    poses = np.array(selected, dtype=np.float64).reshape(-1, 3)
+    return rows, poses, counts
+
+def format_poses(poses, counts, nested=False, size=None, rows=None):
+    """
+    Text of pose lists as global_plan.csv stores them ("[x, y, theta]" or,
+    nested, "[[x, y, theta], ...]"), built column-wise. With size and rows
+    returns a column of that length with None outside rows.
+    """
+    text = np.array(list(map(repr, poses.ravel().tolist())), dtype=object).reshape(-1, 3)
+    text = "[" + text[:, 0] + ", " + text[:, 1] + ", " + text[:, 2] + "]"
+    if nested:
+        starts = np.cumsum(counts) - counts
+        separators = np.full(len(text), ", ", dtype=object)
+        separators[starts[counts > 0]] = ""
+        grouped = np.full(len(counts), "", dtype=object)
+        if len(text):
+            grouped[counts > 0] = np.add.reduceat(separators + text, starts[counts > 0])
+        text = "[" + grouped + "]"
+    if size is None:
+        return text
+    column = np.full(size, None, dtype=object)
+    column[rows] = text
+    return column
+
+def _csv_value(value):
+    """A cell as global_plan.csv has it: geometries as WKT, lists as text, missing values blank"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, np.generic):
+        return _csv_value(value.item())
+    return str(value)
+
+def plan_records(all_together):
+    """Rows of the global plan for the global_plan_data artifact, built from memory instead of re-reading the CSV"""
+    columns = {}
+    for name in all_together.columns:
+        values = all_together[name]
+        if values.dtype.kind in 'biuf':
+            columns[name] = values.astype(object).where(values.notna(), "")
+        else:
+            columns[name] = values.map(_csv_value)
+    return pd.DataFrame(columns, index=all_together.index).to_dict(orient='records')
+
+def publish_latest(output_dir):
+    """
+    Copies a finished plan to the top of GENERATED_DIR, which is the default
+    plan for path queries and file transfers. Each file is replaced
+    atomically; the CSV goes first, then the typed table, so the snapshot
+    ends up the newest.
+    Files the plan does not have (map.png or the map tiles, depending on the
+    map kind) are removed so they do not linger from an earlier plan.
+    Jobs finishing at the same time (in different worker processes) publish
+    one after the other, so the files always come from the same plan.
+    """
+    with FileLock(PUBLISH_LOCK):
+        _publish_files(output_dir)
+
+def _publish_files(output_dir):
+    for name in OUTPUT_FILES:
+        target = os.path.join(GENERATED_DIR, name)
+        if not os.path.exists(os.path.join(output_dir, name)):
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        tmp_path = target + '.tmp-' + uuid.uuid4().hex[:8]
+        try:
+            shutil.copyfile(os.path.join(output_dir, name), tmp_path)
+            os.replace(tmp_path, target)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    tiles_dir = os.path.join(output_dir, occupancy_map.MAP_TILES_DIR)
+    target_tiles_dir = os.path.join(GENERATED_DIR, occupancy_map.MAP_TILES_DIR)
+    if os.path.isdir(tiles_dir):
+        tmp_dir = target_tiles_dir + '.tmp-' + uuid.uuid4().hex[:8]
+        try:
+            shutil.copytree(tiles_dir, tmp_dir)
+            path_finding._replace_dir(tmp_dir, target_tiles_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+    else:
+        shutil.rmtree(target_tiles_dir, ignore_errors=True)
+    snapshot_dir = path_finding.snapshot_dir_for(os.path.join(output_dir, 'global_plan.csv'))
+    if os.path.exists(snapshot_dir):
+        path_finding.copy_snapshot(snapshot_dir, path_finding.snapshot_dir_for(os.path.join(GENERATED_DIR, 'global_plan.csv')))
+
+def download_links(plan_id=None):
+    """Links to the downloadable files the plan has"""
+    output_dir = os.path.join(PLANS_DIR, plan_id) if plan_id else GENERATED_DIR
+    download_base = DOWNLOAD_PREFIX + "/plans/" + plan_id if plan_id else DOWNLOAD_PREFIX
+    return {
+        key: download_base + "/" + name
+        for key, name in DOWNLOAD_FILES.items()
+        if os.path.exists(os.path.join(output_dir, name))
+    }
+
+def load_inputs(holes_path, geofence_path, streets_path, home_pose_path, transit_streets_path, obstacles_path, high_obstacles_path, wgs84, meshes=None):
+    """Reads the uploaded layers concurrently, reprojected to the holes CRS (UTM); meshes filters the holes"""
+    layers = input_layers.load_layers({
+        'holes': holes_path, 'geofence': geofence_path, 'streets': streets_path, 'home_pose': home_pose_path,
+        'transit_streets': transit_streets_path, 'obstacles': obstacles_path, 'high_obstacles': high_obstacles_path
+    }, wgs84, meshes)
+
+    home_pose_df = layers['home_pose']
+    home_pose_df['poses'] = [ [[home_pose_df.geometry[0].coords[0][0], home_pose_df.geometry[0].coords[0][1], math.atan2(home_pose_df.geometry[0].coords[1][1]-home_pose_df.geometry[0].coords[0][1],home_pose_df.geometry[0].coords[1][0]-home_pose_df.geometry[0].coords[0][0])]] ]
+
+    return (
+        layers['holes'], layers['geofence'], home_pose_df, layers['streets'],
+        layers['transit_streets'], layers['obstacles'], layers['high_obstacles']
+    )
+
+def run_load_stage(stages, holes_path, geofence_path, streets_path, home_pose_path, transit_streets_path, obstacles_path, high_obstacles_path, wgs84, meshes=None):
+    """Registers the uploaded files as stage inputs and runs the (cached) load stage"""
+    input_paths = {
+        'holes': holes_path, 'geofence': geofence_path, 'streets': streets_path, 'home_pose': home_pose_path,
+        'transit_streets': transit_streets_path, 'obstacles': obstacles_path, 'high_obstacles': high_obstacles_path
+    }
+    for role, path in input_paths.items():
+        stages.input(role, input_key(role, path, wgs84))
+    return stages.run(
+        'load',
+        lambda: load_inputs(holes_path, geofence_path, streets_path, home_pose_path, transit_streets_path, obstacles_path, high_obstacles_path, wgs84, meshes),
+        deps=list(input_paths),
+        params={'meshes': meshes} if meshes is not None else None
+    )
 
 def run_route_generation(
     progress_queue,
     holes_path, geofence_path, streets_path, home_pose_path,
     transit_streets_path, obstacles_path, high_obstacles_path,
     wgs84, use_transit_streets, use_obstacles, use_high_obstacles,
-    fit_streets, fit_twice
+    fit_streets, fit_twice, tiled_map=False, plan_id=None, cache_key=None, meshes=None, cancel_token=None
 ):
+    """
+    Runs one generation job, writing its artifacts to generated/plans/<plan_id>/
+    (or straight to GENERATED_DIR without a plan ID). Progress, the result and
+    errors are reported through progress_queue. cancel_token (optional) stops
+    the job on cancellation or deadline. With a cache_key the finished run is
+    also stored in the result cache. tiled_map writes the occupancy map as
+    tiles and a pyramid instead of a single map.png. meshes (a list of mesh
+    names) keeps only the holes of those meshes. Returns True on success.
+    """
+    output_dir = os.path.join(PLANS_DIR, plan_id) if plan_id else GENERATED_DIR
+    if cancel_token:
+        cancel_token.start()
     try:
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Every stage is cached by the hash of the inputs and parameters it depends on
+        stages = StageRunner(stage_cache, report=progress_queue.put)
+
         # Load Data
-        holes_df = utils.readHolFile(holes_path, wgs84)
-        
-        geofence_df = gpd.read_file(geofence_path).to_crs(holes_df.crs)
-        geofence_df['type'] = 'geofence'
-        
-        home_pose_df = gpd.read_file(home_pose_path).to_crs(holes_df.crs)
-        home_pose_df['poses'] = [ [[home_pose_df.geometry[0].coords[0][0], home_pose_df.geometry[0].coords[0][1], math.atan2(home_pose_df.geometry[0].coords[1][1]-home_pose_df.geometry[0].coords[0][1],home_pose_df.geometry[0].coords[1][0]-home_pose_df.geometry[0].coords[0][0])]] ]
-        home_pose_df['type'] = 'home_pose'
-        
-        streets_df = gpd.read_file(streets_path).to_crs(holes_df.crs)
-        streets_df['type'] = 'streets'
-        
-        transit_streets_df = None
-        if transit_streets_path:
-            transit_streets_df = gpd.read_file(transit_streets_path).to_crs(holes_df.crs)
-            transit_streets_df['type'] = 'transit_streets'
-            
-        obstacles_df = None
-        if obstacles_path:
-            obstacles_df = gpd.read_file(obstacles_path).to_crs(holes_df.crs)
-            obstacles_df['type'] = 'obstacles'
-            
-        high_obstacles_df = None
-        if high_obstacles_path:
-            high_obstacles_df = gpd.read_file(high_obstacles_path).to_crs(holes_df.crs)
-            high_obstacles_df['type'] = 'high_obstacles'
+        holes_df, geofence_df, home_pose_df, streets_df, transit_streets_df, obstacles_df, high_obstacles_df = run_load_stage(
+            stages, holes_path, geofence_path, streets_path, home_pose_path,
+            transit_streets_path, obstacles_path, high_obstacles_path, wgs84, meshes
+        )
 
+        # Loops report progress per item; only forward changes in the rounded
+        # value, each put is an IPC round-trip to the manager queue
+        last_progress = [None]
         def progress_callback(value):
-            progress_queue.put({"type": "progress", "value": value})
+            rounded = round(value, 1)
+            if rounded != last_progress[0]:
+                last_progress[0] = rounded
+                progress_queue.put({"type": "progress", "value": value})
 
         # Execute Logic
         results = route_gen_logic.generate_routes_logic(
@@ -71,119 +255,146 @@ def run_route_generation(
             use_transit_streets=use_transit_streets,
             fit_streets_enabled=fit_streets,
             fit_twice=fit_twice,
-            progress_callback=progress_callback
+            progress_callback=progress_callback,
+            cancel_token=cancel_token,
+            stages=stages
         )
         
         # Generate Outputs
-        all_together = results['all_together']
+        artifacts_start = time.time()
         all_together = results['all_together']
         holes_filtered = results['holes_filtered']
         graph_dataframe = results['graph_dataframe']
         
-        # Plotting
-        matplotlib.use('agg')
-        bounding_box = all_together.unary_union.bounds
-        fig = plt.figure(figsize=(10, 10), dpi=300)
-        ax = plt.Axes(fig, [0., 0., 1., 1.])
-        ax.set_axis_off()
-        fig.add_axes(ax)
-        
-        holes_filtered.buffer(0.2).plot(ax=ax, color='k')
-        geofence_df.boundary.plot(ax=ax, color='k')
+        # Occupancy map frame: square around the plan, origin at its lower-left corner
+        min_x, min_y, map_size = occupancy_map.map_frame(all_together.total_bounds.tolist())
         progress_queue.put({"type": "progress", "value": 96})
         
-        margin = 30.0
-        min_x = bounding_box[0]-margin
-        min_y = bounding_box[1]-margin
-        max_x = bounding_box[2]+margin
-        max_y = bounding_box[3]+margin
-        range_x = max_x-min_x
-        range_y = max_y-min_y
-        if(range_x > range_y):
-            range_y = range_x
-            max_y = min_y+range_y
-        if (range_y > range_x):
-            range_x = range_y
-            max_x = min_x+range_x
-
-        ax.set_xlim(min_x, max_x)
-        ax.set_ylim(min_y, max_y)
-        
-        dpi = max(range_x, range_y)/(10.0*0.15)
-        
-        csv_filename = os.path.join(GENERATED_DIR, 'global_plan.csv')
-        map_png_filename = os.path.join(GENERATED_DIR, 'map.png')
-        map_yaml_filename = os.path.join(GENERATED_DIR, 'maze_peld.yaml')
-        latlon_filename = os.path.join(GENERATED_DIR, 'latlon.yaml')
-        
-        # Save CSV
-        all_together.to_csv(csv_filename)
+        csv_filename = os.path.join(output_dir, 'global_plan.csv')
+        map_yaml_filename = os.path.join(output_dir, 'maze_peld.yaml')
+        latlon_filename = os.path.join(output_dir, 'latlon.yaml')
         
         all_together['local_geometry'] = all_together['geometry'].affine_transform([1.0, 0.0, 0.0, 1.0, -min_x, -min_y])
         all_together['local_buffered_street'] = all_together['buffered_street'].affine_transform([1.0, 0.0, 0.0, 1.0, -min_x, -min_y])
-        all_together['graph_pose_local'] = all_together.apply(lambda row:  [row['graph_pose'][0]-min_x, row['graph_pose'][1]- min_y, row['graph_pose'][2]] if isinstance(row['graph_pose'], list) else None, axis=1)
-        all_together['local_poses']= all_together.apply(lambda row: [ [e[0]- min_x, e[1]-min_y, e[2]] for e in row['poses']] if isinstance(row['poses'], list) else None  , axis=1)
-        
-        all_together.to_csv(csv_filename)
-        progress_queue.put({"type": "progress", "value": 97})
-        
-        plt.savefig(map_png_filename, dpi=dpi)
-        plt.close(fig)
-        progress_queue.put({"type": "progress", "value": 98})
-        
-        with open(map_yaml_filename, 'w') as file:
-            file.write("image: map.png\n")
-            file.write("resolution: 0.15\n")
-            file.write("origin: [0.0, 0.0, 0.0]\n")
-            file.write("negate: 0\n")
-            file.write("occupied_thresh: 0.65\n")
-            file.write("free_thresh: 0.196\n")
-
-        with open(latlon_filename, 'w') as file:
-            file.write("/GPS/latlontoutm:\n")
-            file.write("  utm_x_map_zero:                           {}   # REAL\n".format(bounding_box[0]-margin) )
-            file.write("  utm_y_map_zero:                           {}   # REAL\n".format(bounding_box[1]-margin) )
-
-        with open(map_png_filename, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            
-        # Generate Arrow GeoJSON
-        arrow_geojson = utils.generate_arrow_geojson(graph_dataframe, holes_df.crs)
-        progress_queue.put({"type": "progress", "value": 99})
+        # Poses shifted to the map frame as arrays, stored as the text the CSV holds
+        # (the arrays are also what the typed global plan table stores)
+        origin = np.array([min_x, min_y, 0.0])
+        pose_columns = {}
+        for column, local_column, nested in (('graph_pose', 'graph_pose_local', False), ('poses', 'local_poses', True)):
+            rows, poses, counts = pose_array(all_together[column], nested=nested)
+            all_together[local_column] = format_poses(poses - origin, counts, nested=nested, size=len(all_together), rows=rows)
+            pose_columns[column] = (rows, poses, counts, nested)
+            pose_columns[local_column] = (rows, poses - origin, counts, nested)
+
+        # Pose arrows layer
+        arrows = utils.generate_arrow_geodataframe(graph_dataframe, holes_df.crs, target_crs=None)
         
         # Extract fitted streets and transit streets
         streets_fitted = results.get('streets_fitted')
         transit_streets_fitted = results.get('transit_streets_fitted')
+
+        # Map layers, reprojected to EPSG:4326 together (one transform per source CRS)
+        layers = reprojection.reproject_layers({
+            "arrows": arrows,
+            "holes": holes_df,
+            "geofence": geofence_df,
+            "streets": streets_df.drop(columns=['buffered_street'], errors='ignore') if streets_df is not None else None,
+            "fitted_streets": streets_fitted.drop(columns=['buffered_street'], errors='ignore') if streets_fitted is not None else None,
+            "home_pose": home_pose_df,
+            "obstacles": obstacles_df,
+            "high_obstacles": high_obstacles_df,
+            "transit_streets": transit_streets_df,
+            "fitted_transit_streets": transit_streets_fitted,
+        })
+        progress_queue.put({"type": "progress", "value": 97})
+
+        # One artifact per layer, fetched by clients on demand instead of inlined in the result message.
+        # Every output is written once, from memory, on a small thread pool.
+        artifacts = ArtifactWriter(output_dir)
+
+        def write_plan():
+            all_together.to_csv(csv_filename)
+            # Typed columnar copy, written after the CSV so readers see it as up to date
+            try:
+                plan_table.write_plan_table(all_together, plan_table.plan_table_path_for(csv_filename), pose_columns)
+            except Exception as e:
+                print(f"Error writing global plan table: {e}")
+            # Binary graph snapshot next to the CSV, memory-mapped by the path finding workers
+            try:
+                snapshot_graph = path_finding.GraphManager()
+                if snapshot_graph.load_graph_from_dataframe(all_together):
+                    snapshot_graph.save_snapshot(path_finding.snapshot_dir_for(csv_filename))
+            except Exception as e:
+                print(f"Error writing graph snapshot: {e}")
+
+        def write_map():
+            if tiled_map:
+                map_tiles = occupancy_map.write_tiled_map(holes_filtered, geofence_df, min_x, min_y, map_size, output_dir, MAP_TILE_SIZE, MAP_TILE_WORKERS)
+                # The coarsest pyramid level stands in for the map image; the tiles are fetched from the download links
+                overview = occupancy_map.overview_path(output_dir, map_tiles)
+                if overview:
+                    artifacts.add_file("map_image", os.path.relpath(overview, output_dir), "image/png")
+                artifacts.add_json("map_tiles_index", dict(map_tiles, tiles=occupancy_map.MAP_TILES_DIR + "/{level}/{col}_{row}.png"), "map_tiles.json")
+                return
+            grid = occupancy_map.rasterize_occupancy(holes_filtered, geofence_df, min_x, min_y, map_size)
+            artifacts.add_bytes("map_image", occupancy_map.encode_png(grid), "map.png", "image/png", compress=False, directory='')
+            with open(map_yaml_filename, 'w') as file:
+                file.write("image: map.png\n")
+                file.write("resolution: {}\n".format(occupancy_map.MAP_RESOLUTION))
+                file.write("origin: [0.0, 0.0, 0.0]\n")
+                file.write("negate: 0\n")
+                file.write("occupied_thresh: 0.65\n")
+                file.write("free_thresh: 0.196\n")
+
+        def write_plan_data():
+            artifacts.add_json("global_plan_data", plan_records(all_together), "global_plan_data.json")
+
+        def write_latlon():
+            with open(latlon_filename, 'w') as file:
+                file.write("/GPS/latlontoutm:\n")
+                file.write("  utm_x_map_zero:                           {}   # REAL\n".format(min_x) )
+                file.write("  utm_y_map_zero:                           {}   # REAL\n".format(min_y) )
+
+        with ThreadPoolExecutor(max_workers=ARTIFACT_WORKERS) as executor:
+            jobs = [executor.submit(write_plan), executor.submit(write_map), executor.submit(write_latlon)]
+            jobs += [executor.submit(artifacts.add_layer, LAYER_ARTIFACTS[name], gdf, name) for name, gdf in layers.items()]
+            jobs.append(executor.submit(write_plan_data))
+            for job in jobs:
+                job.result()
+        manifest = artifacts.write_manifest()
+        progress_queue.put({"type": "progress", "value": 99})
             
+        if cancel_token:
+            cancel_token.check()
+        if plan_id:
+            publish_latest(output_dir)
+        stages.record('artifacts', artifacts_start)
         progress_queue.put({"type": "progress", "value": 100})
-        
-        progress_queue.put({
-            "type": "result",
-            "data": {
-                "status": "success",
-                "map_image": f"data:image/png;base64,{encoded_string}",
-                "arrow_geojson": arrow_geojson,
-                "holes_geojson": holes_df.to_crs('EPSG:4326').to_json() if holes_df is not None else None,
-                "geofence_geojson": geofence_df.to_crs('EPSG:4326').to_json() if geofence_df is not None else None,
-                "streets_geojson": streets_df.drop(columns=['buffered_street'], errors='ignore').to_crs('EPSG:4326').to_json() if streets_df is not None else None,
-                "fitted_streets_geojson": streets_fitted.drop(columns=['buffered_street'], errors='ignore').to_crs('EPSG:4326').to_json() if streets_fitted is not None else None,
-                "home_pose_geojson": home_pose_df.to_crs('EPSG:4326').to_json() if home_pose_df is not None else None,
-                "obstacles_geojson": obstacles_df.to_crs('EPSG:4326').to_json() if obstacles_df is not None else None,
-                "high_obstacles_geojson": high_obstacles_df.to_crs('EPSG:4326').to_json() if high_obstacles_df is not None else None,
-                "transit_streets_geojson": transit_streets_df.to_crs('EPSG:4326').to_json() if transit_streets_df is not None else None,
-                "fitted_transit_streets_geojson": transit_streets_fitted.to_crs('EPSG:4326').to_json() if transit_streets_fitted is not None else None,
-                "fitted_transit_streets_geojson": transit_streets_fitted.to_crs('EPSG:4326').to_json() if transit_streets_fitted is not None else None,
-                "global_plan_data": pd.read_csv(csv_filename).fillna("").to_dict(orient='records'),
-                "download_links": {
-                    "csv": "/api/v1/generate-routes/download/global_plan.csv",
-                    "map_png": "/api/v1/generate-routes/download/map.png",
-                    "map_yaml": "/api/v1/generate-routes/download/maze_peld.yaml",
-                    "latlon_yaml": "/api/v1/generate-routes/download/latlon.yaml"
-                }
-            }
-        })
+
+        result_data = {
+            "status": "success",
+            "plan_id": plan_id,
+            "manifest": public_manifest(plan_id, manifest) if plan_id else None,
+            "download_links": download_links(plan_id)
+        }
+        if cache_key:
+            from ..result_cache import result_cache
+            result_cache.store(cache_key, output_dir, result_data)
+        progress_queue.put({"type": "result", "data": result_data})
+        return True
+
+    except JobCancelled as e:
+        print(f"Route generation {plan_id} stopped: {e}")
+        if plan_id:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        progress_queue.put({"type": "error", "message": str(e), "cancelled": True})
+        return False
 
     except Exception as e:
         import traceback
         traceback.print_exc()
+        # A failed plan is never published: drop its partial output
+        if plan_id:
+            shutil.rmtree(output_dir, ignore_errors=True)
         progress_queue.put({"type": "error", "message": str(e)})
+        return False
@@ -1,17 +1,49 @@
 import os
+import asyncio
 import shutil
 import tempfile
 import json
 import queue
-import threading
+import time
+import uuid
 from typing import Optional
 from fastapi import APIRouter, File, UploadFile, Form
 from fastapi.responses import StreamingResponse, JSONResponse
-from .algorithm.route_generation import run_route_generation
-from config import GENERATED_DIR
+from config import PLANS_DIR, SWEEP_MAX_VARIANTS
+from .algorithm.route_generation import run_route_generation, publish_latest, download_links
+from .algorithm.parameter_sweep import expand_grid, run_sweep_prepare, run_sweep_variant
+from .job_scheduler import job_scheduler, QueueFullError
+from .result_cache import result_cache, cache_key
 
 generate_routes_bp = APIRouter()
 
+def save_uploads(temp_dir, *uploads):
+    """Saves each uploaded file (or None) into temp_dir and returns the paths"""
+    paths = []
+    for upload in uploads:
+        if not upload:
+            paths.append(None)
+            continue
+        path = os.path.join(temp_dir, os.path.basename(upload.filename))
+        with open(path, "wb") as f:
+            shutil.copyfileobj(upload.file, f)
+        paths.append(path)
+    return paths
+
+def load_plan_graph(plan_id):
+    # Auto-load graph after success
+    print("Auto-loading Global Plan Graph...")
+    try:
+        from modules.poses_geometry import path_finding
+        path_finding.graph_registry.get(plan_id)
+    except Exception as e:
+        print(f"Error auto-loading graph: {e}")
+
+def replay_cached(plan_id, data):
+    load_plan_graph(plan_id)
+    yield json.dumps({"type": "progress", "value": 100}) + "\n"
+    yield json.dumps({"type": "result", "data": data}) + "\n"
+
 @generate_routes_bp.post("/api/v1/generate-routes")
 async def generate_routes(
     holes: UploadFile = File(...),
@@ -26,94 +58,216 @@ async def generate_routes(
     wgs84: bool = Form(True),
     use_obstacles: bool = Form(False),
     use_high_obstacles: bool = Form(False),
-    use_transit_streets: bool = Form(False)
+    use_transit_streets: bool = Form(False),
+    tiled_map: bool = Form(False),
+    meshes: Optional[str] = Form(None)
 ):
+    # Only the holes of these meshes (comma separated), all of them when omitted
+    mesh_list = sorted({mesh.strip() for mesh in meshes.split(',') if mesh.strip()}) if meshes else None
+
     # Create a temporary directory for processing
     temp_dir = tempfile.mkdtemp()
     
     try:
         # Save uploaded files
-        holes_path = os.path.join(temp_dir, os.path.basename(holes.filename))
-        with open(holes_path, "wb") as f:
-            shutil.copyfileobj(holes.file, f)
-        
-        geofence_path = os.path.join(temp_dir, os.path.basename(geofence.filename))
-        with open(geofence_path, "wb") as f:
-            shutil.copyfileobj(geofence.file, f)
-            
-        streets_path = os.path.join(temp_dir, os.path.basename(streets.filename))
-        with open(streets_path, "wb") as f:
-            shutil.copyfileobj(streets.file, f)
-            
-        home_pose_path = os.path.join(temp_dir, os.path.basename(home_pose.filename))
-        with open(home_pose_path, "wb") as f:
-            shutil.copyfileobj(home_pose.file, f)
-
-        transit_streets_path = None
-        if transit_streets:
-            transit_streets_path = os.path.join(temp_dir, os.path.basename(transit_streets.filename))
-            with open(transit_streets_path, "wb") as f:
-                shutil.copyfileobj(transit_streets.file, f)
+        holes_path, geofence_path, streets_path, home_pose_path, transit_streets_path, obstacles_path, high_obstacles_path = save_uploads(
+            temp_dir, holes, geofence, streets, home_pose, transit_streets,
+            obstacles if use_obstacles else None, high_obstacles if use_high_obstacles else None
+        )
+        if transit_streets_path:
             use_transit_streets = True
-            
-        obstacles_path = None
-        if obstacles and use_obstacles:
-            obstacles_path = os.path.join(temp_dir, os.path.basename(obstacles.filename))
-            with open(obstacles_path, "wb") as f:
-                shutil.copyfileobj(obstacles.file, f)
-            
-        high_obstacles_path = None
-        if high_obstacles and use_high_obstacles:
-            high_obstacles_path = os.path.join(temp_dir, os.path.basename(high_obstacles.filename))
-            with open(high_obstacles_path, "wb") as f:
-                shutil.copyfileobj(high_obstacles.file, f)
-
-        progress_queue = queue.Queue()
-        
-        thread = threading.Thread(
-            target=run_route_generation,
-            args=(
+
+        # Time-sortable ID under which this plan stays queryable after newer generations.
+        # It also names the job's output directory (generated/plans/<plan_id>/)
+        plan_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+        # Same files and parameters as an earlier run: replay its result without queuing a job
+        key = None
+        if result_cache.enabled():
+            key = cache_key(
+                {
+                    "holes": holes_path, "geofence": geofence_path, "streets": streets_path, "home_pose": home_pose_path,
+                    "transit_streets": transit_streets_path, "obstacles": obstacles_path, "high_obstacles": high_obstacles_path
+                },
+                {
+                    "wgs84": wgs84, "use_transit_streets": use_transit_streets, "use_obstacles": obstacles_path is not None,
+                    "use_high_obstacles": high_obstacles_path is not None, "fit_streets": fit_streets, "fit_twice": fit_twice,
+                    "tiled_map": tiled_map, "meshes": mesh_list
+                }
+            )
+            output_dir = os.path.join(PLANS_DIR, plan_id)
+            cached = await asyncio.to_thread(result_cache.restore, key, output_dir, plan_id)
+            if cached is not None:
+                shutil.rmtree(temp_dir)
+                print(f"Result cache hit {key[:12]}, replaying as plan {plan_id}")
+                await asyncio.to_thread(publish_latest, output_dir)
+                cached.update({"plan_id": plan_id, "cached": True, "download_links": download_links(plan_id)})
+                return StreamingResponse(replay_cached(plan_id, cached), media_type="application/x-ndjson")
+
+        progress_queue = job_scheduler.new_progress_queue()
+
+        try:
+            job = job_scheduler.submit(
+                plan_id,
+                run_route_generation,
+                (
+                    holes_path, geofence_path, streets_path, home_pose_path,
+                    transit_streets_path, obstacles_path, high_obstacles_path,
+                    wgs84, use_transit_streets, use_obstacles, use_high_obstacles,
+                    fit_streets, fit_twice, tiled_map, plan_id, key, mesh_list
+                ),
                 progress_queue,
-                holes_path, geofence_path, streets_path, home_pose_path,
-                transit_streets_path, obstacles_path, high_obstacles_path,
-                wgs84, use_transit_streets, use_obstacles, use_high_obstacles,
-                fit_streets, fit_twice
+                temp_dir,
+                output_dir=os.path.join(PLANS_DIR, plan_id)
             )
+        except QueueFullError as e:
+            shutil.rmtree(temp_dir)
+            return JSONResponse(content={"status": "error", "message": str(e)}, status_code=503)
+
+        async def event_generator():
+            last_position = None
+            finished = False
+            try:
+                while True:
+                    # Report the queue position while the job waits for a worker
+                    position = job_scheduler.position(job)
+                    if position != last_position and position > 0:
+                        yield json.dumps({"type": "queued", "position": position, "plan_id": plan_id}) + "\n"
+                    last_position = position
+
+                    try:
+                        # Wait for an item in the queue (off the event loop)
+                        item = await asyncio.to_thread(progress_queue.get, True, 1)
+                        yield json.dumps(item) + "\n"
+
+                        if item["type"] == "result":
+                            finished = True
+                            load_plan_graph(plan_id)
+                            break
+                        elif item["type"] == "error":
+                            finished = True
+                            break
+                    except queue.Empty:
+                        if job.done() and progress_queue.empty():
+                            finished = True
+                            break
+                        continue
+            finally:
+                # Client went away before the end: stop the job instead of
+                # letting it hold a worker. The scheduler removes temp_dir
+                if not finished and not job.done():
+                    print(f"Client disconnected, cancelling generation {plan_id}")
+                    job_scheduler.cancel(plan_id)
+
+        return StreamingResponse(event_generator(), media_type="application/x-ndjson")
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        shutil.rmtree(temp_dir)
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+
+
+@generate_routes_bp.post("/api/v1/generate-routes/{plan_id}/cancel")
+async def cancel_generation(plan_id: str):
+    if not job_scheduler.cancel(plan_id):
+        return JSONResponse(content={"status": "error", "message": f"No queued or running generation '{plan_id}'"}, status_code=404)
+    return {"status": "success", "plan_id": plan_id}
+
+
+@generate_routes_bp.post("/api/v1/generate-routes/sweep")
+async def sweep_parameters(
+    holes: UploadFile = File(...),
+    geofence: UploadFile = File(...),
+    streets: UploadFile = File(...),
+    home_pose: UploadFile = File(...),
+    obstacles: Optional[UploadFile] = File(None),
+    high_obstacles: Optional[UploadFile] = File(None),
+    transit_streets: Optional[UploadFile] = File(None),
+    grid: str = Form(...),
+    fit_streets: bool = Form(True),
+    fit_twice: bool = Form(True),
+    wgs84: bool = Form(True),
+    use_obstacles: bool = Form(False),
+    use_high_obstacles: bool = Form(False),
+    use_transit_streets: bool = Form(False)
+):
+    """
+    Builds the graph for every combination in `grid` (JSON, parameter -> list
+    of values) and streams a summary per variant. Loading and street fitting
+    run once; the variants then run in parallel on the generation workers.
+    """
+    try:
+        variants = expand_grid(json.loads(grid), SWEEP_MAX_VARIANTS)
+    except ValueError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        paths = save_uploads(
+            temp_dir, holes, geofence, streets, home_pose, transit_streets,
+            obstacles if use_obstacles else None, high_obstacles if use_high_obstacles else None
         )
-        thread.start()
+        if paths[4]:
+            use_transit_streets = True
 
-        def event_generator():
-            while True:
-                try:
-                    # Wait for an item in the queue
-                    item = progress_queue.get(timeout=1)
-                    yield json.dumps(item) + "\n"
-                    
-                    if item["type"] == "result":
-                        # Auto-load graph after success
-                        csv_path = os.path.join(GENERATED_DIR, 'global_plan.csv')
-                        if os.path.exists(csv_path):
-                            print("Auto-loading Global Plan Graph...")
-                            try:
-                                import path_finding
-                                path_finding.graph_manager.load_graph_from_csv(csv_path)
-                            except Exception as e:
-                                print(f"Error auto-loading graph: {e}")
-                        break
-                    elif item["type"] == "error":
-                        break
-                except queue.Empty:
-                    if not thread.is_alive():
-                        break
-                    continue
-            
-            # Clean up temp dir after processing
+        sweep_id = "sweep-" + time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        progress_queue = job_scheduler.new_progress_queue()
+        try:
+            prepare_job = job_scheduler.submit(
+                sweep_id,
+                run_sweep_prepare,
+                (*paths, wgs84, fit_streets, fit_twice),
+                progress_queue
+            )
+        except QueueFullError as e:
             shutil.rmtree(temp_dir)
+            return JSONResponse(content={"status": "error", "message": str(e)}, status_code=503)
+
+        async def event_generator():
+            jobs = [prepare_job]
+            results = {}
+            try:
+                yield json.dumps({"type": "sweep", "sweep_id": sweep_id, "variants": len(variants)}) + "\n"
+                while len(results) < len(variants):
+                    try:
+                        item = await asyncio.to_thread(progress_queue.get, True, 1)
+                    except queue.Empty:
+                        if all(job.done() for job in jobs) and progress_queue.empty():
+                            break
+                        continue
+
+                    if item["type"] == "prepared":
+                        # Shared stages are cached: fan the variants out
+                        for index, params in enumerate(variants):
+                            jobs.append(job_scheduler.submit(
+                                f"{sweep_id}-{index}",
+                                run_sweep_variant,
+                                (*paths, wgs84, use_transit_streets, use_obstacles, use_high_obstacles, fit_streets, fit_twice, index, params),
+                                progress_queue,
+                                admitted=True
+                            ))
+                        continue
+                    yield json.dumps(item) + "\n"
+                    if item["type"] == "error":
+                        return
+                    if item["type"] == "variant":
+                        results[item["index"]] = item
+
+                yield json.dumps({
+                    "type": "result",
+                    "data": {"status": "success", "sweep_id": sweep_id, "variants": [results[i] for i in sorted(results)]}
+                }) + "\n"
+            finally:
+                for job in jobs:
+                    if not job.done():
+                        job_scheduler.cancel(job.job_id)
+                shutil.rmtree(temp_dir, ignore_errors=True)
 
         return StreamingResponse(event_generator(), media_type="application/x-ndjson")
 
     except Exception as e:
         import traceback
         traceback.print_exc()
-        shutil.rmtree(temp_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
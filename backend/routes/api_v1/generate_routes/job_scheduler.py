@@ -0,0 +1,178 @@
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import GENERATION_WORKERS, GENERATION_MAX_QUEUE, GENERATION_TIMEOUT_SECONDS
+from modules.poses_geometry.cancellation import CancellationToken
+
+class QueueFullError(Exception):
+    pass
+
+class GenerationJob:
+    def __init__(self, job_id, fn, args, progress_queue, temp_dir, cancel_token=None, output_dir=None):
+        self.job_id = job_id
+        self.fn = fn
+        self.args = args
+        self.progress_queue = progress_queue
+        self.temp_dir = temp_dir
+        self.output_dir = output_dir  # Removed if the worker dies before finishing
+        self.cancel_token = cancel_token
+        self.state = 'queued'  # queued -> running -> done
+        self.future = None
+        self.executor = None  # Pool the job was submitted to
+
+    def done(self):
+        return self.state == 'done'
+
+class JobScheduler:
+    """
+    Runs route generation jobs on a pool of worker processes (the work is
+    GIL-bound shapely/pandas). At most `workers` jobs run at once; up to
+    `max_queue` more wait in FIFO order and anything beyond is rejected.
+    Jobs report progress through a multiprocessing manager queue and get a
+    CancellationToken (manager Event plus `timeout_seconds` deadline).
+    A worker process that dies (OOM kill, crash in native code) breaks the
+    pool for good, so the pool is replaced and the jobs it held are failed.
+    """
+    def __init__(self, workers=GENERATION_WORKERS, max_queue=GENERATION_MAX_QUEUE, timeout_seconds=GENERATION_TIMEOUT_SECONDS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self._context = multiprocessing.get_context('spawn')
+        self._executor = None
+        self._manager = None
+        self._pending = []
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # Created lazily so importing the app does not spawn processes
+        if self._manager is None or not self._manager._process.is_alive():
+            self._manager = self._context.Manager()
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._context)
+
+    def _restart_executor(self, broken):
+        # Called with the lock held; only the first job to see a broken pool replaces it
+        if self._executor is not broken:
+            return
+        print("Generation worker pool broken, starting a new one")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._start()
+
+    def new_progress_queue(self):
+        with self._lock:
+            self._start()
+            return self._manager.Queue()
+
+    def submit(self, job_id, fn, args, progress_queue, temp_dir=None, admitted=False, output_dir=None):
+        """
+        Queues fn(progress_queue, *args, cancel_token=...); raises QueueFullError
+        when the queue is full. admitted=True skips that check, for follow-up jobs
+        of a request that was already accepted (the variants of a sweep).
+        output_dir is the job's plan directory, removed if the job fails.
+        """
+        with self._lock:
+            self._start()
+            if not admitted and len(self._pending) >= self.max_queue and len(self._running) >= self.workers:
+                raise QueueFullError(f"Generation queue is full ({self.max_queue} jobs waiting), try again later")
+            cancel_token = CancellationToken(self._manager.Event(), self.timeout_seconds or None)
+            job = GenerationJob(job_id, fn, args, progress_queue, temp_dir, cancel_token, output_dir)
+            self._pending.append(job)
+            self._dispatch()
+            return job
+
+    def position(self, job):
+        """1-based position in the waiting queue, 0 once the job has started"""
+        with self._lock:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def cancel(self, job_id):
+        """
+        Cancels a waiting job right away, or signals a running one to stop at
+        its next check. Returns False if the job is unknown or already done.
+        """
+        with self._lock:
+            job = self._running.get(job_id)
+            if job is not None:
+                job.cancel_token.cancel()
+                return True
+            job = next((job for job in self._pending if job.job_id == job_id), None)
+            if job is None:
+                return False
+            self._pending.remove(job)
+            job.state = 'done'
+        job.progress_queue.put({"type": "error", "message": "Generación cancelada", "cancelled": True})
+        if job.temp_dir:
+            shutil.rmtree(job.temp_dir, ignore_errors=True)
+        return True
+
+    def stats(self):
+        """Pool load for the healthcheck"""
+        with self._lock:
+            return {"workers": self.workers, "running": len(self._running), "queued": len(self._pending), "max_queue": self.max_queue}
+
+    def _dispatch(self):
+        # Called with the lock held
+        while self._pending and len(self._running) < self.workers:
+            job = self._pending.pop(0)
+            job.state = 'running'
+            self._running[job.job_id] = job
+            try:
+                job.future = self._submit(job)
+            except Exception as e:
+                # Not even a new pool takes the job: fail it and free its slot
+                print(f"Error starting generation job {job.job_id}: {e}")
+                self._running.pop(job.job_id, None)
+                self._fail(job, str(e))
+                continue
+            job.future.add_done_callback(lambda future, job=job: self._finished(job))
+
+    def _submit(self, job):
+        # Called with the lock held
+        for attempt in range(2):
+            job.executor = self._executor
+            try:
+                return job.executor.submit(job.fn, job.progress_queue, *job.args, cancel_token=job.cancel_token)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                self._restart_executor(job.executor)
+
+    def _fail(self, job, message):
+        """Ends the job's stream with an error and removes its files"""
+        job.state = 'done'
+        try:
+            job.progress_queue.put({"type": "error", "message": message})
+        except Exception as e:
+            print(f"Could not report the failure of job {job.job_id}: {e}")
+        if job.temp_dir:
+            shutil.rmtree(job.temp_dir, ignore_errors=True)
+        # Partial output of a plan that will never be published
+        if job.output_dir:
+            shutil.rmtree(job.output_dir, ignore_errors=True)
+
+    def _finished(self, job):
+        error = job.future.exception()
+        with self._lock:
+            self._running.pop(job.job_id, None)
+            if isinstance(error, BrokenProcessPool):
+                self._restart_executor(job.executor)
+        if error is not None:
+            # The worker process itself failed (e.g. killed); make sure the stream ends
+            self._fail(job, str(error) or "Generation worker process failed")
+        else:
+            job.state = 'done'
+            if job.temp_dir:
+                shutil.rmtree(job.temp_dir, ignore_errors=True)
+        with self._lock:
+            self._dispatch()
+
+# Singleton instance
+job_scheduler = JobScheduler()
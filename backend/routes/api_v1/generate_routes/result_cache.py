@@ -0,0 +1,133 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+
+from config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB
+from modules.poses_geometry import path_finding
+from routes.api_v1.plan_artifacts.artifact_store import load_manifest, public_manifest
+from . import route_gen_logic
+from .stage_cache import hash_file
+
+# Bump when the generation algorithm changes in a way the constants below do not capture
+RESULT_CACHE_VERSION = 8
+RESULT_FILE = 'result.json'
+
+def cache_key(input_files, params):
+    """
+    Hash of everything a generation result depends on: the uploaded files
+    (role -> path, None when not used), the form parameters and the
+    algorithm constants in route_gen_logic.
+    """
+    digest = hashlib.sha256()
+    header = {
+        'version': RESULT_CACHE_VERSION,
+        'params': params,
+        'constants': route_gen_logic.algorithm_constants(),
+        # The extension selects the reader (.hol, .csv, geojson...)
+        'files': {role: os.path.splitext(path)[1].lower() if path else None for role, path in input_files.items()}
+    }
+    digest.update(json.dumps(header, sort_keys=True).encode('utf-8'))
+    for role in sorted(input_files):
+        path = input_files[role]
+        if not path:
+            continue
+        digest.update(role.encode('utf-8'))
+        hash_file(path, digest)
+    return digest.hexdigest()
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class ResultCache:
+    """
+    Finished generation runs on disk, one directory per cache key with a copy
+    of the plan directory (output files, graph snapshot, artifacts) and the
+    final result message. Entries
+    are evicted least recently used first once `max_bytes` is exceeded.
+    Shared by the API process and the generation workers.
+    """
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def store(self, key, output_dir, result_data):
+        """Copies a finished run into the cache (plan specific fields are dropped)"""
+        if not self.enabled():
+            return
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir + '.tmp-' + uuid.uuid4().hex[:8]
+        try:
+            shutil.copytree(output_dir, tmp_dir)
+            data = {k: v for k, v in result_data.items() if k not in ('plan_id', 'download_links', 'manifest')}
+            with open(os.path.join(tmp_dir, RESULT_FILE), 'w') as f:
+                json.dump(data, f)
+            path_finding._replace_dir(tmp_dir, entry_dir)
+        except Exception as e:
+            print(f"Error storing result cache entry {key}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self._evict()
+
+    def restore(self, key, output_dir, plan_id):
+        """
+        Copies a cached run into output_dir and returns its result data with the
+        manifest for plan_id (download_links are left to the caller), or None on a miss.
+        """
+        if not self.enabled():
+            return None
+        entry_dir = self._entry_dir(key)
+        result_path = os.path.join(entry_dir, RESULT_FILE)
+        if not os.path.exists(result_path):
+            return None
+        try:
+            shutil.copytree(entry_dir, output_dir, ignore=shutil.ignore_patterns(RESULT_FILE))
+            with open(result_path, 'r') as f:
+                data = json.load(f)
+            data["manifest"] = public_manifest(plan_id, load_manifest(output_dir))
+            # Touch for LRU ordering
+            os.utime(entry_dir)
+            return data
+        except Exception as e:
+            # Entry evicted or half written meanwhile: treat as a miss
+            print(f"Error restoring result cache entry {key}: {e}")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            return None
+
+    def _evict(self):
+        with self._lock:
+            if not os.path.isdir(self.cache_dir):
+                return
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if '.' in name or not os.path.isdir(path):
+                    continue
+                entries.append((os.path.getmtime(path), _dir_size(path), path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            # The newest entry is always kept, even if it alone exceeds the budget
+            while total > self.max_bytes and len(entries) > 1:
+                _, size, path = entries.pop(0)
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                print(f"Result cache: evicted {os.path.basename(path)}")
+
+# Singleton instance
+result_cache = ResultCache()
@@ -2,7 +2,8 @@ import pandas as pd
 import geopandas as gpd
 from modules.poses_geometry import utils
 from modules.poses_geometry.utils import GuiTextException
-from .algorithm.fit_streets import fit_all_streets
+from modules.poses_geometry.pose_array import PoseArray
+from .stage_cache import StageRunner
 
 # Global constants (can be overridden or passed as args if needed)
 HOLE_DISTANCE = 2.5 + 1.3
@@ -11,6 +12,100 @@ TURNING_RADIUS = 3.0
 MAX_HOLES_PER_PLAN = 500
 STREET_BUFFER_DISTANCE = 5.0
 
+# Constants a parameter sweep may override per variant
+SWEEP_PARAMETERS = ('HOLE_DISTANCE', 'TURNING_RADIUS', 'OBSTACLE_BUFFER_DISTANCE', 'STREET_BUFFER_DISTANCE')
+
+def algorithm_constants():
+    """Constants above that change the generated plan (part of the result cache key)"""
+    return {
+        'HOLE_DISTANCE': HOLE_DISTANCE,
+        'OBSTACLE_BUFFER_DISTANCE': OBSTACLE_BUFFER_DISTANCE,
+        'TURNING_RADIUS': TURNING_RADIUS,
+        'MAX_HOLES_PER_PLAN': MAX_HOLES_PER_PLAN,
+        'STREET_BUFFER_DISTANCE': STREET_BUFFER_DISTANCE
+    }
+
+def fit_streets_stage(streets, holes, geofence, obstacles, high_obstacles, fit_streets_enabled, fit_twice, progress_callback=None, cancel_token=None):
+    streets_fitted = streets.copy()
+    if fit_streets_enabled:
+        # Imports torch, only needed when fitting
+        from .algorithm.fit_streets import fit_all_streets
+        if progress_callback: progress_callback(1)
+        streets_fitted = fit_all_streets(streets, holes, geofence, obstacles, high_obstacles, fit_twice, progress_callback, cancel_token)
+    return streets_fitted
+
+def run_fit_streets_stage(stages, streets, holes, geofence, obstacles, high_obstacles, fit_streets_enabled, fit_twice, progress_callback=None, cancel_token=None):
+    """Street fitting does not depend on the algorithm constants, so a parameter sweep shares it"""
+    return stages.run(
+        'fit_streets',
+        lambda: fit_streets_stage(streets, holes, geofence, obstacles, high_obstacles, fit_streets_enabled, fit_twice, progress_callback, cancel_token),
+        deps=['streets', 'holes', 'geofence', 'obstacles', 'high_obstacles'],
+        params={'fit_streets': fit_streets_enabled, 'fit_twice': fit_twice}
+    )
+
+def filter_holes_stage(holes, geofence, obstacles, high_obstacles, streets_fitted, use_obstacles, use_high_obstacles, constants):
+    """Holes left after obstacles, blocked area, closest street per hole and street buffers"""
+    streets_fitted = streets_fitted.copy()
+    blocked_now = holes
+    holes_filtered_now = holes.copy()
+    
+    if use_obstacles and obstacles is not None:
+        blocked_now = pd.concat([blocked_now, obstacles])
+        holes_filtered_now = holes_filtered_now[holes_filtered_now.within(geofence.unary_union - obstacles.unary_union)].reset_index(drop=True)
+        
+    if use_high_obstacles and high_obstacles is not None:
+        blocked_now = pd.concat([blocked_now, high_obstacles])
+        holes_filtered_now = holes_filtered_now[holes_filtered_now.within(geofence.unary_union - high_obstacles.unary_union)].reset_index(drop=True)
+
+    blocked = gpd.GeoDataFrame(geometry=gpd.GeoSeries(pd.concat([blocked_now, gpd.GeoDataFrame(geometry=geofence.boundary)]).buffer(constants['OBSTACLE_BUFFER_DISTANCE']))).unary_union
+    holes_filtered = holes_filtered_now
+
+    print("holes after filter")
+    print(holes_filtered)
+
+    if len(holes_filtered) > constants['MAX_HOLES_PER_PLAN']:
+        raise GuiTextException("Demasiados pozos a cargar ("+ str(len(holes_filtered))+"), el número máximo de pozos es " + str(constants['MAX_HOLES_PER_PLAN']))
+
+    # Calculate closest streets
+    closest_streets = []
+        
+    print(f"DEBUG: Finding closest streets. Holes: {len(holes_filtered)}, Streets: {len(streets_fitted)}")
+    if hasattr(holes_filtered, 'crs'): print(f"DEBUG: Holes CRS: {holes_filtered.crs}")
+    if hasattr(streets_fitted, 'crs'): print(f"DEBUG: Streets CRS: {streets_fitted.crs}")
+
+    for i in range(0, len(holes_filtered)):
+        distance = 10000.0
+        closest_street = -1
+        for j in range(0, len(streets_fitted)):
+            dist = holes_filtered.geometry.iloc[i].distance(streets_fitted.geometry.iloc[j])
+            if dist < distance:
+                distance = dist
+                closest_street = j
+        closest_streets.append(closest_street)
+        
+    holes_filtered['closest_street'] = closest_streets
+    
+    # Buffer streets
+    streets_fitted['buffered_street'] = streets_fitted.buffer(constants['STREET_BUFFER_DISTANCE']).simplify(0.4)
+    buffered_street = streets_fitted.buffer(constants['STREET_BUFFER_DISTANCE']).simplify(0.4)
+    return holes_filtered, blocked, streets_fitted, buffered_street
+
+def street_poses_stage(home_pose, streets_fitted, transit_streets, blocked, obstacles, high_obstacles, geofence, cancel_token=None):
+    """Home pose plus poses sampled along the (transit) streets, as one PoseArray; adds their 'poses' column"""
+    streets_fitted = streets_fitted.copy()
+    parts = [PoseArray.from_poses(home_pose['poses'][0], 'home_pose')]
+    parts.append(utils.posesFromGeoDataFrame(streets_fitted, blocked, obstacles, high_obstacles, geofence, cancel_token))
+    if transit_streets is not None:
+        transit_streets = transit_streets.copy()
+        parts.append(utils.posesFromGeoDataFrame(transit_streets, blocked, obstacles, high_obstacles, geofence, cancel_token))
+    return streets_fitted, transit_streets, PoseArray.concatenate(parts)
+
+def loading_poses_stage(streets_fitted, holes_filtered, blocked, base_poses, constants, progress_callback=None, cancel_token=None):
+    """Loading poses for every hole appended after the street poses"""
+    holes_filtered = holes_filtered.copy()
+    poses_holes, extra_connections = utils.generateLoadingPoses(streets_fitted, holes_filtered, blocked, base_poses, constants['OBSTACLE_BUFFER_DISTANCE'], constants['TURNING_RADIUS'], constants['HOLE_DISTANCE'], progress_callback, cancel_token)
+    return holes_filtered, PoseArray.concatenate([base_poses, poses_holes]), extra_connections
+
 def generate_routes_logic(
     holes,
     geofence,
@@ -24,7 +119,11 @@ def generate_routes_logic(
     use_transit_streets=False,
     fit_streets_enabled=False,
     fit_twice=False,
-    progress_callback=None
+    progress_callback=None,
+    cancel_token=None,
+    stages=None,
+    params=None,
+    validate=True
 ):
     """
     Core logic for generating routes.
@@ -43,6 +142,11 @@ def generate_routes_logic(
         fit_streets_enabled (bool): Whether to fit streets.
         fit_twice (bool): Whether to fit streets twice.
         progress_callback (function, optional): Callback for progress updates.
+        cancel_token (CancellationToken, optional): Checked inside the long loops; raises JobCancelled.
+        stages (StageRunner, optional): Runs (and caches) each stage. Its keys for the
+            inputs ('holes', 'geofence', ...) must be registered beforehand.
+        params (dict, optional): Overrides for the module constants (see SWEEP_PARAMETERS).
+        validate (bool): Whether to raise if home and holes are not connected.
         
     Returns:
         dict: A dictionary containing the results:
@@ -58,72 +162,64 @@ def generate_routes_logic(
     if geofence is None or home_pose is None or streets is None:
         raise ValueError("Essential geometries (geofence, home_pose, streets) must be provided.")
 
+    constants = algorithm_constants()
+    constants.update(params or {})
+    if stages is None:
+        stages = StageRunner()
+    if not (use_transit_streets and transit_streets is not None):
+        transit_streets = None
+
     # Fit streets
-    streets_fitted = streets.copy()
-    if fit_streets_enabled:
-        if progress_callback: progress_callback(1)
-        streets_fitted = fit_all_streets(streets, holes, geofence, obstacles, high_obstacles, fit_twice, progress_callback)
+    streets_fitted = run_fit_streets_stage(stages, streets, holes, geofence, obstacles, high_obstacles, fit_streets_enabled, fit_twice, progress_callback, cancel_token)
 
     # Filter holes and define blocked areas
-    blocked_now = holes
-    holes_filtered_now = holes
-    
-    if use_obstacles and obstacles is not None:
-        blocked_now = pd.concat([blocked_now, obstacles])
-        holes_filtered_now = holes_filtered_now[holes_filtered_now.within(geofence.unary_union - obstacles.unary_union)].reset_index(drop=True)
-        
-    if use_high_obstacles and high_obstacles is not None:
-        blocked_now = pd.concat([blocked_now, high_obstacles])
-        holes_filtered_now = holes_filtered_now[holes_filtered_now.within(geofence.unary_union - high_obstacles.unary_union)].reset_index(drop=True)
+    holes_filtered, blocked, streets_fitted, buffered_street = stages.run(
+        'filter_holes',
+        lambda: filter_holes_stage(holes, geofence, obstacles, high_obstacles, streets_fitted, use_obstacles, use_high_obstacles, constants),
+        deps=['fit_streets', 'holes', 'geofence', 'obstacles', 'high_obstacles'],
+        params={
+            'use_obstacles': use_obstacles, 'use_high_obstacles': use_high_obstacles,
+            'OBSTACLE_BUFFER_DISTANCE': constants['OBSTACLE_BUFFER_DISTANCE'], 'MAX_HOLES_PER_PLAN': constants['MAX_HOLES_PER_PLAN'],
+            'STREET_BUFFER_DISTANCE': constants['STREET_BUFFER_DISTANCE']
+        }
+    )
+    if progress_callback:
+        progress_callback(10)
 
-    blocked = gpd.GeoDataFrame(geometry=gpd.GeoSeries(pd.concat([blocked_now, gpd.GeoDataFrame(geometry=geofence.boundary)]).buffer(OBSTACLE_BUFFER_DISTANCE))).unary_union
-    holes_filtered = holes_filtered_now
+    # Create the graph: street poses, loading poses, connections
+    streets_fitted, transit_streets, base_poses = stages.run(
+        'street_poses',
+        lambda: street_poses_stage(home_pose, streets_fitted, transit_streets, blocked, obstacles, high_obstacles, geofence, cancel_token),
+        deps=['filter_holes', 'home_pose', 'transit_streets', 'obstacles', 'high_obstacles', 'geofence'],
+        params={'use_transit_streets': transit_streets is not None}
+    )
 
-    print("holes after filter")
-    print(holes_filtered)
+    holes_filtered, all_poses, extra_connections = stages.run(
+        'loading_poses',
+        lambda: loading_poses_stage(streets_fitted, holes_filtered, blocked, base_poses, constants, progress_callback, cancel_token),
+        deps=['street_poses', 'filter_holes'],
+        params={key: constants[key] for key in ('OBSTACLE_BUFFER_DISTANCE', 'TURNING_RADIUS', 'HOLE_DISTANCE')}
+    )
+    pose_type = all_poses.pose_type_names()
+    if progress_callback: progress_callback(30)
 
-    if len(holes_filtered) > MAX_HOLES_PER_PLAN:
-        raise GuiTextException("Demasiados pozos a cargar ("+ str(len(holes_filtered))+"), el número máximo de pozos es " + str(MAX_HOLES_PER_PLAN))
+    connections = stages.run(
+        'connections',
+        lambda: utils.makeConnections(all_poses, blocked, list(extra_connections), constants['TURNING_RADIUS'], progress_callback, pose_type, cancel_token)[0],
+        deps=['loading_poses', 'filter_holes'],
+        params={'TURNING_RADIUS': constants['TURNING_RADIUS']}
+    )
+    if progress_callback: progress_callback(95)
 
-    # Calculate closest streets
-    closest_streets = []
-    if progress_callback:
-        progress_callback(10)
-        
-    print(f"DEBUG: Finding closest streets. Holes: {len(holes_filtered)}, Streets: {len(streets_fitted)}")
-    if hasattr(holes_filtered, 'crs'): print(f"DEBUG: Holes CRS: {holes_filtered.crs}")
-    if hasattr(streets_fitted, 'crs'): print(f"DEBUG: Streets CRS: {streets_fitted.crs}")
-
-    for i in range(0, len(holes_filtered)):
-        distance = 10000.0
-        closest_street = -1
-        for j in range(0, len(streets_fitted)):
-            dist = holes_filtered.geometry.iloc[i].distance(streets_fitted.geometry.iloc[j])
-            if dist < distance:
-                distance = dist
-                closest_street = j
-        closest_streets.append(closest_street)
-        
-    holes_filtered['closest_street'] = closest_streets
-    
-    # Buffer streets
-    streets_fitted['buffered_street'] = streets_fitted.buffer(STREET_BUFFER_DISTANCE).simplify(0.4)
-    buffered_street = streets_fitted.buffer(STREET_BUFFER_DISTANCE).simplify(0.4)
-
-    # Create Graph Dataframe
-    if use_transit_streets and transit_streets is not None:
-        graph_dataframe = utils.createGraphDataframe(
-            home_pose, streets_fitted, transit_streets, holes_filtered, blocked, 
-            obstacles, high_obstacles, geofence, OBSTACLE_BUFFER_DISTANCE, 
-            TURNING_RADIUS, HOLE_DISTANCE, progress_callback
-        )
-    else:
-        graph_dataframe = utils.createGraphDataframe_without_transit(
-            home_pose, streets_fitted, holes_filtered, blocked, 
-            obstacles, high_obstacles, geofence, OBSTACLE_BUFFER_DISTANCE, 
-            TURNING_RADIUS, HOLE_DISTANCE, progress_callback
+    if validate:
+        stages.run(
+            'validation',
+            lambda: utils.checkConnections(all_poses, connections, pose_type),
+            deps=['connections']
         )
 
+    graph_dataframe = utils.graphDataframeFromPoses(all_poses, pose_type, all_poses.drillhole_ids(holes_filtered), connections, home_pose.crs if hasattr(home_pose, 'crs') else None)
+
     print(graph_dataframe)
     print("finished graph dataframe")
 
@@ -137,7 +233,7 @@ def generate_routes_logic(
         
     dfs_to_concat.append(streets_fitted)
     
-    if use_transit_streets and transit_streets is not None:
+    if transit_streets is not None:
         dfs_to_concat.append(transit_streets)
         
     dfs_to_concat.append(geofence)
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import uuid
+import pickle
+import hashlib
+import threading
+
+from config import STAGE_CACHE_DIR, STAGE_CACHE_MAX_MB
+
+# Bump when a stage changes in a way its parameters do not capture
+STAGE_CACHE_VERSION = 3
+
+def hash_file(path, digest=None):
+    """Feeds the file bytes into digest (a new sha256 if None) and returns it"""
+    digest = digest or hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest
+
+def input_key(role, path, wgs84):
+    """Key of one uploaded layer as loaded and reprojected (None if not used)"""
+    if not path:
+        return None
+    header = json.dumps({'role': role, 'ext': os.path.splitext(path)[1].lower(), 'wgs84': wgs84}, sort_keys=True)
+    return hash_file(path, hashlib.sha256(header.encode('utf-8'))).hexdigest()
+
+def stage_key(name, dep_keys, params):
+    header = {'version': STAGE_CACHE_VERSION, 'stage': name, 'deps': dep_keys, 'params': params}
+    return hashlib.sha256(json.dumps(header, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class StageCache:
+    """
+    Pickled stage outputs on disk, one file per stage key, evicted least
+    recently used first once `max_bytes` is exceeded. Shared by all the
+    generation workers (files are written atomically).
+    """
+    def __init__(self, cache_dir=STAGE_CACHE_DIR, max_bytes=STAGE_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key}.pkl")
+
+    def get(self, name, key):
+        """Returns (True, value) on a hit, (False, None) otherwise"""
+        path = self._path(name, key)
+        if not self.enabled() or not os.path.exists(path):
+            return False, None
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)
+            return True, value
+        except Exception as e:
+            print(f"Error reading stage cache {os.path.basename(path)}: {e}")
+            return False, None
+
+    def put(self, name, key, value):
+        if not self.enabled():
+            return
+        path = self._path(name, key)
+        tmp_path = path + '.tmp-' + uuid.uuid4().hex[:8]
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error writing stage cache {os.path.basename(path)}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.pkl'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except OSError:
+                    pass
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            # The newest entry is always kept, even if it alone exceeds the budget
+            while total > self.max_bytes and len(entries) > 1:
+                _, size, path = entries.pop(0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+class StageRunner:
+    """
+    Runs the generation pipeline stage by stage. Each stage key is the hash
+    of the keys of the stages/inputs it depends on plus its own parameters,
+    so after a change only the stages downstream of it are recomputed.
+    Without a cache every stage is computed (timings are still reported).
+    `report` receives one {"type": "stage", ...} message per stage.
+    """
+    def __init__(self, cache=None, report=None):
+        self.cache = cache if cache is not None and cache.enabled() else None
+        self.report = report
+        self.keys = {}
+
+    def input(self, name, key):
+        """Registers the key of an external input (an uploaded layer)"""
+        self.keys[name] = key
+
+    def run(self, name, fn, deps=(), params=None, cacheable=True):
+        key = stage_key(name, [self.keys.get(dep) for dep in deps], params)
+        self.keys[name] = key
+        start = time.time()
+        hit, value = (False, None)
+        if cacheable and self.cache is not None:
+            hit, value = self.cache.get(name, key)
+        if not hit:
+            value = fn()
+            if cacheable and self.cache is not None:
+                self.cache.put(name, key, value)
+        self.record(name, start, hit)
+        return value
+
+    def record(self, name, start, cached=False):
+        """Reports a stage that started at `start` (also used for uncached steps)"""
+        time_ms = (time.time() - start) * 1000.0
+        print(f"Stage {name}: {'cache hit' if cached else 'computed'} in {time_ms:.1f} ms")
+        if self.report:
+            self.report({"type": "stage", "stage": name, "cached": cached, "time_ms": round(time_ms, 1)})
+
+# Singleton instance
+stage_cache = StageCache()
@@ -1,16 +1,82 @@
-from fastapi import APIRouter
-import os
-from config import GENERATED_DIR
-from modules.poses_geometry import path_finding
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+from typing import Optional
+from routes.api_v1.plan_graph import get_plan_graph
 
 graph_nodes_bp = APIRouter()
 
+DEFAULT_NODE_FIELDS = "id,lat,lon,pose_type"
+MAX_NEAREST_K = 100
+MAX_PAGE_SIZE = 5000
+
+def _parse_fields(fields):
+    return [f.strip() for f in fields.split(',') if f.strip()]
+
 @graph_nodes_bp.get("/api/v1/graph-nodes")
-async def get_graph_nodes():
-    if not path_finding.graph_manager.G:
-        csv_path = os.path.join(GENERATED_DIR, 'global_plan.csv')
-        if os.path.exists(csv_path):
-            path_finding.graph_manager.load_graph_from_csv(csv_path)
-    
-    nodes = path_finding.graph_manager.get_nodes_list()
+async def get_graph_nodes(plan_id: Optional[str] = None):
+    graph, error = get_plan_graph(plan_id)
+    if error:
+        # No plan generated yet: an empty list for the dropdowns
+        if plan_id is None and error.status_code == 404:
+            return {"nodes": []}
+        return error
+
+    nodes = graph.get_nodes_list()
     return {"nodes": nodes}
+
+@graph_nodes_bp.get("/api/v1/graph-nodes/nearest")
+async def get_nearest_nodes(
+    x: float,
+    y: float,
+    k: int = Query(1, ge=1, le=MAX_NEAREST_K),
+    crs: str = "wgs84",
+    fields: str = DEFAULT_NODE_FIELDS,
+    plan_id: Optional[str] = None
+):
+    """k graph nodes closest to (x, y): (lon, lat) for crs=wgs84, (easting, northing) for crs=utm"""
+    graph, error = get_plan_graph(plan_id)
+    if error:
+        return error
+
+    try:
+        indices, distances = graph.spatial_index().nearest(x, y, k=k, crs=crs)
+        nodes = graph.node_fields(indices, _parse_fields(fields))
+    except ValueError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+
+    for node, distance in zip(nodes, distances.tolist()):
+        node['distance'] = distance
+    return {"nodes": nodes}
+
+@graph_nodes_bp.get("/api/v1/graph-nodes/bbox")
+async def get_nodes_in_bbox(
+    bbox: str,
+    crs: str = "wgs84",
+    fields: str = DEFAULT_NODE_FIELDS,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(1000, ge=1, le=MAX_PAGE_SIZE),
+    plan_id: Optional[str] = None
+):
+    """Paginated graph nodes inside bbox="min_x,min_y,max_x,max_y" (lon/lat for crs=wgs84, UTM for crs=utm)"""
+    graph, error = get_plan_graph(plan_id)
+    if error:
+        return error
+
+    try:
+        min_x, min_y, max_x, max_y = [float(v) for v in bbox.split(',')]
+    except ValueError:
+        return JSONResponse(content={"status": "error", "message": "bbox must be 'min_x,min_y,max_x,max_y'"}, status_code=400)
+
+    try:
+        indices = graph.spatial_index().within_bbox(min_x, min_y, max_x, max_y, crs=crs)
+        start = (page - 1) * page_size
+        nodes = graph.node_fields(indices[start:start + page_size], _parse_fields(fields))
+    except ValueError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+
+    return {
+        "total": int(len(indices)),
+        "page": page,
+        "page_size": page_size,
+        "nodes": nodes
+    }
@@ -0,0 +1,194 @@
+import os
+import json
+import gzip
+import hashlib
+import threading
+from modules.poses_geometry import reprojection
+
+# Result layers of a plan, one file each under <plan dir>/artifacts/, listed
+# in <plan dir>/manifest.json with their size and ETag. Text artifacts also
+# get a pre-compressed .gz copy served to clients that accept gzip. Map
+# layers are written as GeoJSON plus alternative binary formats.
+ARTIFACTS_DIR = 'artifacts'
+MANIFEST_FILE = 'manifest.json'
+ARTIFACTS_PREFIX = "/api/v1/plans"
+
+GEOJSON = "application/geo+json"
+# Alternative layer formats: name -> (extension, media type, GDAL driver)
+LAYER_FORMATS = {
+    "flatgeobuf": (".fgb", "application/flatgeobuf", "FlatGeobuf"),
+}
+
+def _etag(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+class ArtifactWriter:
+    """
+    Writes the artifacts of a plan and collects their manifest entries. The
+    add_* methods may be called from several threads at once.
+    """
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.artifacts = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(output_dir, ARTIFACTS_DIR), exist_ok=True)
+
+    def _record(self, artifact_id, entry):
+        with self._lock:
+            self.artifacts[artifact_id] = entry
+
+    def add_bytes(self, artifact_id, data, filename, media_type, compress=True, directory=ARTIFACTS_DIR):
+        """Writes data to <directory>/<filename> (artifacts/ by default) and lists it under artifact_id"""
+        relative_path = os.path.join(directory, filename)
+        path = os.path.join(self.output_dir, relative_path)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if compress:
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=6, mtime=0))
+        self._record(artifact_id, {
+            "file": relative_path,
+            "media_type": media_type,
+            "size": len(data),
+            "etag": _etag(data),
+            "gzip": compress
+        })
+
+    def add_text(self, artifact_id, text, filename, media_type='application/json'):
+        """None is skipped (optional layers that were not uploaded)"""
+        if text is None:
+            return
+        self.add_bytes(artifact_id, text.encode('utf-8'), filename, media_type)
+
+    def add_json(self, artifact_id, value, filename, media_type='application/json'):
+        if value is None:
+            return
+        self.add_text(artifact_id, json.dumps(value), filename, media_type)
+
+    def add_layer(self, artifact_id, gdf, name):
+        """
+        Writes a GeoDataFrame as <name>.geojson (the default format) and as
+        each of LAYER_FORMATS. FlatGeobuf is written with its packed Hilbert
+        R-tree, so features are stored in spatial order. None is skipped.
+        """
+        if gdf is None:
+            return
+        if gdf.crs != reprojection.WGS84_CRS:
+            gdf = reprojection.to_crs(gdf, reprojection.WGS84_CRS)
+        self.add_text(artifact_id, gdf.to_json(), name + '.geojson', GEOJSON)
+        formats = {}
+        for format_name, (extension, media_type, driver) in LAYER_FORMATS.items():
+            relative_path = os.path.join(ARTIFACTS_DIR, name + extension)
+            path = os.path.join(self.output_dir, relative_path)
+            try:
+                _binary_frame(gdf).to_file(path, driver=driver, SPATIAL_INDEX='YES')
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except Exception as e:
+                # The GeoJSON is still there, the layer just lacks this format
+                print(f"Error writing {format_name} for {artifact_id}: {e}")
+                continue
+            formats[format_name] = {
+                "file": relative_path,
+                "media_type": media_type,
+                "size": len(data),
+                "etag": _etag(data)
+            }
+        if formats:
+            with self._lock:
+                self.artifacts[artifact_id]["formats"] = formats
+
+    def add_file(self, artifact_id, relative_path, media_type):
+        """Lists an artifact already written in the plan directory (e.g. map.png)"""
+        with open(os.path.join(self.output_dir, relative_path), 'rb') as f:
+            data = f.read()
+        self._record(artifact_id, {
+            "file": relative_path,
+            "media_type": media_type,
+            "size": len(data),
+            "etag": _etag(data),
+            "gzip": False
+        })
+
+    def write_manifest(self):
+        # Sorted so the manifest does not depend on the order the writers finished in
+        self.artifacts = dict(sorted(self.artifacts.items()))
+        with open(os.path.join(self.output_dir, MANIFEST_FILE), 'w') as f:
+            json.dump({"artifacts": self.artifacts}, f)
+        return self.artifacts
+
+def _binary_frame(gdf):
+    """
+    Copy of gdf the GDAL drivers can write: columns holding lists, dicts or
+    mixed values are stored as JSON text, as they appear in the GeoJSON.
+    """
+    gdf = gdf.copy()
+    for column in gdf.columns:
+        if column == gdf.geometry.name or gdf[column].dtype != object:
+            continue
+        if not all(value is None or isinstance(value, str) for value in gdf[column]):
+            gdf[column] = [None if value is None else json.dumps(value, default=str) for value in gdf[column]]
+    return gdf
+
+def select_format(entry, requested, accept):
+    """
+    Returns the manifest entry of the requested format of an artifact: the
+    `format` query parameter if given, else the first alternative format
+    named in the Accept header, else the default one. Raises KeyError if
+    `requested` is not available for the artifact.
+    """
+    formats = entry.get("formats", {})
+    if requested:
+        if requested == "geojson" and entry["media_type"] == GEOJSON:
+            return entry
+        return formats[requested]
+    for format_entry in formats.values():
+        if format_entry["media_type"] in accept:
+            return format_entry
+    return entry
+
+def load_manifest(plan_dir):
+    """Returns the artifacts dict of a plan or None if it has no manifest"""
+    path = os.path.join(plan_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)["artifacts"]
+
+def public_manifest(plan_id, artifacts):
+    """Manifest as sent to clients: URL, media type, size and ETag per artifact"""
+    manifest = {}
+    for artifact_id, entry in artifacts.items():
+        url = f"{ARTIFACTS_PREFIX}/{plan_id}/artifacts/{artifact_id}"
+        manifest[artifact_id] = {
+            "url": url,
+            "media_type": entry["media_type"],
+            "size": entry["size"],
+            "etag": entry["etag"]
+        }
+        if entry.get("formats"):
+            manifest[artifact_id]["formats"] = {
+                format_name: {
+                    "url": f"{url}?format={format_name}",
+                    "media_type": format_entry["media_type"],
+                    "size": format_entry["size"],
+                    "etag": format_entry["etag"]
+                }
+                for format_name, format_entry in entry["formats"].items()
+            }
+    return manifest
+
+def response_etag(etag, gzipped):
+    """ETag header of one representation: the gzip body is a different one, so it gets its own tag"""
+    return f'"{etag}-gzip"' if gzipped else f'"{etag}"'
+
+def _opaque_tag(tag):
+    return tag[2:] if tag.startswith('W/') else tag
+
+def etag_matches(if_none_match, etag):
+    """
+    If-None-Match check: the header is "*" or a comma-separated list of
+    entity tags, compared to etag with the weak comparison (W/ ignored).
+    """
+    tags = [tag.strip() for tag in (if_none_match or "").split(',') if tag.strip()]
+    return '*' in tags or _opaque_tag(etag) in [_opaque_tag(tag) for tag in tags]
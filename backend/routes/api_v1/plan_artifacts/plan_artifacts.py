@@ -0,0 +1,52 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, FileResponse, Response
+from config import PLANS_DIR
+from modules.poses_geometry.path_finding import PLAN_ID_PATTERN
+from .artifact_store import load_manifest, public_manifest, select_format, response_etag, etag_matches
+
+plan_artifacts_bp = APIRouter()
+
+# Artifacts of a plan never change once written
+CACHE_CONTROL = "public, max-age=86400"
+
+def _get_manifest(plan_id):
+    """Returns (artifacts, error response)"""
+    if not PLAN_ID_PATTERN.match(plan_id):
+        return None, JSONResponse(content={"status": "error", "message": f"Invalid plan ID '{plan_id}'"}, status_code=400)
+    artifacts = load_manifest(os.path.join(PLANS_DIR, plan_id))
+    if artifacts is None:
+        return None, JSONResponse(content={"status": "error", "message": f"Plan {plan_id} not found"}, status_code=404)
+    return artifacts, None
+
+@plan_artifacts_bp.get("/api/v1/plans/{plan_id}/manifest")
+async def get_manifest(plan_id: str):
+    artifacts, error = _get_manifest(plan_id)
+    if error:
+        return error
+    return {"status": "success", "plan_id": plan_id, "manifest": public_manifest(plan_id, artifacts)}
+
+@plan_artifacts_bp.get("/api/v1/plans/{plan_id}/artifacts/{artifact_id}")
+async def get_artifact(plan_id: str, artifact_id: str, request: Request, format: Optional[str] = None):
+    artifacts, error = _get_manifest(plan_id)
+    if error:
+        return error
+    entry = artifacts.get(artifact_id)
+    if entry is None:
+        return JSONResponse(content={"status": "error", "message": f"Plan {plan_id} has no artifact '{artifact_id}'"}, status_code=404)
+    try:
+        entry = select_format(entry, format, request.headers.get("accept", ""))
+    except KeyError:
+        return JSONResponse(content={"status": "error", "message": f"Artifact '{artifact_id}' is not available as '{format}'"}, status_code=404)
+
+    path = os.path.join(PLANS_DIR, plan_id, entry["file"])
+    gzipped = bool(entry.get("gzip")) and "gzip" in request.headers.get("accept-encoding", "") and os.path.exists(path + ".gz")
+    headers = {"ETag": response_etag(entry["etag"], gzipped), "Cache-Control": CACHE_CONTROL, "Vary": "Accept, Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        path = path + ".gz"
+    return FileResponse(path, media_type=entry["media_type"], headers=headers)
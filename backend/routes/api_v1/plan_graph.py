@@ -0,0 +1,13 @@
+from fastapi.responses import JSONResponse
+from modules.poses_geometry import path_finding
+
+def get_plan_graph(plan_id):
+    """Graph of a generated plan (the latest one when plan_id is None). Returns (graph, error_response)"""
+    try:
+        graph = path_finding.graph_registry.get(plan_id)
+    except ValueError as e:
+        return None, JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+    if graph is None:
+        message = "Graph not loaded and no global_plan.csv found" if plan_id is None else f"Plan {plan_id} not found"
+        return None, JSONResponse(content={"status": "error", "message": message}, status_code=404)
+    return graph, None
@@ -0,0 +1,63 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from shapely.geometry import shape
+from routes.api_v1.plan_graph import get_plan_graph
+from modules.poses_geometry import reprojection
+
+class RuntimeObstacleRequest(BaseModel):
+    geometry: Dict[str, Any]  # GeoJSON geometry (Polygon / MultiPolygon)
+    crs: str = "wgs84"  # 'wgs84' (lon/lat) or 'utm' (plan coordinates)
+    buffer: float = 0.0  # Extra clearance around the geometry, in metres
+    ttl_seconds: Optional[float] = None  # Obstacle expires after this time (never when omitted)
+    label: Optional[str] = None
+    plan_id: Optional[str] = None
+
+runtime_obstacles_bp = APIRouter()
+
+@runtime_obstacles_bp.post("/api/v1/runtime-obstacles")
+async def add_runtime_obstacle(req: RuntimeObstacleRequest):
+    graph, error = get_plan_graph(req.plan_id)
+    if error:
+        return error
+
+    try:
+        geometry = shape(req.geometry)
+        if req.crs == "wgs84":
+            geometry = reprojection.transform_geometry(geometry, reprojection.WGS84_CRS, reprojection.UTM_CRS)
+        elif req.crs != "utm":
+            raise ValueError(f"Unknown crs '{req.crs}' (expected 'wgs84' or 'utm')")
+        if req.buffer > 0:
+            geometry = geometry.buffer(req.buffer)
+        obstacle = graph.add_runtime_obstacle(geometry, req.ttl_seconds, req.label)
+    except ValueError as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+
+    return {"status": "success", "obstacle": obstacle}
+
+@runtime_obstacles_bp.get("/api/v1/runtime-obstacles")
+async def list_runtime_obstacles(plan_id: Optional[str] = None):
+    graph, error = get_plan_graph(plan_id)
+    if error:
+        return error
+    return {"obstacles": graph.runtime_obstacles}
+
+@runtime_obstacles_bp.delete("/api/v1/runtime-obstacles/{obstacle_id}")
+async def remove_runtime_obstacle(obstacle_id: str, plan_id: Optional[str] = None):
+    graph, error = get_plan_graph(plan_id)
+    if error:
+        return error
+    if not graph.remove_runtime_obstacle(obstacle_id):
+        return JSONResponse(content={"status": "error", "message": f"Obstacle {obstacle_id} not found"}, status_code=404)
+    return {"status": "success"}
+
+@runtime_obstacles_bp.delete("/api/v1/runtime-obstacles")
+async def clear_runtime_obstacles(plan_id: Optional[str] = None):
+    graph, error = get_plan_graph(plan_id)
+    if error:
+        return error
+    graph.clear_runtime_obstacles()
+    return {"status": "success"}
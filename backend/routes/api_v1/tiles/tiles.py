@@ -0,0 +1,183 @@
+import os
+import gzip
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import shapely
+import geopandas as gpd
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response
+from config import PLANS_DIR, TILE_CACHE_MAX_MB, TILE_INDEX_MAX_PLANS
+from modules.poses_geometry import path_finding
+from modules.poses_geometry.path_finding import PLAN_ID_PATTERN
+from modules.poses_geometry import vector_tiles
+from routes.api_v1.plan_artifacts.artifact_store import load_manifest, response_etag, etag_matches
+
+tiles_bp = APIRouter()
+
+MVT = "application/vnd.mapbox-vector-tile"
+CACHE_CONTROL = "public, max-age=86400"
+
+# Tile layer -> (artifacts tried in order, attributes kept)
+ARTIFACT_LAYERS = {
+    "streets": (["fitted_streets_geojson", "streets_geojson"], ["type"]),
+    "transit_streets": (["fitted_transit_streets_geojson", "transit_streets_geojson"], ["type"]),
+    "holes": (["holes_geojson"], ["drillhole_id", "drillhole_depth", "mesh"]),
+}
+
+def _read_artifact(plan_dir, artifacts, artifact_ids):
+    """GeoDataFrame of the first available artifact (FlatGeobuf when there is one)"""
+    for artifact_id in artifact_ids:
+        entry = artifacts.get(artifact_id)
+        if entry is None:
+            continue
+        entry = entry.get("formats", {}).get("flatgeobuf", entry)
+        return gpd.read_file(os.path.join(plan_dir, entry["file"]))
+    return None
+
+def build_tile_index(graph, plan_dir):
+    """Tile index of a plan: graph poses and edges plus its street, hole and arrow layers"""
+    index = vector_tiles.PlanTileIndex()
+
+    x, y = vector_tiles.to_mercator(graph.node_latlon[:, 1], graph.node_latlon[:, 0])
+    pose_types = np.asarray(graph.pose_types, dtype=object)[graph.node_pose_type]
+    index.add_points("poses", x, y, properties={"pose_type": pose_types}, ids=graph.node_ids)
+
+    # Each connection once, whatever its direction
+    sources = np.repeat(np.arange(graph.num_nodes), np.diff(graph.indptr))
+    pairs = np.unique(np.sort(np.column_stack([sources, graph.indices]), axis=1), axis=0)
+    xy = np.column_stack([x, y])
+    index.add_segments("edges", np.stack([xy[pairs[:, 0]], xy[pairs[:, 1]]], axis=1))
+
+    artifacts = load_manifest(plan_dir) or {}
+    for name, (artifact_ids, columns) in ARTIFACT_LAYERS.items():
+        gdf = _read_artifact(plan_dir, artifacts, artifact_ids)
+        if gdf is not None and len(gdf):
+            index.add_geodataframe(name, gdf, columns)
+
+    arrows = _read_artifact(plan_dir, artifacts, ["arrow_geojson"])
+    if arrows is not None and len(arrows):
+        coords = shapely.get_coordinates(arrows.geometry.values).reshape(-1, 2, 2)
+        wx, wy = vector_tiles.to_mercator(coords[..., 0].ravel(), coords[..., 1].ravel())
+        index.add_segments("arrows", np.column_stack([wx, wy]).reshape(-1, 2, 2))
+    return index
+
+class TileStore:
+    """
+    Tile indexes of the most recently used plans plus an LRU cache of
+    encoded tiles (raw and gzipped) bounded by `max_bytes`. An index is
+    rebuilt if its plan graph is reloaded.
+    """
+    def __init__(self, max_plans=TILE_INDEX_MAX_PLANS, max_bytes=TILE_CACHE_MAX_MB * 1024 * 1024):
+        self.max_plans = max_plans
+        self.max_bytes = max_bytes
+        self._indexes = OrderedDict()
+        self._tiles = OrderedDict()
+        self._tiles_bytes = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def index(self, plan_id):
+        """Returns the tile index of plan_id or None if the plan does not exist"""
+        graph = path_finding.graph_registry.get(plan_id)
+        if graph is None:
+            return None
+        with self._build_lock:
+            stamp, index = self._indexes.get(plan_id, (None, None))
+            if index is None or stamp != graph.source_stamp:
+                index = build_tile_index(graph, os.path.join(PLANS_DIR, plan_id))
+                print(f"Tile index built for plan {plan_id}: {', '.join(index.layers)}")
+                with self._lock:
+                    self._drop_tiles(plan_id)
+                    self._indexes[plan_id] = (graph.source_stamp, index)
+                    while len(self._indexes) > self.max_plans:
+                        evicted, _ = self._indexes.popitem(last=False)
+                        self._drop_tiles(evicted)
+            self._indexes.move_to_end(plan_id)
+            return index
+
+    def tile(self, plan_id, z, x, y):
+        """Returns (raw, gzipped, etag) of a tile or None if the plan does not exist"""
+        key = (plan_id, z, x, y)
+        with self._lock:
+            cached = self._tiles.get(key)
+            if cached is not None:
+                self._tiles.move_to_end(key)
+                return cached
+        index = self.index(plan_id)
+        if index is None:
+            return None
+        raw = index.tile(z, x, y)
+        tile = (raw, gzip.compress(raw, compresslevel=6, mtime=0), hashlib.sha256(raw).hexdigest()[:32])
+        with self._lock:
+            if key not in self._tiles:
+                self._tiles[key] = tile
+                self._tiles_bytes += len(tile[0]) + len(tile[1])
+            while self._tiles_bytes > self.max_bytes and self._tiles:
+                _, (old_raw, old_gz, _) = self._tiles.popitem(last=False)
+                self._tiles_bytes -= len(old_raw) + len(old_gz)
+        return tile
+
+    def _drop_tiles(self, plan_id):
+        for key in [key for key in self._tiles if key[0] == plan_id]:
+            raw, gz, _ = self._tiles.pop(key)
+            self._tiles_bytes -= len(raw) + len(gz)
+
+# Singleton instance
+tile_store = TileStore()
+
+def _check_plan(plan_id):
+    if not PLAN_ID_PATTERN.match(plan_id):
+        return JSONResponse(content={"status": "error", "message": f"Invalid plan ID '{plan_id}'"}, status_code=400)
+    return None
+
+def _not_found(plan_id):
+    return JSONResponse(content={"status": "error", "message": f"Plan {plan_id} not found"}, status_code=404)
+
+@tiles_bp.get("/api/v1/tiles/{plan_id}")
+async def get_tilejson(plan_id: str):
+    """TileJSON description of the plan's tiles (layers, zooms and bounds)"""
+    error = _check_plan(plan_id)
+    if error:
+        return error
+    index = await asyncio.to_thread(tile_store.index, plan_id)
+    if index is None:
+        return _not_found(plan_id)
+    return {
+        "tilejson": "3.0.0",
+        "tiles": [f"/api/v1/tiles/{plan_id}/{{z}}/{{x}}/{{y}}"],
+        "minzoom": 0,
+        "maxzoom": vector_tiles.MAX_ZOOM,
+        "bounds": index.lonlat_bounds(),
+        "vector_layers": [
+            {"id": name, "minzoom": vector_tiles.LAYER_MIN_ZOOM.get(name, 0), "maxzoom": vector_tiles.MAX_ZOOM}
+            for name in index.layers
+        ]
+    }
+
+@tiles_bp.get("/api/v1/tiles/{plan_id}/{z}/{x}/{y}")
+async def get_tile(plan_id: str, z: int, x: int, y: str, request: Request):
+    """Mapbox Vector Tile of a plan (y may carry a .mvt or .pbf extension)"""
+    error = _check_plan(plan_id)
+    if error:
+        return error
+    y_value = y.rsplit('.', 1)[0] if y.endswith(('.mvt', '.pbf')) else y
+    if not y_value.isdigit() or not 0 <= z <= vector_tiles.MAX_ZOOM or not 0 <= x < (1 << z) or not 0 <= int(y_value) < (1 << z):
+        return JSONResponse(content={"status": "error", "message": f"Invalid tile {z}/{x}/{y}"}, status_code=400)
+
+    tile = await asyncio.to_thread(tile_store.tile, plan_id, z, x, int(y_value))
+    if tile is None:
+        return _not_found(plan_id)
+    raw, gz, etag = tile
+    gzipped = bool(raw) and "gzip" in request.headers.get("accept-encoding", "")
+    headers = {"ETag": response_etag(etag, gzipped), "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if not raw:
+        return Response(status_code=204, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=gz, media_type=MVT, headers=headers)
+    return Response(content=raw, media_type=MVT, headers=headers)
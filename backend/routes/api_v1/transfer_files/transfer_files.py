@@ -2,9 +2,9 @@ from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 import os
 from pydantic import BaseModel
-from config import GENERATED_DIR
+from config import GENERATED_DIR, PLANS_DIR
 
-from typing import Dict
+from typing import Dict, Optional
 from . import transfer_logic
 import glob
 
@@ -14,6 +14,7 @@ class TransferRequest(BaseModel):
     username: str
     password: str
     files: Dict[str, str]  # filename -> remote_path
+    plan_id: Optional[str] = None  # Transfer this plan's files instead of the latest ones
 
 transfer_files_bp = APIRouter()
 
@@ -28,10 +29,16 @@ async def transfer_files(req: TransferRequest):
         # For generated files, we should look in the last generated folder or just use the known structure if flat?
         # The previous logic walked GENERATED_DIR. Let's find files by name in GENERATED_DIR recursively.
         
+        search_dir = GENERATED_DIR
+        if req.plan_id:
+            search_dir = os.path.join(PLANS_DIR, os.path.basename(req.plan_id))
+            if not os.path.isdir(search_dir):
+                return JSONResponse(content={"status": "error", "message": f"Plan {req.plan_id} not found"}, status_code=404)
+
         # Helper to find file path
         def find_file(name):
-             # Search recursively in GENERATED_DIR
-             for root, dirs, files in os.walk(GENERATED_DIR):
+             # Search recursively in search_dir (the latest plan sits at the top of GENERATED_DIR)
+             for root, dirs, files in os.walk(search_dir):
                  if name in files:
                      return os.path.join(root, name)
              return None
@@ -1,4 +1,3 @@
-import paramiko
 import os
 import logging
 
@@ -10,6 +9,7 @@ def transfer_files_scp(host, port, username, password, local_path, remote_path):
     """
     Transfers a file or directory to a remote server via SCP.
     """
+    import paramiko
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
@@ -67,6 +67,7 @@ def transfer_multiple_files_scp(host, port, username, password, files_map):
     Transfers multiple files using a single SSH connection.
     files_map: Dict[local_path, remote_path]
     """
+    import paramiko
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     results = []
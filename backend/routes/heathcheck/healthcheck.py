@@ -1,8 +1,10 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
+from routes.api_v1.generate_routes.job_scheduler import job_scheduler
 
 healthcheck_bp = APIRouter()
 
 @healthcheck_bp.get("/healthcheck")
 def healthcheck():
-    return JSONResponse(content={"status": "ok"})
\ No newline at end of file
+    # Generation pool load: running and queued jobs against their limits
+    return JSONResponse(content={"status": "ok", "generation": job_scheduler.stats()})
@@ -0,0 +1,52 @@
+"""
+.hol reader: malformed lines are skipped and counted, and the mesh filter
+keeps only the holes of the requested meshes.
+
+Run from backend/ with: python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.poses_geometry import utils
+
+HOL_LINES = [
+    "343348.51 6334425.48 11.8 10 270 0 0 -90 19 M1",
+    "343353.35 6334426.18 11.2 10 270 0 0 -90 18 M1",
+    "343358.49 6334426.80 30 10 270 0 0 -90 16 M2 extra fields",
+    "343360.00 6334427.00 12.0 10 270 0 0 -90",  # Too short: no mesh
+    "343361.00 abc 12.0 10 270 0 0 -90 21 M2",  # Non-numeric y
+    "343362.00 6334428.00 12.0 10 270 0 0 -90 2.5 M2",  # Non-integer drillhole id
+    "343363.00 6334429.00 12.0 10 270 0 0 -90 22 M3",
+]
+
+@pytest.fixture
+def hol_file(tmp_path):
+    path = tmp_path / 'holes.hol'
+    path.write_text('\n'.join(HOL_LINES) + '\n')
+    return str(path)
+
+@pytest.mark.parametrize('chunk_rows', [2, 1000])
+def test_malformed_lines_are_counted(hol_file, chunk_rows, capsys):
+    holes = utils.readHoles(hol_file, chunk_rows=chunk_rows)
+    assert "Skipped 3 malformed lines" in capsys.readouterr().out
+    assert holes['drillhole_id'].tolist() == [19, 18, 16, 22]
+    assert holes['mesh'].tolist() == ['M1', 'M1', 'M2', 'M3']
+    assert holes['drillhole_id'].dtype == 'int64'
+    assert holes['y'].dtype == 'float64'
+
+def test_mesh_filter(hol_file, capsys):
+    holes = utils.readHoles(hol_file, meshes=['M1', 'M3'], chunk_rows=2)
+    assert holes['drillhole_id'].tolist() == [19, 18, 22]
+    # Lines of other meshes are dropped before parsing, so they are not counted
+    assert "malformed" not in capsys.readouterr().out
+
+def test_hol_file_mesh_filter(hol_file):
+    holes = utils.readHolFile(hol_file, True, meshes=['M2'])
+    assert holes['drillhole_id'].tolist() == [16]
+    assert (holes['type'] == 'hole').all()
+    with pytest.raises(ValueError):
+        utils.readHolFile(hol_file, True, meshes=['M9'])
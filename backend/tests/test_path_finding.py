@@ -0,0 +1,143 @@
+"""
+Regression check for GraphManager.find_path: on a synthetic street grid its
+path costs must match networkx shortest paths, on the full and the
+contracted graph, with and without blocked edges.
+
+Run from backend/ with: python -m pytest -q tests
+"""
+import os
+import random
+import sys
+
+import networkx as nx
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.poses_geometry.path_finding import GraphManager
+
+STREETS = 6
+STREET_LENGTH = 30.0
+STEP = 0.5
+NUM_HOLES = 30
+NUM_BLOCKED = 40
+NUM_PAIRS = 60
+
+def build_grid(seed=0):
+    """
+    STREETS x STREETS grid of streets sampled every STEP meters, with Home
+    and NUM_HOLES holes on random poses. Every other horizontal street is
+    one-way so both kinds of chains get contracted.
+    """
+    rng = random.Random(seed)
+    index = {}
+    poses = []
+    sources, targets = [], []
+
+    def node(x, y, theta):
+        key = (round(x, 3), round(y, 3))
+        if key not in index:
+            index[key] = len(poses)
+            poses.append((x, y, theta))
+        return index[key]
+
+    spacing = STREET_LENGTH / (STREETS - 1)
+    for i in range(STREETS):
+        c = i * spacing
+        for horizontal in (True, False):
+            one_way = horizontal and i % 2 == 1
+            prev = None
+            for t in np.arange(0.0, STREET_LENGTH + 1e-9, STEP):
+                u = node(t, c, 0.0) if horizontal else node(c, t, np.pi / 2)
+                if prev is not None:
+                    sources.append(prev)
+                    targets.append(u)
+                    if not one_way:
+                        sources.append(u)
+                        targets.append(prev)
+                prev = u
+
+    n = len(poses)
+    types = ['street'] * n
+    special = rng.sample(range(n), NUM_HOLES + 1)
+    types[special[0]] = 'home_pose'
+    drillhole_to_node = {'Home': special[0]}
+    for k, node_id in enumerate(special[1:], start=1):
+        types[node_id] = 'hole'
+        drillhole_to_node[f'H{k}'] = node_id
+
+    g = GraphManager()
+    g._set_nodes(list(range(n)), np.asarray(poses), np.full((n, 2), np.nan), types, drillhole_to_node)
+    g._build_csr(np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64))
+    g.build_landmarks()
+    return g
+
+def to_networkx(g):
+    """Directed networkx graph with the CSR weights, without the blocked edges"""
+    nx_graph = nx.DiGraph()
+    nx_graph.add_nodes_from(range(g.num_nodes))
+    blocked = g.blocked_edges
+    for u in range(g.num_nodes):
+        for e in range(g.indptr[u], g.indptr[u + 1]):
+            if blocked is None or not blocked[e]:
+                nx_graph.add_edge(u, int(g.indices[e]), weight=float(g.weights[e]))
+    return nx_graph
+
+def path_cost(g, path):
+    """Cost of a find_path result, checking it only uses real, unblocked edges"""
+    nodes = [g.id_to_index[record['id']] for record in path]
+    cost = 0.0
+    for u, v in zip(nodes, nodes[1:]):
+        lo = g.indptr[u]
+        edge = np.flatnonzero(g.indices[lo:g.indptr[u + 1]] == v)
+        assert len(edge) == 1, f"{u} -> {v} is not an edge"
+        assert g.blocked_edges is None or not g.blocked_edges[lo + edge[0]], f"{u} -> {v} is blocked"
+        cost += g.weights[lo + edge[0]]
+    return cost
+
+@pytest.fixture(scope='module')
+def grid():
+    return build_grid()
+
+@pytest.fixture(scope='module')
+def pairs(grid):
+    rng = random.Random(1)
+    holes = list(grid.drillhole_to_node.values())
+    # Mostly hole to hole (contracted search), some from or to street poses (full graph fallback)
+    pairs = [(rng.choice(holes), rng.choice(holes)) for _ in range(NUM_PAIRS)]
+    pairs += [(rng.randrange(grid.num_nodes), rng.choice(holes)) for _ in range(NUM_PAIRS // 4)]
+    pairs += [(rng.choice(holes), rng.randrange(grid.num_nodes)) for _ in range(NUM_PAIRS // 4)]
+    return pairs
+
+def test_grid_is_contracted(grid):
+    compact = grid.compact_graph()
+    assert compact is not None
+    assert compact.num_interior > grid.num_nodes // 2
+
+@pytest.mark.parametrize('heuristic', ['alt', 'euclidean'])
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('blocked', [False, True])
+def test_find_path_matches_networkx(grid, pairs, heuristic, compact, blocked):
+    mask = None
+    if blocked:
+        mask = np.zeros(grid.num_edges, dtype=bool)
+        mask[np.random.default_rng(2).choice(grid.num_edges, NUM_BLOCKED, replace=False)] = True
+    grid.set_blocked_edges(mask)
+    try:
+        nx_graph = to_networkx(grid)
+        compacted = 0
+        for start, goal in pairs:
+            path = grid.find_path(start, goal, heuristic=heuristic, compact=compact)
+            compacted += grid.last_search_stats['compacted']
+            try:
+                expected = nx.dijkstra_path_length(nx_graph, start, goal)
+            except nx.NetworkXNoPath:
+                assert path is None, f"{start} -> {goal}: networkx finds no path"
+                continue
+            assert path is not None, f"{start} -> {goal}: no path, networkx finds one"
+            assert path[0]['id'] == start and path[-1]['id'] == goal
+            assert path_cost(grid, path) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+        assert (compacted > 0) == compact
+    finally:
+        grid.set_blocked_edges(None)
@@ -0,0 +1,55 @@
+"""
+Conditional requests on plan artifacts: the gzip and the plain body have
+different ETags, and If-None-Match is parsed as a list of tags.
+
+Run from backend/ with: python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.api_v1.plan_artifacts import plan_artifacts
+from routes.api_v1.plan_artifacts.artifact_store import ArtifactWriter, etag_matches
+
+PLAN_ID = "20260101-000000-abcdef"
+
+def test_etag_matches():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('"b", "a"', '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches('*', '"a"')
+    assert not etag_matches('"ab"', '"a"')
+    assert not etag_matches('"a-gzip"', '"a"')
+    assert not etag_matches(None, '"a"')
+    assert not etag_matches('', '"a"')
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    writer = ArtifactWriter(str(tmp_path / PLAN_ID))
+    writer.add_json("global_plan_data", {"nodes": list(range(100))}, "global_plan_data.json")
+    writer.write_manifest()
+    monkeypatch.setattr(plan_artifacts, "PLANS_DIR", str(tmp_path))
+    app = FastAPI()
+    app.include_router(plan_artifacts.plan_artifacts_bp)
+    return TestClient(app)
+
+def test_gzip_has_its_own_etag(client):
+    url = f"/api/v1/plans/{PLAN_ID}/artifacts/global_plan_data"
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert plain.status_code == gzipped.status_code == 200
+    assert "content-encoding" not in plain.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert plain.headers["etag"] != gzipped.headers["etag"]
+
+    # Each tag only validates its own representation
+    plain_tag, gzip_tag = plain.headers["etag"], gzipped.headers["etag"]
+    assert client.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": plain_tag}).status_code == 304
+    assert client.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": gzip_tag}).status_code == 200
+    assert client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": f'"x", W/{gzip_tag}'}).status_code == 304
+    assert client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": "*"}).status_code == 304
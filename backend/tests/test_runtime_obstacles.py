@@ -0,0 +1,49 @@
+"""
+Runtime obstacles are shared by the worker processes through one JSON file;
+concurrent changes must not overwrite each other.
+
+Run from backend/ with: python -m pytest -q tests
+"""
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.poses_geometry import runtime_obstacles
+
+NUM_PROCESSES = 8
+ADDS_PER_PROCESS = 25
+WKT = 'POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))'
+
+def _add_many(path, worker):
+    for k in range(ADDS_PER_PROCESS):
+        runtime_obstacles.add_obstacle(path, WKT, label=f'{worker}-{k}')
+
+def test_concurrent_adds_keep_every_obstacle(tmp_path):
+    path = runtime_obstacles.obstacles_path_for(str(tmp_path / 'global_plan.csv'))
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_add_many, args=(path, w)) for w in range(NUM_PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    labels = {o['label'] for o in runtime_obstacles.load_obstacles(path)}
+    assert labels == {f'{w}-{k}' for w in range(NUM_PROCESSES) for k in range(ADDS_PER_PROCESS)}
+
+def test_remove_and_clear(tmp_path):
+    path = str(tmp_path / 'global_plan_obstacles.json')
+    first = runtime_obstacles.add_obstacle(path, WKT, label='first')
+    runtime_obstacles.add_obstacle(path, WKT, label='second')
+    # Expired obstacles are dropped on the next change
+    runtime_obstacles.add_obstacle(path, WKT, ttl_seconds=-1, label='expired')
+    runtime_obstacles.add_obstacle(path, WKT, label='third')
+
+    assert runtime_obstacles.remove_obstacle(path, first['id'])
+    assert not runtime_obstacles.remove_obstacle(path, first['id'])
+    assert [o['label'] for o in runtime_obstacles.load_obstacles(path)] == ['second', 'third']
+
+    runtime_obstacles.clear_obstacles(path)
+    assert runtime_obstacles.load_obstacles(path) == []
@@ -10,7 +10,7 @@ import { enrichGeoJSONWithUTM } from '../utils/utm';
 import { parseHolFile, UTM_ZONE_19S, WGS84 } from '../utils/holParser';
 
 import '../styles/components/RouteGenerator.css';
-import { generateRoutes } from '../routes/generateRoutes';
+import { generateRoutes, fetchResultArtifacts } from '../routes/generateRoutes';
 import { transferFiles } from '../routes/transferFiles';
 
 export default function RouteGenerator() {
@@ -27,7 +27,8 @@ export default function RouteGenerator() {
     const [loading, setLoading] = useState(false);
     const [progress, setProgress] = useState(0);
     const [result, setResult] = useState<{
-        map_image: string;
+        map_image?: string;
+        manifest?: { [key: string]: { url: string; media_type: string; size: number; etag: string } };
         arrow_geojson?: any;
         holes_geojson?: string;
         geofence_geojson?: string;
@@ -285,8 +286,13 @@ export default function RouteGenerator() {
             if (message.type === 'progress') {
                 setProgress(message.value);
             } else if (message.type === 'result') {
-                setResult(message.data);
-                setViewMode('generated');
+                // Layers are fetched separately, only the ones shown here
+                fetchResultArtifacts(message.data, ['arrow_geojson', 'fitted_streets_geojson', 'fitted_transit_streets_geojson', 'global_plan_data'])
+                    .then(artifacts => {
+                        setResult({ ...message.data, ...artifacts });
+                        setViewMode('generated');
+                    })
+                    .catch(err => setError(err.message));
             } else if (message.type === 'error') {
                 setError(message.message);
             }
@@ -327,6 +333,7 @@ export default function RouteGenerator() {
 
         const promises = [];
         if (result.download_links.csv) promises.push(addFileToZip(result.download_links.csv, 'global_plan.csv'));
+        if (result.download_links.plan_parquet) promises.push(addFileToZip(result.download_links.plan_parquet, 'global_plan.parquet'));
         if (result.download_links.map_png) promises.push(addFileToZip(result.download_links.map_png, 'map.png'));
         if (result.download_links.map_yaml) promises.push(addFileToZip(result.download_links.map_yaml, 'maze_peld.yaml'));
         if (result.download_links.latlon_yaml) promises.push(addFileToZip(result.download_links.latlon_yaml, 'latlon.yaml'));
@@ -9,7 +9,7 @@ import { ArrowRight, ArrowLeft, CheckCircle, Trash2, Upload, Download, Folder, P
 import TransferModal from './TransferModal';
 import { parseHolFile, generateHolString, UTM_ZONE_19S, WGS84 } from '../utils/holParser';
 import proj4 from 'proj4';
-import { generateRoutes } from '../routes/generateRoutes';
+import { generateRoutes, fetchResultArtifacts } from '../routes/generateRoutes';
 import { fetchGraphNodes } from '../routes/graphNodes';
 import { calculatePath } from '../routes/calculatePath';
 import { transferFiles } from '../routes/transferFiles';
@@ -582,6 +582,10 @@ const Wizard = () => {
                     setGenProgress(message.value);
                 } else if (message.type === 'result') {
                     setGenResult(message.data);
+                    // Layers are fetched separately, only the ones the map shows
+                    fetchResultArtifacts(message.data, ['arrow_geojson', 'fitted_streets_geojson', 'fitted_transit_streets_geojson', 'obstacles_geojson', 'high_obstacles_geojson', 'global_plan_data'])
+                        .then(artifacts => setGenResult((prev: any) => ({ ...prev, ...artifacts })))
+                        .catch(err => console.error('Failed to fetch generated layers', err));
                     // Extract path nodes if generated
                     if (message.data.global_plan_points) {
                         try {
@@ -1163,6 +1167,7 @@ const Wizard = () => {
 
                                             const promises = [];
                                             if (genResult.download_links.csv) promises.push(addFile(genResult.download_links.csv, 'global_plan.csv'));
+                                            if (genResult.download_links.plan_parquet) promises.push(addFile(genResult.download_links.plan_parquet, 'global_plan.parquet'));
                                             if (genResult.download_links.map_png) promises.push(addFile(genResult.download_links.map_png, 'map.png'));
                                             if (genResult.download_links.map_yaml) promises.push(addFile(genResult.download_links.map_yaml, 'maze_peld.yaml'));
                                             if (genResult.download_links.latlon_yaml) promises.push(addFile(genResult.download_links.latlon_yaml, 'latlon.yaml'));
@@ -6,6 +6,7 @@ export interface RouteGenerationOptions {
     use_obstacles: boolean;
     use_high_obstacles: boolean;
     use_transit_streets: boolean;
+    tiled_map?: boolean;
 }
 
 export type GenerateRoutesCallback = (message: any) => void;
@@ -62,6 +63,7 @@ export async function generateRoutes(
     formData.append('use_obstacles', options.use_obstacles.toString());
     formData.append('use_high_obstacles', options.use_high_obstacles.toString());
     formData.append('use_transit_streets', options.use_transit_streets.toString());
+    if (options.tiled_map) formData.append('tiled_map', 'true');
 
     try {
         const response = await fetch('/api/v1/generate-routes', {
@@ -100,3 +102,28 @@ export async function generateRoutes(
         onMessage({ type: 'error', message: err.message || 'Connection error' });
     }
 }
+
+// Artifacts that were inlined as objects (the rest were GeoJSON strings)
+const JSON_ARTIFACTS = ['global_plan_data'];
+
+/**
+ * Fetches the requested artifacts listed in a generation result's manifest.
+ * Returns them under the keys the result used to inline, plus map_image as a URL,
+ * so callers can merge them into the result object.
+ * @param data The `data` of a 'result' message.
+ * @param ids Artifact IDs to download (only what the caller displays).
+ */
+export async function fetchResultArtifacts(data: any, ids: string[]) {
+    const manifest = data.manifest || {};
+    const artifacts: Record<string, any> = {};
+    if (manifest.map_image) artifacts.map_image = manifest.map_image.url;
+
+    await Promise.all(ids.filter(id => manifest[id]).map(async id => {
+        const response = await fetch(manifest[id].url);
+        if (!response.ok) {
+            throw new Error(`Failed to fetch ${id}: ${response.status}`);
+        }
+        artifacts[id] = JSON_ARTIFACTS.includes(id) ? await response.json() : await response.text();
+    }));
+    return artifacts;
+}